@@ -0,0 +1,108 @@
+"""OpenRouter stand-in for the benchmarks: a local chat completions endpoint with configurable latency.
+
+Answers SSR prompts with a hypothetical analysis paragraph and assessment prompts with a
+Moderate assessment, after LATENCY_MS (plus up to JITTER_MS) per request. Streaming
+requests get the same answer as server-sent events.
+"""
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SSR_ANSWER = (
+    "The supplier's recent filings point to tightening liquidity, a growing reliance on a single "
+    "logistics provider and delayed certification renewals, which together raise the likelihood of "
+    "delivery disruption over the next two quarters."
+)
+
+ASSESSMENT_ANSWER = (
+    "Moderate risk. The documents show delayed certification renewals and concentration on one "
+    "logistics provider, partly offset by stable on-time delivery. Evidence: see the cited passages."
+)
+
+
+class FakeOpenRouter:
+    """Chat completions server on 127.0.0.1, run in a background thread."""
+
+    def __init__(self, latency_ms=300, jitter_ms=50):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/v1/chat/completions"
+
+    def _answer(self, payload):
+        prompt = " ".join(str(message.get("content", "")) for message in payload.get("messages", []))
+        return SSR_ANSWER if "Hypothetical Analysis" in prompt else ASSESSMENT_ANSWER
+
+    def _delay(self):
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real provider, so the client's connection pool is exercised
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with fake._lock:
+                    fake.requests += 1
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    time.sleep(fake._delay())
+                    answer = fake._answer(payload)
+                    if payload.get("stream"):
+                        events = [
+                            {"choices": [{"delta": {"content": word + " "}}]} for word in answer.split(" ")
+                        ]
+                        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+                        self._send(body.encode(), "text/event-stream")
+                    else:
+                        body = {"choices": [{"message": {"role": "assistant", "content": answer}}]}
+                        self._send(json.dumps(body).encode(), "application/json")
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _send(self, body, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def stats(self):
+        return {
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "requests": self.requests,
+            "max_in_flight": self.max_in_flight
+        }
@@ -0,0 +1,411 @@
+"""Offline benchmark suite: ingestion stages and /analyze latency under concurrent load.
+
+Runs without network services. Qdrant is an in-memory QdrantClient (or --qdrant-url), Mongo is
+mongomock-motor (or --mongo-url, using a scratch database), and OpenRouter is a local fake
+with configurable latency. The embedding model and reranker run for real, from the local
+Hugging Face cache. The sample PDFs in uploads/<supplier_id>/ are the corpus.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --concurrency 32 --requests 500 --llm-latency-ms 800
+
+Results are written as JSON and compared with benchmarks/baseline.json when it exists. The
+exit code is 1 when a p50/p95 latency regressed by more than --tolerance.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+import numpy as np
+from benchmarks.fake_openrouter import FakeOpenRouter
+
+BENCHMARKS = ["extract_text_from_file", "chunking", "chunk_and_embed_document", "analyze"]
+
+# Latency metrics compared with the baseline; lower is better
+COMPARED_METRICS = ["p50_ms", "p95_ms"]
+
+BENCHMARK_COLLECTION = "benchmark_supplier_docs"
+BENCHMARK_DATABASE = "supply_chain_analyzer_benchmark"
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "latest.json")
+
+
+def summarize(durations):
+    """Latency distribution of durations (seconds), in milliseconds."""
+    samples = np.asarray(durations, dtype=np.float64) * 1000
+    if not len(samples):
+        return {"runs": 0}
+    return {
+        "runs": int(len(samples)),
+        "mean_ms": round(float(samples.mean()), 3),
+        "min_ms": round(float(samples.min()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p90_ms": round(float(np.percentile(samples, 90)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3)
+    }
+
+
+def configure_environment(args, llm_url, upload_dir):
+    """Settings the server modules read at import time; must run before any server import."""
+    os.environ["OPENROUTER_URL"] = llm_url
+    os.environ.setdefault("MODEL_PROVIDER_KEY", "benchmark")
+    os.environ["SUPPLIER_DOC_COLLECTION"] = BENCHMARK_COLLECTION
+    os.environ["UPLOAD_DIR"] = upload_dir
+    # Every run embeds for real instead of reading vectors cached by the previous one
+    os.environ["EMBED_CACHE_ENABLED"] = "false"
+    os.environ["WARMUP_ON_STARTUP"] = "false"
+    os.environ["RECONCILE_INTERVAL_HOURS"] = "0"
+
+
+def install_stand_ins(qdrant_url=None, mongo_url=None):
+    """Point server.connections at the benchmark Qdrant and Mongo before the rest of the server imports them."""
+    from qdrant_client import QdrantClient
+    import server.connections as connections
+
+    connections.qdrant = QdrantClient(url=qdrant_url) if qdrant_url else QdrantClient(":memory:")
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        connections.mongo_client = AsyncIOMotorClient(mongo_url)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        connections.mongo_client = AsyncMongoMockClient()
+    connections.database = connections.mongo_client[BENCHMARK_DATABASE]
+    for name, collection in list(vars(connections).items()):
+        if name.endswith("_collection"):
+            setattr(connections, name, connections.database[collection.name])
+    return connections
+
+
+def find_samples(samples_dir):
+    """(supplier_id, path) of every sample PDF, the supplier being the PDF's directory."""
+    paths = sorted(glob.glob(os.path.join(samples_dir, "*", "*.pdf")))
+    if not paths:
+        raise Exception(f"No sample PDFs found under {samples_dir}/<supplier_id>/")
+    return [(os.path.basename(os.path.dirname(path)), path) for path in paths]
+
+
+def _file_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def bench_extraction(samples, repeats):
+    from server.ingestion.extraction import iter_text_from_file, extract_text_from_file
+
+    # Untimed first pass: imports the parser and reads the files into the page cache
+    pages = sum(sum(1 for _ in iter_text_from_file(path)) for _, path in samples)
+    chars = sum(len(extract_text_from_file(path)) for _, path in samples)
+
+    durations = []
+    for _, path in samples:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            extract_text_from_file(path)
+            durations.append(time.perf_counter() - started)
+    return {**summarize(durations), "files": len(samples), "pages": pages, "chars": chars}
+
+
+def bench_chunking(samples, repeats):
+    from server.ingestion.extraction import iter_text_from_file, iter_document_chunks
+
+    # Extraction is measured separately; only the splitter is timed here
+    sections = [list(iter_text_from_file(path)) for _, path in samples]
+    # Untimed first pass, which imports the splitter
+    chunks = sum(sum(1 for _ in iter_document_chunks(document_sections)) for document_sections in sections)
+
+    durations = []
+    for document_sections in sections:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in iter_document_chunks(document_sections):
+                pass
+            durations.append(time.perf_counter() - started)
+    return {**summarize(durations), "chunks": chunks}
+
+
+def bench_chunk_and_embed(samples, repeats, documents):
+    from server.connections import qdrant, SUPPLIER_DOC_COLLECTION
+    from server.ingestion.utils import chunk_and_embed_document
+
+    # Same document ids and content hashes every repeat, so repeats overwrite the same points
+    durations = []
+    chunks = 0
+    for supplier_id, path in samples:
+        document = documents[path]
+        for _ in range(repeats):
+            started = time.perf_counter()
+            chunk_count, _ = chunk_and_embed_document(
+                path,
+                document["file_id"],
+                supplier_id,
+                document["filename"],
+                qdrant,
+                SUPPLIER_DOC_COLLECTION,
+                content_hash=document["content_hash"],
+                references=([document["file_id"]], [supplier_id])
+            )
+            durations.append(time.perf_counter() - started)
+        chunks += chunk_count
+    seconds = sum(durations)
+    return {**summarize(durations), "chunks": chunks, "chunks_per_s": round(chunks * repeats / seconds, 2)}
+
+
+async def bench_analyze(supplier_ids, concurrency, requests, warmup):
+    import httpx
+    from server.api.main import app
+    from server.ingestion.ssr import STANDARD_RISK_QUERIES
+
+    # Distinct queries, so every request misses the /analyze and SSR caches and runs the whole pipeline
+    def payload(i):
+        query = STANDARD_RISK_QUERIES[i % len(STANDARD_RISK_QUERIES)]
+        return {"query": f"{query} (benchmark {i})", "vendor_ids": [supplier_ids[i % len(supplier_ids)]]}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+    errors = {}
+
+    async def request(client, i, record):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/analyze", json=payload(i))
+                error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+            except Exception as e:
+                error = type(e).__name__
+            if record:
+                durations.append(time.perf_counter() - started)
+                if error:
+                    errors[error] = errors.get(error, 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        await asyncio.gather(*[request(client, requests + i, False) for i in range(warmup)])
+        started = time.perf_counter()
+        await asyncio.gather(*[request(client, i, True) for i in range(requests)])
+        elapsed = time.perf_counter() - started
+
+    return {
+        **summarize(durations),
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(errors.values()),
+        "error_types": errors,
+        "throughput_rps": round(requests / elapsed, 2)
+    }
+
+
+async def prepare(samples):
+    """Create the collection, suppliers and document logs for the samples; returns path -> document log."""
+    from server.connections import qdrant, SUPPLIER_DOC_COLLECTION, suppliers_collection, document_logs_collection
+    from server.connections.collection import ensure_collection
+    from server.ingestion.utils import embedding_dimension, sparse_vectors_config, HYBRID_SEARCH_ENABLED
+
+    ensure_collection(
+        qdrant,
+        SUPPLIER_DOC_COLLECTION,
+        embedding_dimension(),
+        sparse_vectors=sparse_vectors_config() if HYBRID_SEARCH_ENABLED else None
+    )
+
+    documents = {}
+    for supplier_id, path in samples:
+        documents[path] = {
+            "file_id": str(uuid.uuid5(uuid.NAMESPACE_URL, path)),
+            "supplier_id": supplier_id,
+            "filename": os.path.basename(path),
+            "file_path": path,
+            "file_extension": ".pdf",
+            "content_hash": _file_hash(path),
+            "uploaded_at": datetime.now().isoformat()
+        }
+    supplier_ids = sorted({supplier_id for supplier_id, _ in samples})
+    await suppliers_collection.insert_many([
+        {
+            "id": supplier_id,
+            "name": f"Benchmark supplier {supplier_id}",
+            "active": True,
+            "document_count": sum(1 for sid, _ in samples if sid == supplier_id),
+            "created_at": datetime.now().isoformat()
+        }
+        for supplier_id in supplier_ids
+    ])
+    await document_logs_collection.insert_many([dict(document) for document in documents.values()])
+    return documents
+
+
+def load_models():
+    """Load the models outside the timed sections; returns which optional ones are in use."""
+    from server.ingestion.utils import embed_texts
+    from server.ingestion.rerank import load_reranker, reranker_loaded
+
+    embed_texts(["warm-up"])
+    try:
+        load_reranker()
+    except Exception as e:
+        print(f"Warning: reranker unavailable, /analyze runs without it: {e}")
+    return {"reranker": reranker_loaded()}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def environment(args, models):
+    from server.ingestion.utils import EMBED_MODEL, EMBED_BACKEND
+    from server.ingestion.utils.embedding_server import EMBED_SERVER_SOCKET
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "embed_model": EMBED_MODEL,
+        "embed_backend": "server" if EMBED_SERVER_SOCKET else EMBED_BACKEND,
+        "reranker": models["reranker"],
+        "qdrant": args.qdrant_url or ":memory:",
+        "mongo": "mongo" if args.mongo_url else "mongomock"
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Per-benchmark latency ratios against the baseline; a ratio above 1 + tolerance is a regression."""
+    rows = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous:
+            continue
+        for metric in COMPARED_METRICS:
+            if not current.get(metric) or not previous.get(metric):
+                continue
+            ratio = current[metric] / previous[metric]
+            rows.append({
+                "benchmark": name,
+                "metric": metric,
+                "baseline": previous[metric],
+                "current": current[metric],
+                "ratio": round(ratio, 3),
+                "regressed": ratio > 1 + tolerance
+            })
+    return rows
+
+
+async def run_benchmarks(args, llm):
+    connections = install_stand_ins(args.qdrant_url, args.mongo_url)
+    samples = find_samples(args.samples)
+    selected = args.only or BENCHMARKS
+    try:
+        models = load_models()
+        documents = await prepare(samples)
+        benchmarks = {}
+        if "extract_text_from_file" in selected:
+            benchmarks["extract_text_from_file"] = bench_extraction(samples, args.repeats)
+        if "chunking" in selected:
+            benchmarks["chunking"] = bench_chunking(samples, args.repeats)
+        # Also what indexes the samples for /analyze, so it runs once even when not selected
+        chunk_and_embed = bench_chunk_and_embed(samples, args.repeats if "chunk_and_embed_document" in selected else 1,
+                                                documents)
+        if "chunk_and_embed_document" in selected:
+            benchmarks["chunk_and_embed_document"] = chunk_and_embed
+        if "analyze" in selected:
+            supplier_ids = sorted({supplier_id for supplier_id, _ in samples})
+            benchmarks["analyze"] = await bench_analyze(supplier_ids, args.concurrency, args.requests, args.warmup)
+            benchmarks["analyze"]["llm"] = llm.stats()
+        return {
+            "created_at": datetime.now().isoformat(),
+            "environment": environment(args, models),
+            "config": {
+                "samples": [path for _, path in samples],
+                "repeats": args.repeats,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "llm_latency_ms": args.llm_latency_ms,
+                "llm_jitter_ms": args.llm_jitter_ms
+            },
+            "benchmarks": benchmarks
+        }
+    finally:
+        # Scratch data in real services is removed; the stand-ins vanish with the process
+        if args.qdrant_url:
+            connections.qdrant.delete_collection(BENCHMARK_COLLECTION)
+        if args.mongo_url:
+            await connections.mongo_client.drop_database(BENCHMARK_DATABASE)
+
+
+def _write_json(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of ingestion and /analyze.")
+    parser.add_argument("--samples", default="uploads", help="Directory of <supplier_id>/*.pdf samples")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Benchmarks to run (default: all)")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per sample of the ingestion benchmarks")
+    parser.add_argument("--concurrency", type=int, default=16, help="/analyze requests in flight")
+    parser.add_argument("--requests", type=int, default=200, help="Timed /analyze requests")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed /analyze requests first")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Fake OpenRouter latency per call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=50, help="Random extra latency, up to this much")
+    parser.add_argument("--qdrant-url", help="Use a local Qdrant (scratch collection) instead of an in-memory one")
+    parser.add_argument("--mongo-url", help="Use a local MongoDB (scratch database) instead of mongomock")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed latency increase over the baseline")
+    args = parser.parse_args(argv)
+
+    llm = FakeOpenRouter(args.llm_latency_ms, args.llm_jitter_ms).start()
+    upload_dir = tempfile.mkdtemp(prefix="safebot-benchmark-")
+    configure_environment(args, llm.url, upload_dir)
+    try:
+        results = asyncio.run(run_benchmarks(args, llm))
+    finally:
+        llm.stop()
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    for name, result in results["benchmarks"].items():
+        print(f"{name}: p50 {result.get('p50_ms')} ms, p95 {result.get('p95_ms')} ms over {result.get('runs')} runs")
+
+    regressed = False
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("environment", {}).get("cpus") != results["environment"]["cpus"] or \
+                baseline.get("environment", {}).get("embed_backend") != results["environment"]["embed_backend"]:
+            print("Warning: the baseline was recorded on a different machine or embedding backend")
+        results["comparison"] = compare(results, baseline, args.tolerance)
+        for row in results["comparison"]:
+            flag = "REGRESSED" if row["regressed"] else "ok"
+            print(f"  {row['benchmark']} {row['metric']}: {row['baseline']} -> {row['current']} ms "
+                  f"(x{row['ratio']}) {flag}")
+        regressed = any(row["regressed"] for row in results["comparison"])
+
+    _write_json(args.output, results)
+    print(f"Results written to {args.output}")
+    if args.save_baseline:
+        _write_json(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
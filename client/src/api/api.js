@@ -25,6 +25,60 @@ export const analyzeRisk = async (query, vendorIds) => {
   }
 };
 
+// Streams /analyze/stream Server-Sent Events: evidence first, then assessment tokens, then the final result
+export const analyzeRiskStream = async (query, vendorIds, { onEvidence, onToken } = {}) => {
+  const response = await fetch(`${API_BASE_URL}/analyze/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      query: query,
+      vendor_ids: vendorIds
+    }),
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      rawEvent.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) continue;
+      const payload = JSON.parse(data);
+
+      if (event === 'evidence' && onEvidence) onEvidence(payload.evidence);
+      if (event === 'token' && onToken) onToken(payload.text);
+      if (event === 'result') result = payload;
+      if (event === 'error') throw new Error(payload.detail);
+    }
+  }
+
+  if (!result) {
+    throw new Error('Analysis stream ended without a result');
+  }
+  return result;
+};
+
 export const getSuppliers = async () => {
   try {
     const response = await fetch(`${API_BASE_URL}/suppliers`, {
@@ -47,9 +101,34 @@ export const getSuppliers = async () => {
 };
 
 // New comprehensive supplier management APIs
-export const getAllSuppliers = async () => {
+// Returns one page: { suppliers, next_cursor }; pass next_cursor back as params.cursor for the next page
+export const getAllSuppliers = async (params = {}) => {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/suppliers`, {
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')
+    ).toString();
+    const response = await fetch(`${API_BASE_URL}/api/suppliers${query ? `?${query}` : ''}`, {
+      method: 'GET',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+    });
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const data = await response.json();
+    return data;
+  } catch (error) {
+    console.error('API Error:', error);
+    throw error;
+  }
+};
+
+export const getSupplierStats = async () => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/suppliers/stats`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -155,9 +234,32 @@ export const uploadSupplierDocument = async (supplierId, file) => {
   }
 };
 
-export const getSupplierDocuments = async (supplierId) => {
+export const uploadSupplierDocumentsBulk = async (supplierId, files) => {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/suppliers/${supplierId}/documents`, {
+    const formData = new FormData();
+    Array.from(files).forEach((file) => formData.append('files', file));
+
+    const response = await fetch(`${API_BASE_URL}/api/suppliers/${supplierId}/documents/bulk`, {
+      method: 'POST',
+      body: formData,
+    });
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const data = await response.json();
+    return data;
+  } catch (error) {
+    console.error('API Error:', error);
+    throw error;
+  }
+};
+
+export const getSupplierDocuments = async (supplierId, cursor = null) => {
+  try {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(`${API_BASE_URL}/api/suppliers/${supplierId}/documents${query}`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -196,3 +298,24 @@ export const deleteSupplierDocument = async (supplierId, documentId) => {
     throw error;
   }
 };
+
+export const getIngestionJob = async (jobId) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/ingestion/jobs/${jobId}`, {
+      method: 'GET',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+    });
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const data = await response.json();
+    return data;
+  } catch (error) {
+    console.error('API Error:', error);
+    throw error;
+  }
+};
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import RiskQueryInput from './ChatInput';
-import { analyzeRisk, getSuppliers } from '../api/api';
+import { analyzeRiskStream, getSuppliers } from '../api/api';
 import './Chat.css';
 
 const RiskAnalyzer = () => {
@@ -29,7 +29,21 @@ const RiskAnalyzer = () => {
     setCurrentAnalysis(null);
 
     try {
-      const response = await analyzeRisk(query, selectedVendors);
+      const response = await analyzeRiskStream(query, selectedVendors, {
+        onEvidence: (evidence) => {
+          setIsLoading(false);
+          setCurrentAnalysis({
+            query,
+            selectedVendors,
+            streaming: true,
+            summary: '',
+            evidence: evidence.map((item) => item.source).filter((source, index, all) => all.indexOf(source) === index)
+          });
+        },
+        onToken: (text) => {
+          setCurrentAnalysis((analysis) => analysis && { ...analysis, summary: analysis.summary + text });
+        }
+      });
       setCurrentAnalysis({
         query,
         selectedVendors,
@@ -78,7 +92,7 @@ const RiskAnalyzer = () => {
           <div className="result-header">
             <h3>Risk Assessment Results</h3>
             <div className="risk-level" data-level={currentAnalysis.risk_level?.toLowerCase()}>
-              Risk Level: {currentAnalysis.risk_level}
+              Risk Level: {currentAnalysis.streaming ? 'Assessing...' : currentAnalysis.risk_level}
             </div>
           </div>
 
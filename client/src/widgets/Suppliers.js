@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { getAllSuppliers, createSupplier, updateSupplier, uploadSupplierDocument, getSupplierDocuments, deleteSupplierDocument } from '../api/api';
+import { getAllSuppliers, getSupplierStats, createSupplier, updateSupplier, uploadSupplierDocument, getSupplierDocuments, deleteSupplierDocument } from '../api/api';
 import { Button } from '../components/ui/button.jsx';
 import { Input } from '../components/ui/input.jsx';
 import { Card, CardHeader, CardTitle, CardContent } from '../components/ui/card.jsx';
@@ -9,6 +9,8 @@ import './Suppliers.css';
 
 const Suppliers = () => {
   const [suppliers, setSuppliers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [stats, setStats] = useState({ total: 0, active: 0 });
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
   const [isCreateDialogOpen, setIsCreateDialogOpen] = useState(false);
@@ -17,6 +19,7 @@ const Suppliers = () => {
   const [isDocumentsDialogOpen, setIsDocumentsDialogOpen] = useState(false);
   const [documentsViewSupplier, setDocumentsViewSupplier] = useState(null);
   const [supplierDocuments, setSupplierDocuments] = useState([]);
+  const [documentsCursor, setDocumentsCursor] = useState(null);
   const [loadingDocuments, setLoadingDocuments] = useState(false);
   const [selectedDocument, setSelectedDocument] = useState(null);
   const [isUploading, setIsUploading] = useState(false);
@@ -40,20 +43,43 @@ const Suppliers = () => {
   });
   const [errors, setErrors] = useState({});
 
+  // Search runs server-side; wait for typing to pause before querying
   useEffect(() => {
-    fetchSuppliers();
-  }, []);
+    const timer = setTimeout(() => fetchSuppliers(), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  const fetchStats = async () => {
+    try {
+      setStats(await getSupplierStats());
+    } catch (error) {
+      console.error('Error fetching supplier stats:', error);
+    }
+  };
 
   const fetchSuppliers = async () => {
     try {
-      const response = await getAllSuppliers();
+      const response = await getAllSuppliers({ search: searchTerm.trim() });
       setSuppliers(response.suppliers);
+      setNextCursor(response.next_cursor);
     } catch (error) {
       console.error('Error fetching suppliers:', error);
       setSuppliers([]);
+      setNextCursor(null);
     } finally {
       setLoading(false);
     }
+    fetchStats();
+  };
+
+  const loadMoreSuppliers = async () => {
+    try {
+      const response = await getAllSuppliers({ search: searchTerm.trim(), cursor: nextCursor });
+      setSuppliers(prev => [...prev, ...response.suppliers]);
+      setNextCursor(response.next_cursor);
+    } catch (error) {
+      console.error('Error fetching suppliers:', error);
+    }
   };
 
   const handleCreateSupplier = async (e) => {
@@ -78,6 +104,7 @@ const Suppliers = () => {
 
       // Add the new supplier to the list
       setSuppliers(prev => [...prev, response.supplier]);
+      fetchStats();
 
       // Reset form and close dialog
       setFormData({
@@ -187,24 +214,33 @@ const Suppliers = () => {
     try {
       const response = await getSupplierDocuments(supplier.id);
       setSupplierDocuments(response.documents || []);
+      setDocumentsCursor(response.next_cursor);
     } catch (error) {
       console.error('Error fetching documents:', error);
       setSupplierDocuments([]);
+      setDocumentsCursor(null);
     } finally {
       setLoadingDocuments(false);
     }
     setIsDocumentsDialogOpen(true);
   };
 
+  const loadMoreDocuments = async () => {
+    try {
+      const response = await getSupplierDocuments(documentsViewSupplier.id, documentsCursor);
+      setSupplierDocuments(prev => [...prev, ...(response.documents || [])]);
+      setDocumentsCursor(response.next_cursor);
+    } catch (error) {
+      console.error('Error fetching documents:', error);
+    }
+  };
+
   const selectDocument = (document) => {
     setSelectedDocument(document);
   };
 
-  const filteredSuppliers = suppliers.filter(supplier =>
-    supplier.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    supplier.id.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    supplier.category.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  // Suppliers are already filtered by the search term on the server
+  const filteredSuppliers = suppliers;
 
   const handleDeleteDocument = async () => {
     if (!documentToDelete || !documentsViewSupplier) return;
@@ -548,6 +584,11 @@ const Suppliers = () => {
                       </div>
                     ))
                   )}
+                  {!loadingDocuments && documentsCursor && (
+                    <div className="load-more">
+                      <Button variant="outline" size="sm" onClick={loadMoreDocuments}>Load more documents</Button>
+                    </div>
+                  )}
                 </div>
               </div>
               <div className="documents-preview">
@@ -688,8 +729,8 @@ const Suppliers = () => {
           <span className="search-icon">🔍</span>
         </div>
         <div className="supplier-stats">
-          <span className="stat-item">Total: {suppliers.length}</span>
-          <span className="stat-item">Active: {suppliers.filter(s => s.active).length}</span>
+          <span className="stat-item">Total: {stats.total}</span>
+          <span className="stat-item">Active: {stats.active}</span>
         </div>
       </div>
 
@@ -783,6 +824,12 @@ const Suppliers = () => {
         ))}
       </div>
 
+      {nextCursor && (
+        <div className="load-more">
+          <Button variant="outline" onClick={loadMoreSuppliers}>Load more suppliers</Button>
+        </div>
+      )}
+
       {filteredSuppliers.length === 0 && (
         <div className="no-results">
           <h3>No suppliers found</h3>
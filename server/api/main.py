@@ -1,9 +1,12 @@
 import os
+import re
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from starlette.responses import Response
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
 # Load environment variables
@@ -15,15 +18,102 @@ if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
 # Import modules
-from server.api.routes.suppliers import router as suppliers_router
+from server.api.routes.suppliers import router as suppliers_router, MAX_UPLOAD_BYTES, MAX_BULK_UPLOAD_SIZE_MB
 from server.api.routes.rag import router as rag_router
-from server.connections import qdrant, mongo_client, database  # Initialize connections
+from server.api.routes.assessments import router as assessments_router
+from server.api.routes.admin import router as admin_router
+from server.connections import qdrant, mongo_client, database, SUPPLIER_DOC_COLLECTION  # Initialize connections
+from server.connections.collection import ensure_collection
+from server.connections.migrations import migrate_database
+from server.ingestion.jobs import start_job_maintenance, shutdown_ingestion_workers
+from server.ingestion.cleanup import start_reconciliation_schedule
+from server.ingestion.warmup import start_warmup
+from server.ingestion.utils import (
+    close_llm_client,
+    collection_has_sparse_vectors,
+    embedding_dimension,
+    sparse_vectors_config,
+    HYBRID_SEARCH_ENABLED
+)
 
 # ==========================
 # INITIALIZATION
 # ==========================
 
-app = FastAPI(title="AI Supply Chain Risk Analyzer")
+def prepare_collection():
+    """Create or migrate the collection (HNSW, quantization, on-disk storage, payload indexes),
+    failing fast if its dimension does not match the embedding model. Blocking."""
+    try:
+        ensure_collection(
+            qdrant,
+            SUPPLIER_DOC_COLLECTION,
+            embedding_dimension(),
+            sparse_vectors=sparse_vectors_config() if HYBRID_SEARCH_ENABLED else None
+        )
+        # Report up front whether /analyze will run hybrid (dense + BM25) or dense-only search
+        collection_has_sparse_vectors(qdrant, SUPPLIER_DOC_COLLECTION)
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"Warning: could not prepare collection {SUPPLIER_DOC_COLLECTION}: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the embedding and reranking models in the background; /ready reports when they are in
+    start_warmup()
+
+    # Mongo indexes (id/file_id lookups, keyset sorts, SSR cache TTL) and pending data migrations,
+    # applied before the first request is served
+    await migrate_database(database)
+
+    # Qdrant calls block, so they run in a worker thread rather than on the event loop
+    await run_in_threadpool(prepare_collection)
+
+    # Resume ingestion jobs left queued or running by a worker that stopped, and keep this worker's leases
+    start_job_maintenance()
+
+    # Periodic sweep for orphaned documents, files and vectors (RECONCILE_INTERVAL_HOURS; repairs only with RECONCILE_REPAIR)
+    start_reconciliation_schedule()
+
+    yield
+
+    # Waits for in-flight ingestion and hands jobs that have not started back to the queue
+    await shutdown_ingestion_workers()
+    await close_llm_client()
+
+
+app = FastAPI(title="AI Supply Chain Risk Analyzer", lifespan=lifespan)
+
+# Upload routes, by method and exact path, and the request body limit of each: one file plus room
+# for the multipart framing, or a whole bulk request
+UPLOAD_ROUTE_LIMITS = [
+    ("POST", re.compile(r"/api/suppliers/[^/]+/documents"), MAX_UPLOAD_BYTES + 64 * 1024),
+    ("POST", re.compile(r"/api/suppliers/[^/]+/documents/bulk"), MAX_BULK_UPLOAD_SIZE_MB * 1024 * 1024),
+    ("PUT", re.compile(r"/api/suppliers/[^/]+/documents/[^/]+"), MAX_UPLOAD_BYTES + 64 * 1024)
+]
+
+
+def upload_size_limit(method, path):
+    """Body limit of the upload route a request goes to, or None when it is not an upload."""
+    for route_method, pattern, limit in UPLOAD_ROUTE_LIMITS:
+        if method == route_method and pattern.fullmatch(path):
+            return limit
+    return None
+
+
+# Reject oversized uploads from their Content-Length before the multipart body is read;
+# added before CORS so the rejection still carries CORS headers
+class UploadSizeLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            limit = upload_size_limit(request.method, request.url.path)
+            if limit is not None and int(content_length) > limit:
+                return JSONResponse({"detail": "Upload exceeds the size limit"}, status_code=413)
+        return await call_next(request)
+
+app.add_middleware(UploadSizeLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -48,3 +138,5 @@ app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="files")
 # Include routers
 app.include_router(suppliers_router)
 app.include_router(rag_router)
+app.include_router(assessments_router)
+app.include_router(admin_router)
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException
+from server.connections.migrations import database_report
+from server.ingestion.cleanup import (
+    create_reconciliation_run,
+    start_reconciliation_run,
+    get_reconciliation_run,
+    get_reconciliation_runs
+)
+
+router = APIRouter()
+
+
+@router.get("/api/admin/db/report")
+async def get_database_report(slow_queries: int = 20):
+    """Index usage per collection (least used first), unused indexes, applied migrations and
+    the slowest profiled queries (set MONGO_PROFILE_SLOW_MS to record them)."""
+    try:
+        return await database_report(slow_query_limit=max(1, min(slow_queries, 200)))
+    except Exception as e:
+        raise HTTPException(500, f"Failed to build database report: {e}")
+
+
+@router.post("/api/admin/reconcile")
+async def start_reconciliation(repair: bool = False):
+    """Scan Mongo, the upload directory and Qdrant for orphans and drift in the background
+    and report them; with repair=true also delete and fix them."""
+    try:
+        run = await create_reconciliation_run(repair=repair)
+    except Exception as e:
+        raise HTTPException(500, f"Failed to start reconciliation: {e}")
+    start_reconciliation_run(run["run_id"])
+    return run
+
+
+@router.get("/api/admin/reconcile/runs")
+async def list_reconciliation_runs(limit: int = 10):
+    """Most recent reconciliation runs with their reports."""
+    try:
+        return {"runs": await get_reconciliation_runs(max(1, min(limit, 100)))}
+    except Exception as e:
+        raise HTTPException(500, f"Failed to retrieve reconciliation runs: {e}")
+
+
+@router.get("/api/admin/reconcile/runs/{run_id}")
+async def get_reconciliation(run_id: str):
+    """State and report of a reconciliation run."""
+    try:
+        run = await get_reconciliation_run(run_id)
+    except Exception as e:
+        raise HTTPException(500, f"Failed to retrieve reconciliation run: {e}")
+    if not run:
+        raise HTTPException(404, "Reconciliation run not found")
+    return run
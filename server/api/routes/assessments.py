@@ -0,0 +1,65 @@
+from fastapi import APIRouter, HTTPException
+from server.models.models import AssessmentRunCreate
+from server.ingestion.assessment import (
+    RUN_RUNNING,
+    MAX_ASSESSMENT_PAIRS,
+    create_assessment_run,
+    start_assessment_run,
+    get_assessment_run,
+    get_assessment_results
+)
+
+router = APIRouter()
+
+
+@router.post("/api/assessments/runs")
+async def create_run(data: AssessmentRunCreate):
+    """Start a batch assessment of suppliers against a set of risk queries."""
+    queries = [query.strip() for query in data.queries or [] if query.strip()] or None
+    try:
+        run = await create_assessment_run(queries, data.supplier_ids, max_pairs=MAX_ASSESSMENT_PAIRS)
+    except ValueError as e:
+        raise HTTPException(400, f"{e}; assess fewer suppliers or queries per run")
+    except Exception as e:
+        raise HTTPException(500, f"Failed to create assessment run: {e}")
+
+    if not run["total"]:
+        raise HTTPException(400, "No suppliers to assess.")
+
+    start_assessment_run(run["run_id"])
+    return run
+
+
+@router.get("/api/assessments/runs/{run_id}")
+async def get_run(run_id: str):
+    """Get a batch assessment run's status and progress."""
+    run = await get_assessment_run(run_id)
+    if not run:
+        raise HTTPException(404, "Assessment run not found")
+    return run
+
+
+@router.post("/api/assessments/runs/{run_id}/resume")
+async def resume_run(run_id: str, force: bool = False):
+    """Resume a run, assessing only pairs without a successful result.
+
+    force picks up a run still marked running, e.g. after a server restart interrupted it.
+    """
+    run = await get_assessment_run(run_id)
+    if not run:
+        raise HTTPException(404, "Assessment run not found")
+    if run["status"] == RUN_RUNNING and not force:
+        raise HTTPException(409, "Assessment run is already running; pass force=true if it was interrupted")
+
+    start_assessment_run(run_id, force=force)
+    return {**run, "status": RUN_RUNNING}
+
+
+@router.get("/api/assessments/runs/{run_id}/results")
+async def get_run_results(run_id: str, supplier_id: str = None):
+    """Per-supplier, per-query results of a run."""
+    try:
+        results = await get_assessment_results(run_id, supplier_id)
+    except Exception as e:
+        raise HTTPException(500, f"Failed to retrieve assessment results: {e}")
+    return {"run_id": run_id, "results": results}
@@ -1,107 +1,143 @@
+import json
 from fastapi import APIRouter, HTTPException
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from server.models.models import AnalyzeQuery
-from server.connections import qdrant, SUPPLIER_DOC_COLLECTION
-from server.ingestion.utils import embedder, call_llm, generate_ssr_prompt, parse_risk_assessment, RISK_TEMPLATE
+from server.ingestion.utils import embed_query, embedding_cache, stream_llm, get_embedding_backend
+from server.ingestion.utils.embedding_server import EMBED_SERVER_SOCKET
+from server.ingestion.utils.response_cache import analyze_response_cache
+from server.ingestion.versions import get_documents_version
+from server.ingestion.ssr import ssr_cache_stats
+from server.ingestion.analysis import (
+    NO_MATERIAL_RESPONSE,
+    NO_RELEVANT_RESPONSE,
+    retrieve_passages,
+    risk_messages,
+    assessment_response,
+    assess_risk
+)
 
 router = APIRouter()
 
 
+async def _cached_response(user_query, vendor_ids):
+    """Look the query up in the response cache; returns (cached, version, query_vector)."""
+    version = await get_documents_version(vendor_ids)
+    query_vector = None
+    if analyze_response_cache.similarity_threshold > 0:
+        query_vector = await run_in_threadpool(embed_query, user_query)
+    return analyze_response_cache.get(user_query, vendor_ids, version, query_vector), version, query_vector
+
+
 @router.post("/analyze")
-def analyze_risk(data: AnalyzeQuery):
+async def analyze_risk(data: AnalyzeQuery):
     user_query = data.query.strip()
     vendor_ids = data.vendor_ids
 
     if not user_query:
         raise HTTPException(400, "Query cannot be empty.")
 
-    # SSR Step 1: Generate Hypothetical Analysis Paragraph
-    ssr_prompt = generate_ssr_prompt(user_query)
+    # Serve repeated questions about unchanged document sets from the cache
+    cached, version, query_vector = await _cached_response(user_query, vendor_ids)
+    if cached:
+        response, match = cached
+        return {**response, "cache": {"hit": True, "match": match}}
+
+    response = await _assess_risk(user_query, vendor_ids)
+    analyze_response_cache.put(user_query, vendor_ids, version, response, query_vector)
+    return {**response, "cache": {"hit": False, "match": None}}
+
+
+async def _retrieve(user_query, vendor_ids):
+    """SSR retrieval for a request: context passages, best first, or None when nothing matched."""
     try:
-        hypothetical_analysis = call_llm([{"role": "user", "content": ssr_prompt}], temperature=0.7, max_tokens=200)
+        return await retrieve_passages(user_query, vendor_ids)
     except Exception as e:
-        raise HTTPException(500, f"SSR generation error: {e}")
-
-    # SSR Step 2: Embed the Hypothetical Analysis
-    ssr_embedding = embedder.embed_query(hypothetical_analysis)
-
-    # SSR Step 3: Build filter for selected vendors
-    vendor_filter = None
-    if vendor_ids:
-        vendor_filter = Filter(
-            must=[
-                FieldCondition(
-                    key="vendor_id",
-                    match=MatchValue(value=vid)
-                ) for vid in vendor_ids
-            ]
-        )
-
-    # SSR Step 4: Perform vector search using SSR embedding (top 8 chunks)
+        raise HTTPException(500, str(e))
+
+
+async def _assess_risk(user_query, vendor_ids):
+    """Run the SSR retrieval and assessment pipeline for one request."""
     try:
-        search_res = qdrant.query_points(
-            collection_name=SUPPLIER_DOC_COLLECTION,
-            query=ssr_embedding,
-            limit=8,
-            query_filter=vendor_filter      # ← Correct name
-        )
-        search_result = search_res.points
+        return await assess_risk(user_query, vendor_ids)
     except Exception as e:
-        raise HTTPException(500, f"Vector DB search error: {e}")
-
-    if not search_result:
-        return {"risk_level": "Low", "evidence": [], "summary": "No relevant material found."}
+        raise HTTPException(500, str(e))
 
-    # SSR Step 5: Aggregate content and pick top chunks
-    scored_chunks = []
-    for hit in search_result:
-        score = float(hit.score)
-        payload = hit.payload
-        text = payload.get("text", "")
 
-        # Threshold to avoid weak matches
-        if score < 0.10:
-            continue
+def _sse(event, data):
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        scored_chunks.append((text, payload.get("source", "Unknown")))
 
-    if not scored_chunks:
-        return {"risk_level": "Low", "evidence": [], "summary": "No sufficiently relevant content found."}
+@router.post("/analyze/stream")
+async def analyze_risk_stream(data: AnalyzeQuery):
+    """Streaming /analyze: emits evidence once retrieval finishes, then assessment tokens, then the result.
 
-    # Keep only first 3 best matches
-    context_blocks = [chunk for chunk, src in scored_chunks[:3]]
+    Events: evidence {"evidence": [{"source", "score"}]}, token {"text"},
+    result (same body as /analyze) and error {"detail"}.
+    """
+    user_query = data.query.strip()
+    vendor_ids = data.vendor_ids
 
-    # SSR Step 6: Compose final context
-    full_context = "\n\n---\n\n".join(context_blocks)
+    if not user_query:
+        raise HTTPException(400, "Query cannot be empty.")
 
-    # SSR Step 7: Build prompt for LLM using Query + Context + Hypothetical Analysis
-    prompt = RISK_TEMPLATE.format(
-        context=full_context,
-        query=user_query
+    async def events():
+        try:
+            cached, version, query_vector = await _cached_response(user_query, vendor_ids)
+            if cached:
+                response, match = cached
+                yield _sse("result", {**response, "cache": {"hit": True, "match": match}})
+                return
+
+            passages = await _retrieve(user_query, vendor_ids)
+            yield _sse("evidence", {
+                "evidence": [
+                    {"source": src, "score": passage["score"]}
+                    for passage in passages or []
+                    for src in passage["sources"]
+                ]
+            })
+
+            if not passages:
+                response = NO_MATERIAL_RESPONSE if passages is None else NO_RELEVANT_RESPONSE
+            else:
+                parts = []
+                async for text in stream_llm(risk_messages(user_query, passages), temperature=0):
+                    parts.append(text)
+                    yield _sse("token", {"text": text})
+                response = assessment_response("".join(parts), passages)
+
+            analyze_response_cache.put(user_query, vendor_ids, version, response, query_vector)
+            yield _sse("result", {**response, "cache": {"hit": False, "match": None}})
+        except HTTPException as e:
+            yield _sse("error", {"detail": e.detail})
+        except Exception as e:
+            yield _sse("error", {"detail": f"LLM error: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-    # SSR Step 8: Call LLM for final risk assessment
-    try:
-        assessment_text = call_llm([
-            {"role": "system", "content": "Provide risk assessment with level, summary, and evidence."},
-            {"role": "user", "content": prompt}
-        ], temperature=0)
-    except Exception as e:
-        raise HTTPException(500, f"LLM error: {e}")
-
-    # SSR Step 9: Parse the assessment (simplified parsing)
-    risk_level = parse_risk_assessment(assessment_text)
-
-    summary = assessment_text  # For simplicity, use the whole text as summary
-
-    # Extract evidence as document names
-    evidence = sorted(list({
-        src
-        for _, src in scored_chunks[:3]
-    }))
 
+@router.get("/api/cache/stats")
+def cache_stats():
+    """Hit/miss counters of this worker's caches."""
     return {
-        "risk_level": risk_level,
-        "evidence": evidence,
-        "summary": summary
+        "embeddings": embedding_cache.stats() if embedding_cache else None,
+        "analyze": analyze_response_cache.stats(),
+        "ssr": ssr_cache_stats()
     }
+
+
+@router.get("/api/embeddings/stats")
+def embedding_server_stats():
+    """Queue depth and micro-batch sizes of the shared embedding server (EMBED_SERVER_SOCKET)."""
+    if not EMBED_SERVER_SOCKET:
+        raise HTTPException(404, "No embedding server configured; embeddings run in this worker")
+    try:
+        return get_embedding_backend().stats()
+    except Exception as e:
+        raise HTTPException(500, f"Failed to retrieve embedding server stats: {e}")
@@ -1,69 +1,260 @@
 import os
+import re
+import json
 import uuid
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse
+import base64
+import hashlib
+from typing import List, Optional
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request
+from fastapi.responses import Response, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 from server.connections import suppliers_collection, document_logs_collection, qdrant, SUPPLIER_DOC_COLLECTION
 from server.models.models import SupplierCreate
-from server.ingestion.utils import chunk_and_embed_document, delete_document_chunks
-import mammoth
-import shutil
+from server.ingestion.utils import delete_document_chunks, release_content_chunks
+from server.ingestion.versions import bump_documents_version
+from server.ingestion.cleanup import delete_supplier_cascade
+from server.ingestion.warmup import readiness
+from server.ingestion.preview import ensure_preview, schedule_preview, invalidate_preview, PREVIEW_EXTENSIONS
+from server.ingestion.jobs import (
+    submit_ingestion_job,
+    submit_bulk_ingestion_job,
+    submit_revision_job,
+    get_ingestion_job,
+    content_references
+)
 
 router = APIRouter()
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 
+ALLOWED_EXTENSIONS = ['.pdf', '.doc', '.docx', '.png', '.jpg', '.jpeg']
+TEXT_EXTENSIONS = ['.pdf', '.docx', '.txt']
+
+# Largest accepted file, and the request body limit for a bulk upload
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "200"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+MAX_BULK_UPLOAD_SIZE_MB = int(os.getenv("MAX_BULK_UPLOAD_SIZE_MB", "2048"))
+
+# Bytes read from an upload and written to disk at a time
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Page size of supplier and document listings when none is requested, and the largest allowed
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+# Response field -> supplier document field, for projection and formatting
+SUPPLIER_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "category": "category",
+    "location": "location",
+    "riskLevel": "risk_level",
+    "contact_email": "contact_email",
+    "contact_phone": "contact_phone",
+    "description": "description",
+    "active": "active",
+    "document_count": "document_count",
+    "last_assessment": "last_assessment",
+    "created_at": "created_at"
+}
+
+# Sortable supplier listing fields; ties are broken by id so the keyset cursor is unique
+SUPPLIER_SORT_FIELDS = {
+    "name": "name",
+    "category": "category",
+    "location": "location",
+    "riskLevel": "risk_level",
+    "risk_level": "risk_level",
+    "created_at": "created_at",
+    "last_assessment": "last_assessment"
+}
+
+
+def _page_size(limit):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE; 0 asks for every item, unpaged."""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    if limit == 0:
+        return 0
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _encode_cursor(values):
+    """Opaque cursor holding the sort key of the last item on a page."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise HTTPException(400, "Invalid cursor")
+    return values
+
+
+def _after_cursor(sort_field, tie_field, direction, cursor):
+    """Keyset condition selecting the items after the cursor in (sort_field, tie_field) order."""
+    value, tie = _decode_cursor(cursor)
+    op = "$gt" if direction == 1 else "$lt"
+    if sort_field == tie_field:
+        return {tie_field: {op: tie}}
+    return {"$or": [{sort_field: {op: value}}, {sort_field: value, tie_field: {op: tie}}]}
+
+
+async def _keyset_page(collection, query, projection, sort_field, tie_field, direction, cursor, limit):
+    """Fetch one page in (sort_field, tie_field) order; returns (items, next_cursor).
+
+    A limit of 0 fetches every remaining item, with no next_cursor.
+    """
+    if cursor:
+        query = {"$and": [query, _after_cursor(sort_field, tie_field, direction, cursor)]} if query else \
+            _after_cursor(sort_field, tie_field, direction, cursor)
+    items = collection.find(query, projection).sort([(sort_field, direction), (tie_field, direction)])
+    if not limit:
+        return await items.to_list(length=None), None
+    items = await items.limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _encode_cursor([items[-1].get(sort_field), items[-1].get(tie_field)])
+    return items, next_cursor
+
+
+def _format_supplier(supplier, fields=None):
+    """Map a supplier document to the response format, optionally restricted to fields."""
+    formatted = {
+        name: supplier.get(db_field, True if db_field == "active" else None)
+        for name, db_field in SUPPLIER_FIELDS.items()
+    }
+    if fields:
+        return {name: formatted[name] for name in fields}
+    return formatted
+
 
 @router.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@router.get("/ready")
+def ready():
+    """Readiness: 503 until the models warmed up at startup are loaded; /health only says the process is up."""
+    report = readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 @router.get("/suppliers")
-async def list_suppliers():
-    """Fetch all supplier names from database for risk analysis selection."""
+async def list_suppliers(limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Fetch active supplier names for risk analysis selection, sorted by name in Mongo.
+
+    Without limit (or with limit=0) every name is returned; with limit, names are paged by next_cursor.
+    """
     try:
-        # Get all supplier names from MongoDB for analysis selection
-        suppliers_cursor = suppliers_collection.find({"active": True}, {"name": 1, "id": 1})
-        suppliers = await suppliers_cursor.to_list(length=None)
+        query = {"active": True}
+        projection = {"_id": 0, "name": 1, "id": 1}
+        suppliers, next_cursor = await _keyset_page(
+            suppliers_collection, query, projection, "name", "id", 1, cursor,
+            0 if limit is None and not cursor else _page_size(limit)
+        )
 
         # Return supplier names
-        supplier_names = [supplier["name"] for supplier in suppliers]
-
-        return {"suppliers": sorted(supplier_names)}
+        return {"suppliers": [supplier["name"] for supplier in suppliers], "next_cursor": next_cursor}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Failed to retrieve supplier list: {e}")
 
 
 @router.get("/api/suppliers")
-async def get_all_suppliers():
-    """Get all suppliers."""
+async def get_all_suppliers(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "asc",
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    active: Optional[bool] = None,
+    search: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get one page of suppliers, filtered and sorted in Mongo.
+
+    Pass the returned next_cursor to get the following page; limit=0 returns every match
+    unpaged. fields is a comma-separated list of response fields to return.
+    """
+    sort_field = SUPPLIER_SORT_FIELDS.get(sort)
+    if not sort_field:
+        raise HTTPException(400, f"Cannot sort by '{sort}'. Allowed: {', '.join(SUPPLIER_SORT_FIELDS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(400, "order must be 'asc' or 'desc'")
+
+    requested = None
+    if fields:
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in requested if name not in SUPPLIER_FIELDS]
+        if unknown:
+            raise HTTPException(400, f"Unknown fields: {', '.join(unknown)}")
+
     try:
-        suppliers_cursor = suppliers_collection.find()
-        suppliers = await suppliers_cursor.to_list(length=None)
-        # Format data to match frontend expectations
-        formatted_suppliers = []
-        for supplier in suppliers:
-            formatted_suppliers.append({
-                "id": supplier["id"],
-                "name": supplier["name"],
-                "category": supplier["category"],
-                "location": supplier["location"],
-                "riskLevel": supplier["risk_level"],
-                "contact_email": supplier.get("contact_email"),
-                "contact_phone": supplier.get("contact_phone"),
-                "description": supplier.get("description"),
-                "active": supplier.get("active", True),
-                "document_count": supplier.get("document_count", 0),
-                "last_assessment": supplier["last_assessment"],
-                "created_at": supplier["created_at"]
-            })
-        return {"suppliers": formatted_suppliers}
+        query = {}
+        if category:
+            query["category"] = category
+        if location:
+            query["location"] = location
+        if risk_level:
+            query["risk_level"] = risk_level
+        if active is not None:
+            query["active"] = active
+        if search:
+            pattern = re.compile(re.escape(search), re.IGNORECASE)
+            query["$or"] = [{"name": pattern}, {"id": pattern}, {"category": pattern}]
+
+        # Project only what the response needs, plus the keys the cursor is built from
+        projection = None
+        if requested:
+            projection = {"_id": 0, "id": 1, sort_field: 1, **{SUPPLIER_FIELDS[name]: 1 for name in requested}}
+
+        suppliers, next_cursor = await _keyset_page(
+            suppliers_collection, query, projection, sort_field, "id", 1 if order == "asc" else -1,
+            cursor, _page_size(limit)
+        )
+        return {
+            "suppliers": [_format_supplier(supplier, requested) for supplier in suppliers],
+            "next_cursor": next_cursor
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Failed to retrieve suppliers: {e}")
 
 
+@router.get("/api/suppliers/stats")
+async def get_supplier_stats():
+    """Supplier KPIs counted in Mongo: totals, active suppliers, documents and suppliers per risk level."""
+    try:
+        total = await suppliers_collection.count_documents({})
+        active = await suppliers_collection.count_documents({"active": True})
+        by_risk = await suppliers_collection.aggregate([
+            {"$group": {"_id": "$risk_level", "count": {"$sum": 1}, "documents": {"$sum": "$document_count"}}}
+        ]).to_list(length=None)
+        return {
+            "total": total,
+            "active": active,
+            "inactive": total - active,
+            "documents": sum(group["documents"] for group in by_risk),
+            "by_risk_level": {group["_id"]: group["count"] for group in by_risk}
+        }
+    except Exception as e:
+        raise HTTPException(500, f"Failed to retrieve supplier stats: {e}")
+
+
 @router.post("/api/suppliers")
 async def create_supplier(supplier_data: SupplierCreate):
     """Create a new supplier."""
@@ -157,20 +348,160 @@ async def update_supplier(supplier_id: str, supplier_data: SupplierCreate):
 
 @router.delete("/api/suppliers/{supplier_id}")
 async def delete_supplier(supplier_id: str):
-    """Delete a supplier."""
+    """Delete a supplier with its documents, stored files and vectors."""
     try:
         supplier = await suppliers_collection.find_one({"id": supplier_id})
         if not supplier:
             raise HTTPException(404, "Supplier not found")
 
-        await suppliers_collection.delete_one({"id": supplier_id})
-        return {"message": "Supplier deleted successfully"}
+        # Documents, files, previews and Qdrant chunks go with the supplier
+        reclaimed = await delete_supplier_cascade(supplier_id)
+        return {"message": "Supplier deleted successfully", **reclaimed}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(500, f"Failed to delete supplier: {e}")
 
 
+def _validate_extension(file):
+    """Return the lower-cased extension of an upload, rejecting disallowed types."""
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(400, f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}")
+    return file_extension
+
+
+def _write_chunk(buffer, digest, chunk):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+def _discard_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Warning: Could not delete file {path}: {e}")
+
+
+async def _save_upload_content(supplier_id, file, file_extension):
+    """Copy an upload into UPLOAD_DIR in UPLOAD_CHUNK_SIZE chunks, hashing and sizing it on the way.
+
+    Starlette has already spooled the multipart body to a temporary file (in memory only up to
+    1 MB), so this is a second, bounded copy: memory stays at one chunk, and the copy stops as
+    soon as MAX_UPLOAD_SIZE_MB is passed, with 413. Content-addressed: when identical bytes are
+    already stored, the new copy is dropped and the stored one reused.
+    Returns (stored_filename, file_path, file_size, content_hash).
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, f"File {file.filename} exceeds the {MAX_UPLOAD_SIZE_MB} MB upload limit")
+
+    # Generate unique file name
+    file_name = f"{uuid.uuid4()}{file_extension}"
+
+    # Create supplier's document directory
+    supplier_dir = os.path.join(UPLOAD_DIR, supplier_id)
+    await run_in_threadpool(os.makedirs, supplier_dir, exist_ok=True)
+
+    # Copy the spooled upload under a temporary name; memory use stays at one chunk whatever its size
+    file_path = os.path.join(supplier_dir, file_name)
+    temp_path = f"{file_path}.part"
+    digest = hashlib.sha256()
+    file_size = 0
+    try:
+        buffer = await run_in_threadpool(open, temp_path, "wb")
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(413, f"File {file.filename} exceeds the {MAX_UPLOAD_SIZE_MB} MB upload limit")
+                await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+        finally:
+            await run_in_threadpool(buffer.close)
+    except HTTPException:
+        await run_in_threadpool(_discard_file, temp_path)
+        raise
+    except Exception as e:
+        await run_in_threadpool(_discard_file, temp_path)
+        raise HTTPException(500, f"Failed to save file: {e}")
+    content_hash = digest.hexdigest()
+
+    # Reuse the stored copy of identical bytes instead of keeping a second one
+    existing = await document_logs_collection.find_one(
+        {"content_hash": content_hash, "file_extension": file_extension},
+        {"stored_filename": 1, "file_path": 1}
+    )
+    if existing and await run_in_threadpool(os.path.exists, existing["file_path"]):
+        await run_in_threadpool(_discard_file, temp_path)
+        return existing["stored_filename"], existing["file_path"], file_size, content_hash
+
+    try:
+        await run_in_threadpool(os.replace, temp_path, file_path)
+    except Exception as e:
+        await run_in_threadpool(_discard_file, temp_path)
+        raise HTTPException(500, f"Failed to save file: {e}")
+
+    return file_name, file_path, file_size, content_hash
+
+
+async def _store_upload(supplier_id, file, file_extension):
+    """Save an upload to the supplier's directory and log it, returning the document log."""
+    file_id = str(uuid.uuid4())
+    file_name, file_path, file_size, content_hash = await _save_upload_content(supplier_id, file, file_extension)
+
+    # Log document upload
+    document_log = {
+        "supplier_id": supplier_id,
+        "file_id": file_id,
+        "filename": file.filename,
+        "stored_filename": file_name,
+        "file_path": file_path,
+        "file_size": file_size,
+        "file_extension": file_extension,
+        "content_hash": content_hash,
+        "uploaded_at": datetime.now().isoformat(),
+        "ingestion_status": "queued" if file_extension in TEXT_EXTENSIONS else "skipped"
+    }
+    await document_logs_collection.insert_one(document_log)
+
+    # Update document count for supplier
+    await suppliers_collection.update_one(
+        {"id": supplier_id},
+        {"$inc": {"document_count": 1}}
+    )
+
+    schedule_preview(document_log)
+    return document_log
+
+
+async def _remove_file_if_unreferenced(file_path, document_id):
+    """Delete a stored file unless another document log still points at it."""
+    if await document_logs_collection.find_one({"file_path": file_path, "file_id": {"$ne": document_id}}):
+        return
+    # A failure is logged and the database changes go ahead
+    await run_in_threadpool(_discard_file, file_path)
+
+
+async def _release_document_chunks(document):
+    """Remove a document's chunks from Qdrant, keeping chunks still shared with duplicate uploads."""
+    document_id = document["file_id"]
+    try:
+        if document["file_extension"].lower() in TEXT_EXTENSIONS:
+            content_hash = document.get("content_hash")
+            if content_hash:
+                document_ids, vendor_ids = await content_references(content_hash, exclude_document_id=document_id)
+                success, message = release_content_chunks(
+                    qdrant, SUPPLIER_DOC_COLLECTION, content_hash, document_ids, vendor_ids
+                )
+            else:
+                success, message = delete_document_chunks(qdrant, SUPPLIER_DOC_COLLECTION, document_id)
+            print(f"RAG cleanup: {message}")
+    except Exception as e:
+        # Log the error but continue with deletion
+        print(f"Warning: RAG cleanup failed for document {document_id}: {e}")
+
+
 @router.post("/api/suppliers/{supplier_id}/documents")
 async def upload_supplier_document(supplier_id: str, file: UploadFile = File(...)):
     """Upload a document for a specific supplier."""
@@ -180,90 +511,116 @@ async def upload_supplier_document(supplier_id: str, file: UploadFile = File(...
             raise HTTPException(404, "Supplier not found")
 
         # Validate file type
-        allowed_extensions = ['.pdf', '.doc', '.docx', '.png', '.jpg', '.jpeg']
-        file_extension = os.path.splitext(file.filename)[1].lower()
-
-        if file_extension not in allowed_extensions:
-            raise HTTPException(400, f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}")
-
-        # Generate unique file name
-        file_id = str(uuid.uuid4())
-        file_name = f"{file_id}{file_extension}"
-
-        # Create supplier's document directory
-        supplier_dir = os.path.join(UPLOAD_DIR, supplier_id)
-        if not os.path.exists(supplier_dir):
-            os.makedirs(supplier_dir)
-
-        # Save the file
-        file_path = os.path.join(supplier_dir, file_name)
-        try:
-            content = await file.read()
-            with open(file_path, "wb") as buffer:
-                buffer.write(content)
-        except Exception as e:
-            raise HTTPException(500, f"Failed to save file: {e}")
-
-        # Log document upload
-        document_log = {
-            "supplier_id": supplier_id,
-            "file_id": file_id,
-            "filename": file.filename,
-            "stored_filename": file_name,
+        file_extension = _validate_extension(file)
+
+        document_log = await _store_upload(supplier_id, file, file_extension)
+        file_id = document_log["file_id"]
+        file_path = document_log["file_path"]
+
+        # Queue chunking and embedding for RAG; the upload returns before processing
+        job = None
+        if file_extension in TEXT_EXTENSIONS:
+            job = await submit_ingestion_job(
+                file_path=file_path,
+                document_id=file_id,
+                vendor_id=supplier_id,
+                filename=file.filename,
+                content_hash=document_log["content_hash"]
+            )
+            await document_logs_collection.update_one(
+                {"file_id": file_id},
+                {"$set": {"job_id": job["job_id"]}}
+            )
+        else:
+            print(f"RAG debug: Skipping file {file.filename} - not a text-extractable type")
+
+        return {
+            "message": "Document uploaded successfully",
             "file_path": file_path,
-            "file_size": len(content),
-            "file_extension": file_extension,
-            "uploaded_at": datetime.now().isoformat()
+            "document_id": file_id,
+            "job_id": job["job_id"] if job else None,
+            "ingestion_status": job["status"] if job else "skipped"
         }
-        await document_logs_collection.insert_one(document_log)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Failed to upload document: {e}")
 
-        # Update document count for supplier
-        await suppliers_collection.update_one(
-            {"id": supplier_id},
-            {"$inc": {"document_count": 1}}
-        )
 
-        # Chunk and embed document for RAG
-        print(f"RAG debug: Processing file {file.filename}, extension: {file_extension}")
-        try:
-            # Only process text-extractable files for RAG
-            if file_extension.lower() in ['.pdf', '.docx', '.txt']:
-                print(f"RAG debug: Starting chunking for {file.filename}")
-                points, chunk_message = chunk_and_embed_document(
-                    file_path=file_path,
-                    document_id=file_id,
-                    vendor_id=supplier_id,
-                    filename=file.filename,
-                    qdrant_client=qdrant,
-                    collection_name=SUPPLIER_DOC_COLLECTION
-                )
-                print(f"RAG processing: {chunk_message}")
-            else:
-                print(f"RAG debug: Skipping file {file.filename} - not a text-extractable type")
-        except Exception as e:
-            # Log the error but don't fail the upload
-            print(f"Warning: RAG processing failed for {file.filename}: {e}")
-            import traceback
-            traceback.print_exc()
-
-        return {"message": "Document uploaded successfully", "file_path": file_path}
+@router.post("/api/suppliers/{supplier_id}/documents/bulk")
+async def upload_supplier_documents_bulk(supplier_id: str, files: List[UploadFile] = File(...)):
+    """Upload many documents for a supplier and ingest them in one multi-process bulk job."""
+    try:
+        supplier = await suppliers_collection.find_one({"id": supplier_id})
+        if not supplier:
+            raise HTTPException(404, "Supplier not found")
+
+        # Validate every file type and known size before saving anything
+        extensions = [_validate_extension(file) for file in files]
+        for file in files:
+            if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+                raise HTTPException(413, f"File {file.filename} exceeds the {MAX_UPLOAD_SIZE_MB} MB upload limit")
+
+        document_logs = []
+        for file, file_extension in zip(files, extensions):
+            document_logs.append(await _store_upload(supplier_id, file, file_extension))
+
+        # Queue one bulk job for all text-extractable documents
+        documents = []
+        for log in document_logs:
+            if log["file_extension"] not in TEXT_EXTENSIONS:
+                continue
+            documents.append({
+                "file_path": log["file_path"],
+                "document_id": log["file_id"],
+                "vendor_id": supplier_id,
+                "filename": log["filename"],
+                "content_hash": log["content_hash"]
+            })
+        job = None
+        if documents:
+            job = await submit_bulk_ingestion_job(documents, supplier_id)
+            await document_logs_collection.update_many(
+                {"file_id": {"$in": job["document_ids"]}},
+                {"$set": {"job_id": job["job_id"]}}
+            )
+
+        return {
+            "message": f"{len(document_logs)} documents uploaded successfully",
+            "documents": [
+                {
+                    "document_id": log["file_id"],
+                    "filename": log["filename"],
+                    "file_path": log["file_path"],
+                    "ingestion_status": log["ingestion_status"]
+                }
+                for log in document_logs
+            ],
+            "job_id": job["job_id"] if job else None
+        }
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(500, f"Failed to upload document: {e}")
+        raise HTTPException(500, f"Failed to upload documents: {e}")
 
 
 @router.get("/api/suppliers/{supplier_id}/documents")
-async def get_supplier_documents(supplier_id: str):
-    """Get all documents for a specific supplier."""
+async def get_supplier_documents(supplier_id: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Get one page of a supplier's documents, newest first; pass next_cursor for the next page."""
     try:
-        supplier = await suppliers_collection.find_one({"id": supplier_id})
+        supplier = await suppliers_collection.find_one({"id": supplier_id}, {"_id": 1})
         if not supplier:
             raise HTTPException(404, "Supplier not found")
 
-        # Fetch document logs from MongoDB
-        documents_cursor = document_logs_collection.find({"supplier_id": supplier_id}).sort("uploaded_at", -1)
-        documents = await documents_cursor.to_list(length=None)
+        # Fetch document logs from MongoDB, only the fields the response uses
+        projection = {
+            "_id": 0, "file_id": 1, "filename": 1, "file_path": 1, "file_size": 1, "uploaded_at": 1,
+            "file_extension": 1, "ingestion_status": 1, "job_id": 1
+        }
+        documents, next_cursor = await _keyset_page(
+            document_logs_collection, {"supplier_id": supplier_id}, projection,
+            "uploaded_at", "file_id", -1, cursor, _page_size(limit)
+        )
 
         # Format for response
         formatted_documents = []
@@ -279,10 +636,12 @@ async def get_supplier_documents(supplier_id: str):
                 "url": file_url,
                 "size": doc["file_size"],
                 "uploaded_at": doc["uploaded_at"],
-                "extension": doc["file_extension"]
+                "extension": doc["file_extension"],
+                "ingestion_status": doc.get("ingestion_status"),
+                "job_id": doc.get("job_id")
             })
 
-        return {"documents": formatted_documents}
+        return {"documents": formatted_documents, "next_cursor": next_cursor}
     except HTTPException:
         raise
     except Exception as e:
@@ -302,26 +661,16 @@ async def delete_supplier_document(supplier_id: str, document_id: str):
         if not document:
             raise HTTPException(404, "Document not found")
 
-        # Delete the file from filesystem
-        file_path = document["file_path"]
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                # Log the error but continue with database deletion
-                print(f"Warning: Could not delete file {file_path}: {e}")
+        # Delete the file from filesystem, unless a duplicate upload shares it, and the document's preview
+        await _remove_file_if_unreferenced(document["file_path"], document_id)
+        invalidate_preview(document)
 
         # Delete document chunks from Qdrant (only for text-extractable files)
-        try:
-            if document["file_extension"].lower() in ['.pdf', '.docx', '.txt']:
-                success, message = delete_document_chunks(qdrant, SUPPLIER_DOC_COLLECTION, document_id)
-                print(f"RAG cleanup: {message}")
-        except Exception as e:
-            # Log the error but continue with deletion
-            print(f"Warning: RAG cleanup failed for document {document_id}: {e}")
+        await _release_document_chunks(document)
 
         # Delete the document log from database
         await document_logs_collection.delete_one({"file_id": document_id, "supplier_id": supplier_id})
+        await bump_documents_version([supplier_id])
 
         # Update document count for supplier
         await suppliers_collection.update_one(
@@ -336,134 +685,164 @@ async def delete_supplier_document(supplier_id: str, document_id: str):
         raise HTTPException(500, f"Failed to delete document: {e}")
 
 
+@router.put("/api/suppliers/{supplier_id}/documents/{document_id}")
+async def revise_supplier_document(supplier_id: str, document_id: str, file: UploadFile = File(...)):
+    """Replace a document with a revised version; only chunks that changed are re-embedded."""
+    try:
+        supplier = await suppliers_collection.find_one({"id": supplier_id})
+        if not supplier:
+            raise HTTPException(404, "Supplier not found")
+
+        document = await document_logs_collection.find_one({"file_id": document_id, "supplier_id": supplier_id})
+        if not document:
+            raise HTTPException(404, "Document not found")
+
+        file_extension = _validate_extension(file)
+        file_name, file_path, file_size, content_hash = await _save_upload_content(supplier_id, file, file_extension)
+
+        # The preview shows the previous version until it is rendered again
+        invalidate_preview(document)
+        await document_logs_collection.update_one(
+            {"file_id": document_id},
+            {
+                "$set": {
+                    "filename": file.filename,
+                    "stored_filename": file_name,
+                    "file_path": file_path,
+                    "file_size": file_size,
+                    "file_extension": file_extension,
+                    "content_hash": content_hash,
+                    "revised_at": datetime.now().isoformat(),
+                    "ingestion_status": "queued" if file_extension in TEXT_EXTENSIONS else "skipped"
+                },
+                "$inc": {"revision": 1}
+            }
+        )
+        if document["file_path"] != file_path:
+            await _remove_file_if_unreferenced(document["file_path"], None)
+        schedule_preview({
+            **document,
+            "filename": file.filename,
+            "file_path": file_path,
+            "file_extension": file_extension
+        })
+
+        job = None
+        if file_extension not in TEXT_EXTENSIONS:
+            # The new version is not indexed, so the previous version's chunks go away
+            await _release_document_chunks(document)
+            await bump_documents_version([supplier_id])
+        elif document["file_extension"].lower() not in TEXT_EXTENSIONS:
+            job = await submit_ingestion_job(
+                file_path=file_path,
+                document_id=document_id,
+                vendor_id=supplier_id,
+                filename=file.filename,
+                content_hash=content_hash
+            )
+        else:
+            job = await submit_revision_job(
+                file_path=file_path,
+                document_id=document_id,
+                vendor_id=supplier_id,
+                filename=file.filename,
+                content_hash=content_hash,
+                previous_content_hash=document.get("content_hash")
+            )
+        if job:
+            await document_logs_collection.update_one(
+                {"file_id": document_id},
+                {"$set": {"job_id": job["job_id"]}}
+            )
+
+        return {
+            "message": "Document revised successfully",
+            "file_path": file_path,
+            "document_id": document_id,
+            "job_id": job["job_id"] if job else None,
+            "ingestion_status": job["status"] if job else "skipped"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Failed to revise document: {e}")
+
+
+@router.get("/api/ingestion/jobs/{job_id}")
+async def get_ingestion_job_status(job_id: str):
+    """Get the state of a background ingestion job."""
+    try:
+        job = await get_ingestion_job(job_id)
+        if not job:
+            raise HTTPException(404, "Ingestion job not found")
+        return {"job": job}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Failed to retrieve ingestion job: {e}")
+
+
+def _preview_response(request, path):
+    """Serve a stored preview: gzipped when the client accepts it, 304 when the client's copy is current."""
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+    served_path = f"{path}.gz" if use_gzip else path
+    stat = os.stat(path)
+    # Each encoding is a different representation, so it gets its own validator
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-gz" if use_gzip else ""}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding"
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        not_modified = "*" in tags or etag in tags
+    else:
+        not_modified = False
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                not_modified = int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                pass
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    with open(served_path, "rb") as file:
+        content = file.read()
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=content, media_type="text/html; charset=utf-8", headers=headers)
+
+
 @router.get("/api/documents/{document_id}/preview")
-async def preview_document(document_id: str):
-    """Convert a DOCX document to HTML for preview."""
+async def preview_document(document_id: str, request: Request):
+    """Serve a DOCX document as an HTML preview, rendered once and then served from disk."""
     try:
         # Find the document in the database
-        document = await document_logs_collection.find_one({"file_id": document_id})
+        document = await document_logs_collection.find_one(
+            {"file_id": document_id},
+            {"_id": 0, "file_id": 1, "file_path": 1, "file_extension": 1, "filename": 1, "uploaded_at": 1}
+        )
         if not document:
             raise HTTPException(404, "Document not found")
 
-        file_path = document["file_path"]
-
         # Check if file exists
-        if not os.path.exists(file_path):
+        if not os.path.exists(document["file_path"]):
             raise HTTPException(404, "Document file not found")
 
-        # Get file extension
-        file_extension = document.get("file_extension", "").lower()
-
         # Only process DOCX files for now
-        if file_extension not in [".docx"]:
+        if document.get("file_extension", "").lower() not in PREVIEW_EXTENSIONS:
             raise HTTPException(400, "Unsupported file type for preview")
 
-        # Convert DOCX to HTML using mammoth
-        with open(file_path, "rb") as docx_file:
-            result = mammoth.convert_to_html(docx_file)
-
-            # Get the HTML content
-            html_content = result.value
-
-            # Create a styled HTML page
-            full_html = f"""
-            <!DOCTYPE html>
-            <html lang="en">
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>{document["filename"]} - Preview</title>
-                <style>
-                    body {{
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        line-height: 1.6;
-                        margin: 0;
-                        padding: 20px;
-                        background-color: #f5f5f5;
-                    }}
-                    .document-container {{
-                        max-width: 800px;
-                        margin: 0 auto;
-                        background: white;
-                        padding: 30px;
-                        border-radius: 8px;
-                        box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                    }}
-                    .document-header {{
-                        text-align: center;
-                        margin-bottom: 30px;
-                        padding-bottom: 20px;
-                        border-bottom: 1px solid #eee;
-                    }}
-                    .document-header h1 {{
-                        color: #333;
-                        margin-bottom: 10px;
-                        font-size: 24px;
-                    }}
-                    .document-meta {{
-                        color: #666;
-                        font-size: 14px;
-                    }}
-                    .document-content {{
-                        color: #333;
-                        overflow-wrap: break-word;
-                    }}
-                    .document-content h1,
-                    .document-content h2,
-                    .document-content h3,
-                    .document-content h4,
-                    .document-content h5,
-                    .document-content h6 {{
-                        color: #2c3e50;
-                        margin-top: 1.5em;
-                        margin-bottom: 0.5em;
-                    }}
-                    .document-content p {{
-                        margin-bottom: 1em;
-                    }}
-                    .document-content ul,
-                    .document-content ol {{
-                        margin-bottom: 1em;
-                        padding-left: 30px;
-                    }}
-                    .document-content table {{
-                        border-collapse: collapse;
-                        width: 100%;
-                        margin-bottom: 1em;
-                    }}
-                    .document-content td,
-                    .document-content th {{
-                        border: 1px solid #ddd;
-                        padding: 8px;
-                        text-align: left;
-                    }}
-                    .document-content th {{
-                        background-color: #f2f2f2;
-                        font-weight: bold;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="document-container">
-                    <div class="document-header">
-                        <h1>{document["filename"]}</h1>
-                        <div class="document-meta">
-                            Uploaded: {document["uploaded_at"]}
-                        </div>
-                    </div>
-                    <div class="document-content">
-                        {html_content}
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-
-            return HTMLResponse(content=full_html, status_code=200)
-
+        path = await ensure_preview(document)
+        return await run_in_threadpool(_preview_response, request, path)
     except HTTPException:
         raise
-    except mammoth.DocumentConverterError as e:
-        raise HTTPException(422, f"Document conversion error: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(422, str(e))
     except Exception as e:
         raise HTTPException(500, f"Failed to preview document: {str(e)}")
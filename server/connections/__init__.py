@@ -17,6 +17,13 @@ database = mongo_client["supply_chain_analyzer"]
 # Collections
 suppliers_collection = database["suppliers"]
 document_logs_collection = database["document_logs"]
+ingestion_jobs_collection = database["ingestion_jobs"]
+counters_collection = database["counters"]
+ssr_cache_collection = database["ssr_cache"]
+assessment_runs_collection = database["assessment_runs"]
+assessment_results_collection = database["assessment_results"]
+reconciliation_runs_collection = database["reconciliation_runs"]
+content_locks_collection = database["content_locks"]
 
 # Vector DB client (assuming Qdrant)
 qdrant = QdrantClient(url=VECTOR_DB_URL)
@@ -0,0 +1,186 @@
+import os
+from qdrant_client.models import (
+    PayloadSchemaType,
+    VectorParams,
+    VectorParamsDiff,
+    Distance,
+    HnswConfigDiff,
+    CollectionParamsDiff,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    SearchParams,
+    QuantizationSearchParams
+)
+
+# HNSW graph degree and build-time candidate list
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+
+# Search-time candidate list; empty leaves Qdrant's default
+QDRANT_HNSW_EF = os.getenv("QDRANT_HNSW_EF")
+
+# Vector quantization: scalar (int8, ~4x less RAM), binary (~32x, coarse for 384-dim vectors) or none
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "scalar").lower()
+
+# Keep quantized vectors in RAM, and rescore quantized hits with the original vectors
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+QDRANT_QUANTIZATION_RESCORE = os.getenv("QDRANT_QUANTIZATION_RESCORE", "true").lower() == "true"
+QDRANT_QUANTIZATION_OVERSAMPLING = float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0"))
+
+# Store original vectors and payloads on disk (memory-mapped) instead of in RAM
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "true").lower() == "true"
+QDRANT_PAYLOAD_ON_DISK = os.getenv("QDRANT_PAYLOAD_ON_DISK", "true").lower() == "true"
+
+# Payload fields every filtered search, delete or scroll goes through
+PAYLOAD_INDEX_FIELDS = {
+    "vendor_id": PayloadSchemaType.KEYWORD,
+    "document_id": PayloadSchemaType.KEYWORD,
+    "content_hash": PayloadSchemaType.KEYWORD
+}
+
+
+def _quantization_config():
+    """Quantization config for QDRANT_QUANTIZATION, or None when disabled."""
+    if QDRANT_QUANTIZATION == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM)
+        )
+    if QDRANT_QUANTIZATION == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM))
+    if QDRANT_QUANTIZATION == "none":
+        return None
+    raise ValueError(f"Unknown QDRANT_QUANTIZATION '{QDRANT_QUANTIZATION}'; expected scalar, binary or none")
+
+
+def _quantization_kind(config):
+    if isinstance(config, ScalarQuantization):
+        return "scalar"
+    if isinstance(config, BinaryQuantization):
+        return "binary"
+    return "none" if config is None else type(config).__name__
+
+
+def search_params():
+    """Search parameters for dense queries: HNSW ef and rescoring of quantized candidates."""
+    if QDRANT_QUANTIZATION == "none" and not QDRANT_HNSW_EF:
+        return None
+    quantization = None
+    if QDRANT_QUANTIZATION != "none":
+        quantization = QuantizationSearchParams(
+            rescore=QDRANT_QUANTIZATION_RESCORE,
+            oversampling=QDRANT_QUANTIZATION_OVERSAMPLING
+        )
+    return SearchParams(
+        hnsw_ef=int(QDRANT_HNSW_EF) if QDRANT_HNSW_EF else None,
+        quantization=quantization
+    )
+
+
+def ensure_payload_indexes(qdrant_client, collection_name):
+    """Create missing keyword payload indexes so filters use an index instead of scanning payloads."""
+    existing = qdrant_client.get_collection(collection_name).payload_schema or {}
+    created = []
+    for field_name, schema in PAYLOAD_INDEX_FIELDS.items():
+        if field_name in existing:
+            continue
+        qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=schema,
+            wait=True
+        )
+        created.append(field_name)
+    if created:
+        print(f"Created payload indexes on {collection_name}: {', '.join(created)}")
+    return created
+
+
+def _create_collection(qdrant_client, collection_name, dimension, sparse_vectors):
+    qdrant_client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(
+            size=dimension,
+            distance=Distance.COSINE,
+            on_disk=QDRANT_VECTORS_ON_DISK
+        ),
+        sparse_vectors_config=sparse_vectors,
+        hnsw_config=HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT),
+        quantization_config=_quantization_config(),
+        on_disk_payload=QDRANT_PAYLOAD_ON_DISK
+    )
+    print(f"Created collection {collection_name} ({dimension}-dim, quantization={QDRANT_QUANTIZATION})")
+
+
+def _migrate_collection(qdrant_client, collection_name, info, dimension, sparse_vectors):
+    """Bring an existing collection's settings in line with the configuration; returns what changed."""
+    vectors = info.config.params.vectors
+    if isinstance(vectors, dict):
+        vectors = vectors.get("")
+    if vectors is None:
+        raise ValueError(f"Collection {collection_name} has no default dense vector")
+    if vectors.size != dimension:
+        raise ValueError(
+            f"Collection {collection_name} stores {vectors.size}-dim vectors but the embedding model "
+            f"produces {dimension}-dim vectors; recreate the collection and re-ingest"
+        )
+
+    changes = []
+    hnsw = info.config.hnsw_config
+    if hnsw.m != QDRANT_HNSW_M or hnsw.ef_construct != QDRANT_HNSW_EF_CONSTRUCT:
+        qdrant_client.update_collection(
+            collection_name=collection_name,
+            hnsw_config=HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT)
+        )
+        changes.append("hnsw")
+
+    if _quantization_kind(info.config.quantization_config) != QDRANT_QUANTIZATION:
+        qdrant_client.update_collection(
+            collection_name=collection_name,
+            quantization_config=_quantization_config() or Disabled.DISABLED
+        )
+        changes.append("quantization")
+
+    if bool(vectors.on_disk) != QDRANT_VECTORS_ON_DISK:
+        qdrant_client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": VectorParamsDiff(on_disk=QDRANT_VECTORS_ON_DISK)}
+        )
+        changes.append("vectors_on_disk")
+
+    if bool(info.config.params.on_disk_payload) != QDRANT_PAYLOAD_ON_DISK:
+        qdrant_client.update_collection(
+            collection_name=collection_name,
+            collection_params=CollectionParamsDiff(on_disk_payload=QDRANT_PAYLOAD_ON_DISK)
+        )
+        changes.append("payload_on_disk")
+
+    missing_sparse = set(sparse_vectors or {}) - set(info.config.params.sparse_vectors or {})
+    if missing_sparse:
+        # Qdrant cannot add sparse vectors to an existing collection
+        print(f"Warning: collection {collection_name} lacks sparse vectors {sorted(missing_sparse)}; "
+              f"recreate it and re-ingest to enable hybrid search")
+
+    if changes:
+        print(f"Updated collection {collection_name}: {', '.join(changes)} (Qdrant re-optimizes segments in the background)")
+    return changes
+
+
+def ensure_collection(qdrant_client, collection_name, dimension, sparse_vectors=None):
+    """Create the collection, or migrate an existing one, to the configured HNSW, quantization and
+    on-disk settings, validate its dimension and create the payload indexes.
+
+    sparse_vectors is the sparse vector config used when the collection is created.
+    """
+    if not qdrant_client.collection_exists(collection_name):
+        _create_collection(qdrant_client, collection_name, dimension, sparse_vectors)
+        changes = ["created"]
+    else:
+        info = qdrant_client.get_collection(collection_name)
+        changes = _migrate_collection(qdrant_client, collection_name, info, dimension, sparse_vectors)
+
+    indexes = ensure_payload_indexes(qdrant_client, collection_name)
+    return {"collection": collection_name, "dimension": dimension, "changes": changes, "payload_indexes": indexes}
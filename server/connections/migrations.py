@@ -0,0 +1,215 @@
+"""Mongo indexes and data migrations, applied at startup.
+
+INDEXES declares every index the routes and jobs query through; ensure_indexes()
+creates the missing ones (creating an existing index is a no-op). MIGRATIONS are
+one-off data fixes applied in order and recorded in the migrations collection, so
+each runs once per database even with several app workers starting together.
+"""
+import os
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from server.connections import database
+
+# Record operations slower than this many milliseconds in system.profile; empty leaves profiling as configured
+MONGO_PROFILE_SLOW_MS = os.getenv("MONGO_PROFILE_SLOW_MS")
+
+# Slow queries listed in the admin report
+SLOW_QUERY_REPORT_LIMIT = int(os.getenv("SLOW_QUERY_REPORT_LIMIT", "20"))
+
+MIGRATIONS_COLLECTION = "migrations"
+
+# Collection -> indexes, each matching a lookup, filter or keyset sort in the code
+INDEXES = {
+    "suppliers": [
+        # Every supplier route looks suppliers up by id
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Active suppliers by name: /suppliers, the active count and batch assessment
+        IndexModel(
+            [("active", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)],
+            partialFilterExpression={"active": True}
+        ),
+        # /api/suppliers keyset sorts (sort field, id) and equality filters on the same fields
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("location", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("risk_level", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("last_assessment", ASCENDING), ("id", ASCENDING)])
+    ],
+    "document_logs": [
+        IndexModel([("file_id", ASCENDING)], unique=True),
+        # A supplier's documents newest first, keyset-paged on (uploaded_at, file_id)
+        IndexModel([("supplier_id", ASCENDING), ("uploaded_at", DESCENDING), ("file_id", DESCENDING)]),
+        # Upload dedup and content reference counting
+        IndexModel([("content_hash", ASCENDING), ("file_extension", ASCENDING)]),
+        # Stored file reference checks before deleting a file
+        IndexModel([("file_path", ASCENDING)])
+    ],
+    "ingestion_jobs": [
+        IndexModel([("job_id", ASCENDING)], unique=True),
+        # Recovery of queued and running jobs whose lease ran out
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)])
+    ],
+    "ssr_cache": [
+        # Expired SSR entries are removed by Mongo once expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    ],
+    "assessment_runs": [
+        IndexModel([("run_id", ASCENDING)], unique=True)
+    ],
+    "assessment_results": [
+        IndexModel([("run_id", ASCENDING), ("supplier_id", ASCENDING), ("query_index", ASCENDING)])
+    ],
+    "reconciliation_runs": [
+        IndexModel([("run_id", ASCENDING)], unique=True),
+        IndexModel([("started_at", DESCENDING)])
+    ],
+    "content_locks": [
+        # Locks left by crashed workers are removed by Mongo once their lease has passed
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    ]
+}
+
+
+async def _default_supplier_active(db):
+    """Suppliers created without an active flag are shown as active; store it so the
+    active filter and its partial index see them too."""
+    result = await db["suppliers"].update_many({"active": {"$exists": False}}, {"$set": {"active": True}})
+    return f"{result.modified_count} suppliers marked active"
+
+
+# Applied in order; never rename or reorder an applied migration, only append
+MIGRATIONS = [
+    ("0001_default_supplier_active", _default_supplier_active)
+]
+
+
+async def ensure_indexes(db=database):
+    """Create the declared indexes; returns {collection: [index names]}.
+
+    An index that cannot be built (e.g. a unique index over duplicate values) is reported
+    and skipped so the app still starts; the remaining indexes are created.
+    """
+    created = {}
+    for collection_name, indexes in INDEXES.items():
+        names = []
+        for index in indexes:
+            try:
+                names.extend(await db[collection_name].create_indexes([index]))
+            except (DuplicateKeyError, OperationFailure) as e:
+                print(f"Warning: could not create index {index.document['name']} on {collection_name}: {e}")
+        created[collection_name] = names
+    return created
+
+
+async def apply_migrations(db=database):
+    """Apply the migrations not yet recorded; returns the names of those applied now."""
+    migrations = db[MIGRATIONS_COLLECTION]
+    applied = []
+    for name, migrate in MIGRATIONS:
+        # Claiming the migration first keeps concurrent workers from applying it twice
+        try:
+            await migrations.insert_one({"_id": name, "status": "running", "started_at": datetime.now().isoformat()})
+        except DuplicateKeyError:
+            continue
+        try:
+            result = await migrate(db)
+        except Exception as e:
+            # Release the claim so the next startup retries it
+            await migrations.delete_one({"_id": name})
+            raise Exception(f"Migration {name} failed: {e}")
+        await migrations.update_one(
+            {"_id": name},
+            {"$set": {"status": "applied", "result": result, "applied_at": datetime.now().isoformat()}}
+        )
+        print(f"Applied migration {name}: {result}")
+        applied.append(name)
+    return applied
+
+
+async def configure_profiling(db=database):
+    """Record slow operations in system.profile when MONGO_PROFILE_SLOW_MS is set."""
+    if not MONGO_PROFILE_SLOW_MS:
+        return
+    try:
+        await db.command("profile", 1, slowms=int(MONGO_PROFILE_SLOW_MS))
+    except Exception as e:
+        # Not every deployment allows it (e.g. shared clusters or mongos)
+        print(f"Warning: could not enable Mongo profiling: {e}")
+
+
+async def migrate_database(db=database):
+    """Startup entry point: indexes, pending migrations and profiling."""
+    indexes = await ensure_indexes(db)
+    applied = await apply_migrations(db)
+    await configure_profiling(db)
+    return {"indexes": indexes, "migrations": applied}
+
+
+async def _index_usage(db, collection_name):
+    """Per-index access counts since the server started (or the index was built), least used first."""
+    stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(length=None)
+    usage = [
+        {
+            "name": stat["name"],
+            "key": dict(stat["key"]),
+            "ops": stat["accesses"]["ops"],
+            "since": stat["accesses"]["since"].isoformat() if stat["accesses"].get("since") else None
+        }
+        for stat in stats
+    ]
+    usage.sort(key=lambda index: index["ops"])
+    return usage
+
+
+async def _slow_queries(db, limit):
+    """Slowest recent operations recorded by the profiler, with the plan each used."""
+    cursor = db["system.profile"].find(
+        {"ns": {"$ne": f"{db.name}.system.profile"}},
+        {"_id": 0, "ns": 1, "op": 1, "millis": 1, "planSummary": 1, "docsExamined": 1, "keysExamined": 1,
+         "nreturned": 1, "command": 1, "ts": 1}
+    ).sort([("millis", DESCENDING)]).limit(limit)
+    queries = []
+    async for entry in cursor:
+        command = entry.get("command") or {}
+        queries.append({
+            "namespace": entry.get("ns"),
+            "op": entry.get("op"),
+            "millis": entry.get("millis"),
+            "plan": entry.get("planSummary"),
+            "docs_examined": entry.get("docsExamined"),
+            "keys_examined": entry.get("keysExamined"),
+            "returned": entry.get("nreturned"),
+            "filter": repr(command.get("filter", command.get("q"))),
+            "at": entry["ts"].isoformat() if entry.get("ts") else None
+        })
+    return queries
+
+
+async def database_report(db=database, slow_query_limit=SLOW_QUERY_REPORT_LIMIT):
+    """Index usage per managed collection, indexes never used, applied migrations and slow queries."""
+    collections = {}
+    for collection_name in INDEXES:
+        entry = {"documents": await db[collection_name].estimated_document_count()}
+        try:
+            entry["indexes"] = await _index_usage(db, collection_name)
+            entry["unused_indexes"] = [index["name"] for index in entry["indexes"] if index["ops"] == 0]
+        except Exception as e:
+            entry["error"] = f"Index stats unavailable: {e}"
+        collections[collection_name] = entry
+
+    migrations = await db[MIGRATIONS_COLLECTION].find({}, {"status": 1, "result": 1, "applied_at": 1}) \
+        .sort([("_id", ASCENDING)]).to_list(length=None)
+
+    report = {
+        "collections": collections,
+        "migrations": [{"name": m.pop("_id"), **m} for m in migrations],
+        "profiling_slow_ms": int(MONGO_PROFILE_SLOW_MS) if MONGO_PROFILE_SLOW_MS else None
+    }
+    try:
+        report["slow_queries"] = await _slow_queries(db, slow_query_limit)
+    except Exception as e:
+        report["slow_queries"] = []
+        report["slow_queries_error"] = f"Profiler data unavailable: {e}"
+    return report
@@ -0,0 +1,146 @@
+"""SSR retrieval and risk assessment pipeline shared by /analyze and batch assessment.
+
+Failures are raised as exceptions whose message names the failing stage; the API
+routes turn them into HTTP 500 responses.
+"""
+import os
+from starlette.concurrency import run_in_threadpool
+from server.connections import qdrant, SUPPLIER_DOC_COLLECTION
+from server.ingestion.utils import call_llm, parse_risk_assessment, RISK_TEMPLATE
+from server.ingestion.ssr import generate_ssr
+from server.ingestion.retrieval import (
+    search_chunks,
+    search_chunks_per_vendor,
+    vendor_filter,
+    RETRIEVAL_FANOUT,
+    RETRIEVAL_LIMIT
+)
+from server.ingestion.rerank import rerank, reranking_enabled, RERANK_CANDIDATES, RERANK_MMR
+from server.ingestion.context import pack_context, load_tokenizer, tokenizer_loaded, CONTEXT_SEPARATOR
+
+# Ranked chunks offered to the context packer, which keeps what fits CONTEXT_TOKEN_BUDGET
+RETRIEVAL_CONTEXT_CHUNKS = int(os.getenv("RETRIEVAL_CONTEXT_CHUNKS", "6"))
+
+NO_MATERIAL_RESPONSE = {"risk_level": "Low", "evidence": [], "summary": "No relevant material found."}
+NO_RELEVANT_RESPONSE = {"risk_level": "Low", "evidence": [], "summary": "No sufficiently relevant content found."}
+
+
+def cite(payload):
+    """Format a chunk's source, with its page number when the document is paged."""
+    source = payload.get("source", "Unknown")
+    page = payload.get("page")
+    return f"{source} (p. {page})" if page else source
+
+
+async def retrieve_passages(user_query, vendor_ids, ssr_embedding=None):
+    """SSR retrieval: returns the context passages (text, sources, score), best first.
+
+    None means the search found nothing. ssr_embedding skips SSR generation when the
+    caller already holds the query's embedding (batch assessment reuses one per query).
+    """
+    # SSR Steps 1-2: Hypothetical analysis paragraph and its embedding (memoized per query)
+    if ssr_embedding is None:
+        try:
+            hypothetical_analysis, ssr_embedding = await generate_ssr(user_query)
+        except Exception as e:
+            raise Exception(f"SSR generation error: {e}")
+
+    # SSR Steps 3-4: Hybrid search (SSR embedding fused with the query's BM25 terms) over the selected
+    # vendors, either as one MatchAny-filtered search or fanned out for a balanced top-k per vendor
+    fan_out = RETRIEVAL_FANOUT and vendor_ids and len(vendor_ids) > 1
+    try:
+        if fan_out:
+            search_result = await run_in_threadpool(
+                search_chunks_per_vendor,
+                qdrant,
+                SUPPLIER_DOC_COLLECTION,
+                ssr_embedding,
+                user_query,
+                vendor_ids
+            )
+        else:
+            # With reranking, fetch a larger candidate pool for the reranker to choose from
+            search_result = await run_in_threadpool(
+                search_chunks,
+                qdrant,
+                SUPPLIER_DOC_COLLECTION,
+                ssr_embedding,
+                user_query,
+                query_filter=vendor_filter(vendor_ids),
+                limit=RERANK_CANDIDATES if reranking_enabled() else RETRIEVAL_LIMIT,
+                with_vectors=RERANK_MMR
+            )
+    except Exception as e:
+        raise Exception(f"Vector DB search error: {e}")
+
+    if not search_result:
+        return None
+
+    # SSR Step 5: Rerank the candidates against the question itself and keep the best, diverse chunks
+    # (fan-out results are already balanced per vendor and keep their order)
+    if fan_out or not reranking_enabled():
+        ranked = [(hit, float(hit.score)) for hit in search_result[:RETRIEVAL_CONTEXT_CHUNKS]]
+    else:
+        try:
+            ranked = await run_in_threadpool(rerank, user_query, search_result, RETRIEVAL_CONTEXT_CHUNKS)
+        except Exception as e:
+            raise Exception(f"Reranking error: {e}")
+
+    # SSR Step 6: Merge neighbouring chunks, drop repeated text and fill the token budget
+    # (without warm-up the tokenizer is loaded here, off the event loop)
+    if not tokenizer_loaded():
+        await run_in_threadpool(load_tokenizer)
+    return pack_context([(hit.payload, score, cite(hit.payload)) for hit, score in ranked])
+
+
+def risk_messages(user_query, passages):
+    """SSR Step 7: compose the context and build the final assessment prompt."""
+    full_context = CONTEXT_SEPARATOR.join(passage["text"] for passage in passages)
+
+    prompt = RISK_TEMPLATE.format(
+        context=full_context,
+        query=user_query
+    )
+    return [
+        {"role": "system", "content": "Provide risk assessment with level, summary, and evidence."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def evidence(passages):
+    """Extract evidence as document names."""
+    return sorted(list({
+        src
+        for passage in passages
+        for src in passage["sources"]
+    }))
+
+
+def assessment_response(assessment_text, passages):
+    """SSR Step 9: Parse the assessment (simplified parsing)."""
+    risk_level = parse_risk_assessment(assessment_text)
+
+    summary = assessment_text  # For simplicity, use the whole text as summary
+
+    return {
+        "risk_level": risk_level,
+        "evidence": evidence(passages),
+        "summary": summary
+    }
+
+
+async def assess_risk(user_query, vendor_ids, ssr_embedding=None):
+    """Run the SSR retrieval and assessment pipeline for one query."""
+    passages = await retrieve_passages(user_query, vendor_ids, ssr_embedding)
+    if passages is None:
+        return NO_MATERIAL_RESPONSE
+    if not passages:
+        return NO_RELEVANT_RESPONSE
+
+    # SSR Step 8: Call LLM for final risk assessment
+    try:
+        assessment_text = await call_llm(risk_messages(user_query, passages), temperature=0)
+    except Exception as e:
+        raise Exception(f"LLM error: {e}")
+
+    return assessment_response(assessment_text, passages)
@@ -0,0 +1,292 @@
+"""Batch risk assessment of the supplier base.
+
+A run scores every (supplier, standard risk query) pair with a fixed pool of
+ASSESSMENT_CONCURRENCY workers fed from a bounded queue, so memory does not grow
+with the size of the run, reusing one SSR embedding per query across all
+suppliers. Each pair's result is stored as it finishes, so an interrupted or
+partly failed run can be resumed and only redoes what is missing. Once all of a
+supplier's queries are assessed, the worst level becomes the supplier's
+risk_level. Nightly scoring:
+
+    python -m server.ingestion.assessment
+    python -m server.ingestion.assessment --resume <run_id>
+"""
+import os
+import sys
+import uuid
+import asyncio
+import argparse
+from datetime import datetime
+from server.connections import suppliers_collection, assessment_runs_collection, assessment_results_collection
+from server.ingestion.analysis import assess_risk
+from server.ingestion.ssr import generate_ssr, STANDARD_RISK_QUERIES
+from server.ingestion.utils.response_cache import analyze_response_cache
+from server.ingestion.versions import get_documents_version
+
+# (supplier, query) pairs assessed at the same time
+ASSESSMENT_CONCURRENCY = int(os.getenv("ASSESSMENT_CONCURRENCY", "8"))
+
+# Largest run (suppliers x queries) the API starts; the CLI is not capped
+MAX_ASSESSMENT_PAIRS = int(os.getenv("MAX_ASSESSMENT_PAIRS", "20000"))
+
+# Run states
+RUN_QUEUED = "queued"
+RUN_RUNNING = "running"
+RUN_DONE = "done"
+RUN_FAILED = "failed"
+
+# Worst level across a supplier's queries wins
+RISK_SEVERITY = {"Low": 0, "Moderate": 1, "High": 2}
+
+# Keep references to running tasks so they are not garbage collected
+_tasks = set()
+
+
+def _result_id(run_id, supplier_id, query_index):
+    return f"{run_id}:{supplier_id}:{query_index}"
+
+
+async def create_assessment_run(queries=None, supplier_ids=None, max_pairs=None):
+    """Record a new run over the given suppliers (default: all active) and queries (default: the standard set).
+
+    Raises ValueError when the run would have more than max_pairs (supplier, query) pairs.
+    """
+    queries = queries or STANDARD_RISK_QUERIES
+    if supplier_ids is None:
+        suppliers = await suppliers_collection.find({"active": True}, {"id": 1}).to_list(length=None)
+        supplier_ids = [supplier["id"] for supplier in suppliers]
+    if max_pairs is not None and len(queries) * len(supplier_ids) > max_pairs:
+        raise ValueError(
+            f"{len(supplier_ids)} suppliers x {len(queries)} queries is over the limit of {max_pairs} assessments"
+        )
+
+    run = {
+        "run_id": str(uuid.uuid4()),
+        "queries": list(queries),
+        "supplier_ids": list(supplier_ids),
+        "status": RUN_QUEUED,
+        "total": len(queries) * len(supplier_ids),
+        "completed": 0,
+        "failed": 0,
+        "suppliers_updated": 0,
+        "error": None,
+        "created_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None
+    }
+    await assessment_runs_collection.insert_one(run)
+    run.pop("_id", None)
+    return run
+
+
+async def _assess_pair(run_id, supplier_id, query_index, user_query, ssr_embedding):
+    """Assess one supplier against one query and store the result; a failure is stored, not raised."""
+    try:
+        # Repeated nightly runs over unchanged documents are answered from the /analyze cache
+        version = await get_documents_version([supplier_id])
+        cached = analyze_response_cache.get(user_query, [supplier_id], version)
+        if cached:
+            response = cached[0]
+        else:
+            response = await assess_risk(user_query, [supplier_id], ssr_embedding=ssr_embedding)
+            analyze_response_cache.put(user_query, [supplier_id], version, response)
+        fields = {
+            "risk_level": response["risk_level"],
+            "summary": response["summary"],
+            "evidence": response["evidence"],
+            "error": None
+        }
+    except Exception as e:
+        print(f"Warning: assessment of {supplier_id} failed for '{user_query}': {e}")
+        fields = {"risk_level": None, "summary": None, "evidence": [], "error": str(e)}
+
+    await assessment_results_collection.replace_one(
+        {"_id": _result_id(run_id, supplier_id, query_index)},
+        {
+            "run_id": run_id,
+            "supplier_id": supplier_id,
+            "query_index": query_index,
+            "query": user_query,
+            **fields,
+            "assessed_at": datetime.now().isoformat()
+        },
+        upsert=True
+    )
+    await assessment_runs_collection.update_one(
+        {"run_id": run_id},
+        {"$inc": {"failed" if fields["error"] else "completed": 1}}
+    )
+
+
+async def _update_supplier_risk(run, supplier_id):
+    """Write a supplier's overall risk level once every query of the run succeeded for it."""
+    run_id = run["run_id"]
+    results = await assessment_results_collection.find(
+        {"run_id": run_id, "supplier_id": supplier_id, "error": None}, {"risk_level": 1}
+    ).to_list(length=None)
+    if len(results) < len(run["queries"]):
+        return False
+
+    risk_level = max((r["risk_level"] for r in results), key=lambda level: RISK_SEVERITY.get(level, 1))
+    await suppliers_collection.update_one(
+        {"id": supplier_id},
+        {"$set": {
+            "risk_level": risk_level,
+            "last_assessment": datetime.now().isoformat(),
+            "last_assessment_run": run_id
+        }}
+    )
+    return True
+
+
+async def _assess_pending(run, pending, embeddings):
+    """Assess the pending (supplier, query) pairs with ASSESSMENT_CONCURRENCY workers.
+
+    Pairs are queued a few at a time, and a supplier's risk level is written as soon as its
+    last pending pair is done. Returns how many suppliers were updated.
+    """
+    queue = asyncio.Queue(maxsize=ASSESSMENT_CONCURRENCY * 2)
+    remaining = {supplier_id: len(indices) for supplier_id, indices in pending.items()}
+    updated = 0
+
+    async def finish(supplier_id):
+        nonlocal updated
+        if await _update_supplier_risk(run, supplier_id):
+            updated += 1
+
+    async def produce():
+        for supplier_id, indices in pending.items():
+            if not indices:
+                # Resumed after all its queries succeeded; its risk level may not have been written
+                await finish(supplier_id)
+            for i in indices:
+                await queue.put((supplier_id, i))
+        for _ in range(ASSESSMENT_CONCURRENCY):
+            await queue.put(None)
+
+    async def work():
+        while True:
+            pair = await queue.get()
+            if pair is None:
+                return
+            supplier_id, i = pair
+            await _assess_pair(run["run_id"], supplier_id, i, run["queries"][i], embeddings[i])
+            remaining[supplier_id] -= 1
+            if not remaining[supplier_id]:
+                await finish(supplier_id)
+
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(work()) for _ in range(ASSESSMENT_CONCURRENCY)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # A failed worker would otherwise leave the producer waiting on a full queue
+        for task in tasks:
+            task.cancel()
+    return updated
+
+
+async def run_assessment(run_id, force=False):
+    """Run (or resume) an assessment run, skipping pairs that already have a successful result.
+
+    A run marked running is only picked up with force, e.g. after the process running it died.
+    """
+    claim = {"run_id": run_id}
+    if not force:
+        claim["status"] = {"$ne": RUN_RUNNING}
+    run = await assessment_runs_collection.find_one_and_update(
+        claim,
+        {"$set": {"status": RUN_RUNNING, "started_at": datetime.now().isoformat(), "error": None}}
+    )
+    if not run:
+        raise Exception(f"Assessment run {run_id} not found or already running")
+
+    try:
+        done = set()
+        async for result in assessment_results_collection.find({"run_id": run_id, "error": None}, {"_id": 1}):
+            done.add(result["_id"])
+        pending = {
+            supplier_id: [
+                i for i in range(len(run["queries"]))
+                if _result_id(run_id, supplier_id, i) not in done
+            ]
+            for supplier_id in run["supplier_ids"]
+        }
+        await assessment_runs_collection.update_one(
+            {"run_id": run_id},
+            {"$set": {"completed": len(done), "failed": 0}}
+        )
+
+        # One SSR paragraph and embedding per query, shared by every supplier
+        embeddings = {}
+        for i, user_query in enumerate(run["queries"]):
+            if any(i in indices for indices in pending.values()):
+                _, embeddings[i] = await generate_ssr(user_query)
+
+        updated = await _assess_pending(run, pending, embeddings)
+
+        await assessment_runs_collection.update_one(
+            {"run_id": run_id},
+            {"$set": {
+                "status": RUN_DONE,
+                "suppliers_updated": updated,
+                "finished_at": datetime.now().isoformat()
+            }}
+        )
+    except Exception as e:
+        print(f"Warning: assessment run {run_id} failed: {e}")
+        await assessment_runs_collection.update_one(
+            {"run_id": run_id},
+            {"$set": {"status": RUN_FAILED, "error": str(e), "finished_at": datetime.now().isoformat()}}
+        )
+
+    return await get_assessment_run(run_id)
+
+
+def start_assessment_run(run_id, force=False):
+    """Run an assessment run in the background of the server's event loop."""
+    task = asyncio.create_task(run_assessment(run_id, force=force))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def get_assessment_run(run_id):
+    """Fetch a run record by id."""
+    return await assessment_runs_collection.find_one({"run_id": run_id}, {"_id": 0})
+
+
+async def get_assessment_results(run_id, supplier_id=None):
+    """Per-(supplier, query) results of a run."""
+    query = {"run_id": run_id}
+    if supplier_id:
+        query["supplier_id"] = supplier_id
+    cursor = assessment_results_collection.find(query, {"_id": 0}).sort([("supplier_id", 1), ("query_index", 1)])
+    return await cursor.to_list(length=None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assess every active supplier against the standard risk queries.")
+    parser.add_argument("--file", help="Text file with one query per line (defaults to the built-in standard queries)")
+    parser.add_argument("--supplier", action="append", dest="suppliers", help="Supplier id to assess (repeatable)")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Resume an interrupted or partly failed run")
+    args = parser.parse_args(argv)
+
+    async def run():
+        if args.resume:
+            return await run_assessment(args.resume, force=True)
+        queries = None
+        if args.file:
+            with open(args.file, "r", encoding="utf-8") as file:
+                queries = [line.strip() for line in file if line.strip()]
+        created = await create_assessment_run(queries, args.suppliers)
+        print(f"Assessment run {created['run_id']}: {created['total']} assessments")
+        return await run_assessment(created["run_id"])
+
+    result = asyncio.run(run())
+    print(f"Run {result['run_id']} {result['status']}: {result['completed']} of {result['total']} assessed, "
+          f"{result['failed']} failed, {result['suppliers_updated']} suppliers updated.")
+    return 0 if result["status"] == RUN_DONE and not result["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
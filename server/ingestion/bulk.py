@@ -0,0 +1,270 @@
+"""Bulk ingestion pipeline.
+
+Text extraction runs in a process pool (PyPDF2 is pure Python and holds the
+GIL), embedding runs as one shared batched stage in the calling process, and
+each window's Qdrant upsert overlaps with embedding the next window.
+
+Backfill from the command line:
+
+    python -m server.ingestion.bulk uploads/SUP-*
+
+Stored files are matched to their document logs, so chunks carry the document ids the
+API assigned; files no log points at are skipped.
+"""
+import os
+import sys
+import glob
+import time
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from qdrant_client.models import Filter, FieldCondition, MatchAny
+from server.ingestion.extraction import extract_document_chunks
+from server.ingestion.utils import (
+    build_chunk_point,
+    set_document_chunk_total,
+    delete_chunk_points,
+    embed_texts,
+    collection_has_sparse_vectors
+)
+from server.ingestion.utils.embeddings import EMBED_WINDOW_SIZE
+
+TEXT_EXTENSIONS = ['.pdf', '.docx', '.txt']
+
+# Processes used for text extraction
+BULK_EXTRACT_WORKERS = int(os.getenv("BULK_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+
+
+def _stage_report(items, seconds):
+    """Summarize one pipeline stage."""
+    return {
+        "items": items,
+        "seconds": round(seconds, 3),
+        "per_second": round(items / seconds, 2) if seconds > 0 else None
+    }
+
+
+def _timed(iterable, timings, stage):
+    """Yield from iterable, adding the time spent waiting for each item to timings[stage]."""
+    iterator = iter(iterable)
+    while True:
+        wait_started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings[stage] += time.perf_counter() - wait_started
+        yield item
+
+
+def ingest_documents(documents, qdrant_client, collection_name, workers=BULK_EXTRACT_WORKERS,
+                     window_size=EMBED_WINDOW_SIZE, log=print):
+    """Ingest many documents through the extract -> embed -> upsert pipeline.
+
+    Each document is a dict with file_path, document_id, vendor_id and filename, plus the
+    optional content_hash/document_ids/vendor_ids used by build_chunk_point.
+    Returns per-document results and per-stage throughput. If embedding or an upsert fails,
+    the chunks already upserted are deleted again before the error is raised.
+    """
+    started = time.perf_counter()
+    results = {doc["document_id"]: {"chunk_count": 0, "error": None} for doc in documents}
+    if not documents:
+        return {"documents": results, "chunk_count": 0, "stages": {}}
+
+    timings = {"extract": 0.0, "embed": 0.0, "upsert": 0.0}
+    counts = {"extract": 0, "embed": 0, "upsert": 0}
+    buffer = []
+    pending_upsert = None
+    upserted_ids = []
+    sparse = collection_has_sparse_vectors(qdrant_client, collection_name)
+
+    def upsert(points):
+        upsert_started = time.perf_counter()
+        qdrant_client.upsert(collection_name=collection_name, points=points)
+        return len(points), time.perf_counter() - upsert_started
+
+    def wait_for_upsert():
+        nonlocal pending_upsert
+        if pending_upsert is not None:
+            upserted, seconds = pending_upsert.result()
+            counts["upsert"] += upserted
+            timings["upsert"] += seconds
+            pending_upsert = None
+
+    def flush(window):
+        nonlocal pending_upsert
+        embed_started = time.perf_counter()
+        vectors = embed_texts([chunk for _, _, _, chunk in window])
+        timings["embed"] += time.perf_counter() - embed_started
+        counts["embed"] += len(window)
+
+        points = [
+            build_chunk_point(i, page_number, chunk, embedding, doc, sparse=sparse)
+            for (doc, i, page_number, chunk), embedding in zip(window, vectors)
+        ]
+
+        # Keep at most one upsert in flight so memory stays bounded to two windows
+        wait_for_upsert()
+        upserted_ids.extend(point.id for point in points)
+        pending_upsert = upserter.submit(upsert, points)
+
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="upsert") as upserter:
+            futures = {pool.submit(extract_document_chunks, doc["file_path"]): doc for doc in documents}
+
+            # Only the time spent waiting on the pool counts as extraction; flushing happens in between
+            for future in _timed(as_completed(futures), timings, "extract"):
+                doc = futures[future]
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    results[doc["document_id"]]["error"] = str(e)
+                    log(f"Warning: extraction failed for {doc['filename']}: {e}")
+                    continue
+
+                counts["extract"] += 1
+                results[doc["document_id"]]["chunk_count"] = len(chunks)
+                buffer.extend((doc, i, page_number, chunk) for i, page_number, chunk in chunks)
+
+                while len(buffer) >= window_size:
+                    flush(buffer[:window_size])
+                    buffer = buffer[window_size:]
+
+            if buffer:
+                flush(buffer)
+            wait_for_upsert()
+
+        for document_id, result in results.items():
+            if result["chunk_count"]:
+                set_document_chunk_total(qdrant_client, collection_name, document_id, result["chunk_count"])
+
+    except Exception:
+        # Windows upserted before the failure have no total_chunks and would still be retrieved
+        if upserted_ids:
+            try:
+                delete_chunk_points(qdrant_client, collection_name, upserted_ids)
+            except Exception as cleanup_error:
+                log(f"Warning: could not remove partial chunks of the bulk ingest: {cleanup_error}")
+        raise
+
+    total_seconds = time.perf_counter() - started
+    return {
+        "documents": results,
+        "chunk_count": counts["upsert"],
+        "stages": {
+            # Extraction is measured as time blocked on the pool; embed and upsert as busy time
+            "extract": _stage_report(counts["extract"], timings["extract"]),
+            "embed": _stage_report(counts["embed"], timings["embed"]),
+            "upsert": _stage_report(counts["upsert"], timings["upsert"]),
+            "total": _stage_report(len(documents), total_seconds)
+        }
+    }
+
+
+async def collect_directory_documents(directories):
+    """Build document specs for the uploads stored in the given directories, from their document logs.
+
+    Stored file names do not identify documents: duplicate uploads share one stored file, so
+    each file is matched to every log pointing at it. Returns (documents, unlogged file paths).
+    """
+    from server.connections import document_logs_collection
+
+    documents = []
+    unlogged = []
+    references = {}
+    for directory in directories:
+        for file_path in sorted(glob.glob(os.path.join(directory, "*"))):
+            if os.path.splitext(file_path)[1].lower() not in TEXT_EXTENSIONS:
+                continue
+            # Logs store the path as it was joined from UPLOAD_DIR, which may differ in form from the argument
+            candidates = list({file_path, os.path.normpath(file_path), os.path.abspath(file_path)})
+            logs = await document_logs_collection.find(
+                {"file_path": {"$in": candidates}},
+                {"_id": 0, "file_id": 1, "supplier_id": 1, "filename": 1, "content_hash": 1}
+            ).to_list(length=None)
+            if not logs:
+                unlogged.append(file_path)
+                continue
+            for log in logs:
+                document = {
+                    "file_path": file_path,
+                    "document_id": log["file_id"],
+                    "vendor_id": log["supplier_id"],
+                    "filename": log["filename"]
+                }
+                content_hash = log.get("content_hash")
+                if content_hash:
+                    if content_hash not in references:
+                        uploads = await document_logs_collection.find(
+                            {"content_hash": content_hash}, {"file_id": 1, "supplier_id": 1}
+                        ).to_list(length=None)
+                        references[content_hash] = (
+                            sorted({upload["file_id"] for upload in uploads}),
+                            sorted({upload["supplier_id"] for upload in uploads})
+                        )
+                    document["content_hash"] = content_hash
+                    document["document_ids"], document["vendor_ids"] = references[content_hash]
+                documents.append(document)
+    return documents, unlogged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest supplier upload directories into Qdrant.")
+    parser.add_argument("directories", nargs="+", help="Supplier upload directories, e.g. uploads/SUP-*")
+    parser.add_argument("--workers", type=int, default=BULK_EXTRACT_WORKERS, help="Extraction processes")
+    parser.add_argument("--window", type=int, default=EMBED_WINDOW_SIZE, help="Chunks embedded and upserted together")
+    parser.add_argument("--keep-existing", action="store_true",
+                        help="Reuse chunks already stored for the same content instead of re-embedding them")
+    args = parser.parse_args(argv)
+
+    from server.connections import qdrant, SUPPLIER_DOC_COLLECTION
+    from server.ingestion.jobs import ingest_bulk_documents
+    from server.ingestion.versions import bump_documents_version
+
+    directories = [path for pattern in args.directories for path in glob.glob(pattern) if os.path.isdir(path)]
+
+    async def run():
+        documents, unlogged = await collect_directory_documents(directories)
+        for file_path in unlogged:
+            print(f"Warning: skipping {file_path}, no document log points at it")
+        if not documents:
+            return None
+
+        if not args.keep_existing:
+            # Re-ingestion replaces previous chunks instead of duplicating them: the chunks of this
+            # content, and chunks stored before content hashing under these document ids
+            content_hashes = sorted({doc["content_hash"] for doc in documents if doc.get("content_hash")})
+            document_ids = [doc["document_id"] for doc in documents]
+            conditions = [FieldCondition(key="document_id", match=MatchAny(any=document_ids))]
+            if content_hashes:
+                conditions.append(FieldCondition(key="content_hash", match=MatchAny(any=content_hashes)))
+            qdrant.delete(collection_name=SUPPLIER_DOC_COLLECTION, points_selector=Filter(should=conditions))
+
+        print(f"Ingesting {len(documents)} documents from {len(directories)} directories...")
+        result = ingest_bulk_documents(documents, workers=args.workers, window_size=args.window)
+        # Searchable content changed: invalidate cached assessments for these vendors
+        await bump_documents_version(sorted({
+            vendor_id for doc in documents for vendor_id in doc.get("vendor_ids") or [doc["vendor_id"]]
+        }))
+        return result
+
+    result = asyncio.run(run())
+    if result is None:
+        print("No text-extractable documents found.")
+        return 1
+
+    failed = {doc_id: r["error"] for doc_id, r in result["documents"].items() if r["error"]}
+    for stage, stats in result["stages"].items():
+        print(f"{stage:>8}: {stats['items']} items in {stats['seconds']}s ({stats['per_second']}/s)")
+    print(f"{result['message']}; {len(failed)} documents failed.")
+    for doc_id, error in failed.items():
+        print(f"  {doc_id}: {error}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
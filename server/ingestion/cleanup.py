@@ -0,0 +1,501 @@
+"""Cascading supplier deletion and the orphan reconciler.
+
+Deleting a supplier removes its document logs, stored files, previews and every
+Qdrant chunk only it references (one filtered delete); chunks shared with other
+suppliers' uploads keep their other references.
+
+The reconciler scans Mongo, UPLOAD_DIR and Qdrant for what such cleanups miss:
+document logs of deleted suppliers, files and previews no log points at,
+content-addressed chunks no document references (or whose references drifted)
+and wrong document_count values. Chunks without a content hash are counted but
+never deleted. With --repair it repairs them in batches; either way it stores a
+report of what it found and reclaimed:
+
+    python -m server.ingestion.cleanup           # report only
+    python -m server.ingestion.cleanup --repair  # repair
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from starlette.concurrency import run_in_threadpool
+from server.connections import (
+    qdrant,
+    SUPPLIER_DOC_COLLECTION,
+    suppliers_collection,
+    document_logs_collection,
+    reconciliation_runs_collection
+)
+from server.ingestion.utils import (
+    delete_vendor_chunks,
+    delete_chunk_points,
+    set_content_references,
+    release_content_chunks
+)
+from server.ingestion.preview import invalidate_preview, preview_path, PREVIEW_SUFFIX
+from server.ingestion.versions import bump_documents_version
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+
+# Points, files and supplier updates handled per batch
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "256"))
+
+# Files modified more recently than this may belong to an upload still being logged; left alone
+RECONCILE_GRACE_MINUTES = int(os.getenv("RECONCILE_GRACE_MINUTES", "60"))
+
+# Hours between scheduled reconciliations in the server; 0 (the default) disables the schedule
+RECONCILE_INTERVAL_HOURS = float(os.getenv("RECONCILE_INTERVAL_HOURS", "0"))
+
+# Whether scheduled runs delete what they find; otherwise they only report it
+RECONCILE_REPAIR = os.getenv("RECONCILE_REPAIR", "false").lower() == "true"
+
+# Documents without their stored file listed by id in a report (they are all counted)
+MISSING_FILES_REPORTED = 100
+
+# Run states
+RUN_RUNNING = "running"
+RUN_DONE = "done"
+RUN_FAILED = "failed"
+
+# Keep references to running tasks so they are not garbage collected
+_tasks = set()
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _remove_file(path):
+    """Delete a file; returns the bytes reclaimed."""
+    size = _file_size(path)
+    try:
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+    except Exception as e:
+        print(f"Warning: Could not delete file {path}: {e}")
+        return 0
+
+
+def _preview_bytes(document):
+    path = preview_path(document)
+    return _file_size(path) + _file_size(f"{path}.gz")
+
+
+async def delete_supplier_documents(supplier_id):
+    """Remove a supplier's chunks, document logs, files and previews; returns what was reclaimed.
+
+    Works whether or not the supplier row still exists, so the reconciler uses it for orphaned logs.
+    """
+    logs = await document_logs_collection.find(
+        {"supplier_id": supplier_id},
+        {"_id": 0, "file_id": 1, "file_path": 1, "content_hash": 1}
+    ).to_list(length=None)
+    document_ids = [log["file_id"] for log in logs]
+
+    # Chunks referenced only by this supplier go in one filtered delete
+    vectors_deleted = await run_in_threadpool(delete_vendor_chunks, qdrant, SUPPLIER_DOC_COLLECTION, supplier_id)
+
+    # Content also uploaded by other suppliers keeps its chunks, minus this supplier's references
+    for content_hash in {log["content_hash"] for log in logs if log.get("content_hash")}:
+        others = await document_logs_collection.find(
+            {"content_hash": content_hash, "supplier_id": {"$ne": supplier_id}},
+            {"file_id": 1, "supplier_id": 1}
+        ).to_list(length=None)
+        if others:
+            await run_in_threadpool(
+                release_content_chunks,
+                qdrant,
+                SUPPLIER_DOC_COLLECTION,
+                content_hash,
+                sorted({log["file_id"] for log in others}),
+                sorted({log["supplier_id"] for log in others})
+            )
+
+    await document_logs_collection.delete_many({"supplier_id": supplier_id})
+
+    # Stored files go unless another supplier's upload of the same bytes still points at them
+    bytes_reclaimed = 0
+    files_deleted = 0
+    for file_path in {log["file_path"] for log in logs}:
+        if await document_logs_collection.find_one({"file_path": file_path}, {"_id": 1}):
+            continue
+        reclaimed = await run_in_threadpool(_remove_file, file_path)
+        if reclaimed:
+            files_deleted += 1
+            bytes_reclaimed += reclaimed
+    for log in logs:
+        bytes_reclaimed += await run_in_threadpool(_preview_bytes, log)
+        invalidate_preview(log)
+
+    supplier_dir = os.path.join(UPLOAD_DIR, supplier_id)
+    try:
+        os.rmdir(supplier_dir)
+    except OSError:
+        # Missing, or still holding files shared with other suppliers
+        pass
+
+    if document_ids:
+        await bump_documents_version([supplier_id])
+    return {
+        "documents": len(document_ids),
+        "vectors_deleted": vectors_deleted,
+        "files_deleted": files_deleted,
+        "bytes_reclaimed": bytes_reclaimed
+    }
+
+
+async def delete_supplier_cascade(supplier_id):
+    """Delete a supplier with everything stored for it."""
+    reclaimed = await delete_supplier_documents(supplier_id)
+    await suppliers_collection.delete_one({"id": supplier_id})
+    return reclaimed
+
+
+def _new_report():
+    return {
+        "orphan_documents": 0,
+        "orphan_document_suppliers": [],
+        "missing_files": 0,
+        "missing_file_documents": [],
+        "orphan_files": 0,
+        "bytes_reclaimed": 0,
+        "orphan_vectors": 0,
+        "unhashed_vectors": 0,
+        "drifted_references": 0,
+        "document_counts_fixed": 0,
+        "errors": []
+    }
+
+
+async def _reconcile_orphan_documents(report, repair):
+    """Document logs whose supplier no longer exists."""
+    supplier_ids = set(await suppliers_collection.distinct("id"))
+    orphaned = [sid for sid in await document_logs_collection.distinct("supplier_id") if sid not in supplier_ids]
+    for supplier_id in orphaned:
+        count = await document_logs_collection.count_documents({"supplier_id": supplier_id})
+        report["orphan_documents"] += count
+        report["orphan_document_suppliers"].append(supplier_id)
+        if repair:
+            reclaimed = await delete_supplier_documents(supplier_id)
+            report["orphan_vectors"] += reclaimed["vectors_deleted"]
+            report["bytes_reclaimed"] += reclaimed["bytes_reclaimed"]
+
+
+async def _load_documents():
+    """file_id -> (supplier_id, content_hash, file_path) for every document log."""
+    documents = {}
+    async for log in document_logs_collection.find({}, {"_id": 0, "file_id": 1, "supplier_id": 1,
+                                                        "content_hash": 1, "file_path": 1}):
+        documents[log["file_id"]] = (log.get("supplier_id"), log.get("content_hash"), log.get("file_path"))
+    return documents
+
+
+def _scan_upload_dir(referenced_paths, document_ids, grace_seconds):
+    """Files in UPLOAD_DIR no document log accounts for, as (path, size, is_derived).
+
+    Derived files (partial uploads, previews) are orphans outright; stored uploads are
+    rechecked against Mongo before deletion.
+    """
+    candidates = []
+    if not os.path.isdir(UPLOAD_DIR):
+        return candidates
+    cutoff = time.time() - grace_seconds
+    for dirpath, _, filenames in os.walk(UPLOAD_DIR):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+            if name.endswith(".part"):
+                candidates.append((path, stat.st_size, True))
+                continue
+            for suffix in (PREVIEW_SUFFIX, f"{PREVIEW_SUFFIX}.gz"):
+                if name.endswith(suffix):
+                    if name[:-len(suffix)] not in document_ids:
+                        candidates.append((path, stat.st_size, True))
+                    break
+            else:
+                if os.path.normpath(path) not in referenced_paths:
+                    candidates.append((path, stat.st_size, False))
+    return candidates
+
+
+async def _reconcile_files(report, documents, repair):
+    """Stored files, previews and partial uploads that no document log points at."""
+    referenced_paths = {os.path.normpath(path) for _, _, path in documents.values() if path}
+    for file_id, (_, _, path) in documents.items():
+        if path and not await run_in_threadpool(os.path.exists, path):
+            report["missing_files"] += 1
+            if len(report["missing_file_documents"]) < MISSING_FILES_REPORTED:
+                report["missing_file_documents"].append(file_id)
+
+    candidates = await run_in_threadpool(
+        _scan_upload_dir, referenced_paths, set(documents), RECONCILE_GRACE_MINUTES * 60
+    )
+    for start in range(0, len(candidates), RECONCILE_BATCH_SIZE):
+        batch = candidates[start:start + RECONCILE_BATCH_SIZE]
+        # Uploads logged since the snapshot are not orphans
+        paths = [path for path, _, is_derived in batch if not is_derived]
+        logged = set()
+        if paths:
+            logged = {log["file_path"] for log in await document_logs_collection.find(
+                {"file_path": {"$in": paths}}, {"file_path": 1}
+            ).to_list(length=None)}
+        for path, size, _ in batch:
+            if path in logged:
+                continue
+            report["orphan_files"] += 1
+            if repair:
+                report["bytes_reclaimed"] += await run_in_threadpool(_remove_file, path)
+            else:
+                report["bytes_reclaimed"] += size
+
+    if repair:
+        # Directories of deleted suppliers left empty
+        supplier_ids = set(await suppliers_collection.distinct("id"))
+        for entry in await run_in_threadpool(lambda: os.listdir(UPLOAD_DIR) if os.path.isdir(UPLOAD_DIR) else []):
+            path = os.path.join(UPLOAD_DIR, entry)
+            if entry not in supplier_ids and os.path.isdir(path):
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    pass
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+async def _reconcile_vectors(report, documents, repair):
+    """Chunks no document references any more, and shared chunks whose references drifted.
+
+    Only content-addressed chunks are judged; chunks without a content_hash are counted.
+    """
+    drifted = set()
+    offset = None
+    while True:
+        points, offset = await run_in_threadpool(
+            qdrant.scroll,
+            collection_name=SUPPLIER_DOC_COLLECTION,
+            with_payload=["document_id", "vendor_id", "content_hash"],
+            with_vectors=False,
+            limit=RECONCILE_BATCH_SIZE,
+            offset=offset
+        )
+
+        # Documents logged since the snapshot are live too
+        unknown = {
+            document_id
+            for point in points if point.payload.get("content_hash")
+            for document_id in _as_list(point.payload.get("document_id"))
+            if document_id not in documents
+        }
+        if unknown:
+            async for log in document_logs_collection.find(
+                {"file_id": {"$in": list(unknown)}},
+                {"_id": 0, "file_id": 1, "supplier_id": 1, "content_hash": 1, "file_path": 1}
+            ):
+                documents[log["file_id"]] = (log.get("supplier_id"), log.get("content_hash"), log.get("file_path"))
+
+        orphans = []
+        for point in points:
+            content_hash = point.payload.get("content_hash")
+            if not content_hash:
+                # Stored before content hashing or written outside the upload path; their document
+                # ids need not match document logs, so they are reported and left alone
+                report["unhashed_vectors"] += 1
+                continue
+            document_ids = _as_list(point.payload.get("document_id"))
+            live = [document_id for document_id in document_ids if document_id in documents]
+            if not live:
+                orphans.append(point.id)
+                continue
+            vendor_ids = {documents[document_id][0] for document_id in live}
+            if (len(live) != len(document_ids)
+                    or set(_as_list(point.payload.get("vendor_id"))) != vendor_ids):
+                drifted.add(content_hash)
+
+        report["orphan_vectors"] += len(orphans)
+        if orphans and repair:
+            await run_in_threadpool(delete_chunk_points, qdrant, SUPPLIER_DOC_COLLECTION, orphans)
+        if offset is None:
+            break
+
+    report["drifted_references"] += len(drifted)
+    if repair:
+        for content_hash in drifted:
+            logs = await document_logs_collection.find(
+                {"content_hash": content_hash}, {"file_id": 1, "supplier_id": 1}
+            ).to_list(length=None)
+            await run_in_threadpool(
+                set_content_references,
+                qdrant,
+                SUPPLIER_DOC_COLLECTION,
+                content_hash,
+                sorted({log["file_id"] for log in logs}),
+                sorted({log["supplier_id"] for log in logs})
+            )
+
+
+async def _reconcile_document_counts(report, repair):
+    """Suppliers whose document_count does not match their document logs."""
+    counts = {
+        group["_id"]: group["count"]
+        for group in await document_logs_collection.aggregate([
+            {"$group": {"_id": "$supplier_id", "count": {"$sum": 1}}}
+        ]).to_list(length=None)
+    }
+    updates = []
+    async for supplier in suppliers_collection.find({}, {"_id": 0, "id": 1, "document_count": 1}):
+        expected = counts.get(supplier["id"], 0)
+        if supplier.get("document_count") != expected:
+            updates.append(UpdateOne({"id": supplier["id"]}, {"$set": {"document_count": expected}}))
+    report["document_counts_fixed"] = len(updates)
+    if repair:
+        for start in range(0, len(updates), RECONCILE_BATCH_SIZE):
+            await suppliers_collection.bulk_write(updates[start:start + RECONCILE_BATCH_SIZE], ordered=False)
+
+
+async def create_reconciliation_run(repair=False):
+    """Record a new reconciliation run."""
+    run = {
+        "run_id": str(uuid.uuid4()),
+        "repair": repair,
+        "status": RUN_RUNNING,
+        "report": None,
+        "error": None,
+        "started_at": datetime.now().isoformat(),
+        "finished_at": None
+    }
+    await reconciliation_runs_collection.insert_one(run)
+    run.pop("_id", None)
+    return run
+
+
+async def run_reconciliation(run_id):
+    """Scan for orphans and drift, repairing them unless the run is a dry run, and store the report."""
+    run = await reconciliation_runs_collection.find_one({"run_id": run_id})
+    if not run:
+        raise Exception(f"Reconciliation run {run_id} not found")
+    repair = run["repair"]
+    report = _new_report()
+    try:
+        # Orphaned logs first, so their files and chunks are not counted twice
+        await _reconcile_orphan_documents(report, repair)
+        documents = await _load_documents()
+        stages = [
+            ("files", lambda: _reconcile_files(report, documents, repair)),
+            ("vectors", lambda: _reconcile_vectors(report, documents, repair)),
+            ("document_count", lambda: _reconcile_document_counts(report, repair))
+        ]
+        for stage, reconcile in stages:
+            try:
+                await reconcile()
+            except Exception as e:
+                print(f"Warning: reconciliation of {stage} failed: {e}")
+                report["errors"].append(f"{stage}: {e}")
+        status = RUN_DONE
+        error = None
+    except Exception as e:
+        print(f"Warning: reconciliation run {run_id} failed: {e}")
+        status = RUN_FAILED
+        error = str(e)
+
+    await reconciliation_runs_collection.update_one(
+        {"run_id": run_id},
+        {"$set": {"status": status, "report": report, "error": error, "finished_at": datetime.now().isoformat()}}
+    )
+    return await get_reconciliation_run(run_id)
+
+
+def start_reconciliation_run(run_id):
+    """Run a reconciliation in the background of the server's event loop."""
+    task = asyncio.create_task(run_reconciliation(run_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def get_reconciliation_run(run_id):
+    """Fetch a run record by id."""
+    return await reconciliation_runs_collection.find_one({"run_id": run_id}, {"_id": 0})
+
+
+async def get_reconciliation_runs(limit=10):
+    """Most recent runs first."""
+    cursor = reconciliation_runs_collection.find({}, {"_id": 0}).sort([("started_at", -1)]).limit(limit)
+    return await cursor.to_list(length=None)
+
+
+async def run_scheduled_reconciliation(interval):
+    """One scheduled run, unless another worker started one within the last half interval.
+
+    Repairs only with RECONCILE_REPAIR; returns the run, or None when it was skipped.
+    """
+    # With several workers, the first to wake up runs it
+    recent = await reconciliation_runs_collection.find_one(
+        {"started_at": {"$gt": (datetime.now() - interval / 2).isoformat()}}
+    )
+    if recent:
+        return None
+    run = await create_reconciliation_run(repair=RECONCILE_REPAIR)
+    return await run_reconciliation(run["run_id"])
+
+
+async def _reconcile_on_schedule():
+    interval = timedelta(hours=RECONCILE_INTERVAL_HOURS)
+    while True:
+        await asyncio.sleep(interval.total_seconds())
+        try:
+            await run_scheduled_reconciliation(interval)
+        except Exception as e:
+            print(f"Warning: scheduled reconciliation failed: {e}")
+
+
+def start_reconciliation_schedule():
+    """Reconcile every RECONCILE_INTERVAL_HOURS in the background of the server's event loop."""
+    if RECONCILE_INTERVAL_HOURS <= 0:
+        return None
+    task = asyncio.create_task(_reconcile_on_schedule())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find and repair orphaned documents, files and vectors.")
+    parser.add_argument("--repair", action="store_true",
+                        help="Delete orphans and fix drift; without it the run only reports what it finds")
+    args = parser.parse_args(argv)
+
+    async def run():
+        created = await create_reconciliation_run(repair=args.repair)
+        return await run_reconciliation(created["run_id"])
+
+    result = asyncio.run(run())
+    report = result["report"]
+    action = "Reclaimed" if args.repair else "Found"
+    print(f"Run {result['run_id']} {result['status']}: {action} {report['orphan_documents']} orphan documents, "
+          f"{report['orphan_files']} files ({report['bytes_reclaimed']} bytes), {report['orphan_vectors']} vectors; "
+          f"{report['drifted_references']} drifted references, {report['document_counts_fixed']} document counts, "
+          f"{report['unhashed_vectors']} vectors without a content hash left alone, "
+          f"{report['missing_files']} documents missing their file.")
+    return 0 if result["status"] == RUN_DONE and not report["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Token-budgeted context packing for the risk assessment prompt.
+
+Chunks arrive in relevance order. Neighbouring chunks of one document (consecutive
+chunk_index) are merged into a single passage with the splitter's overlap removed,
+repeated spans are dropped, and chunks are added best-first while the packed context
+stays within CONTEXT_TOKEN_BUDGET.
+"""
+import os
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts are estimated without it
+    tiktoken = None
+
+# Maximum tokens of retrieved context sent to the LLM
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+
+# tiktoken encoding used to count tokens (gpt-oss models use o200k)
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "o200k_base")
+
+# Separator between passages in the prompt
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Longest overlap searched for between neighbouring chunks (the splitter overlaps 200 characters)
+MAX_CHUNK_OVERLAP = 400
+
+# Overlaps shorter than this are treated as coincidence, not splitter overlap
+MIN_CHUNK_OVERLAP = 20
+
+_encoding = None
+
+# Set once loading the encoding has failed; counts are then estimated for the life of the process
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding(CONTEXT_TOKENIZER)
+        except Exception as e:
+            # e.g. the BPE file is not cached and cannot be downloaded (offline, behind a proxy)
+            _encoding_failed = True
+            print(f"Warning: could not load tokenizer {CONTEXT_TOKENIZER}, estimating token counts instead: {e}")
+    return _encoding
+
+
+def load_tokenizer():
+    """Load the tiktoken encoding ahead of the first request (it may be downloaded on first use)."""
+    _get_encoding()
+
+
+def tokenizer_loaded():
+    """Whether token counting is ready: the encoding is loaded, or counts are estimated because
+    tiktoken is absent or its encoding could not be loaded."""
+    return tiktoken is None or _encoding is not None or _encoding_failed
+
+
+def count_tokens(text):
+    """Tokens in text, estimated at four characters per token when the encoding is unavailable."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut text down to at most max_tokens."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+    return text[:max_tokens * 4]
+
+
+def merge_overlapping(first, second):
+    """Join two consecutive chunks, dropping the text the second repeats from the end of the first."""
+    longest = min(len(first), len(second), MAX_CHUNK_OVERLAP)
+    for size in range(longest, MIN_CHUNK_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+
+def _document_key(payload):
+    """Chunks with the same key come from the same file content and share chunk_index numbering."""
+    if payload.get("content_hash"):
+        return payload["content_hash"]
+    document_id = payload.get("document_id")
+    return document_id[0] if isinstance(document_id, list) and document_id else document_id
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def _build_passages(selected):
+    """Group selected chunks into passages of consecutive chunk_index per document, best passage first."""
+    by_document = {}
+    for rank, (payload, score, cite) in enumerate(selected):
+        by_document.setdefault(_document_key(payload), []).append((payload.get("chunk_index"), rank, payload, score, cite))
+
+    passages = []
+    for chunks in by_document.values():
+        chunks.sort(key=lambda chunk: (chunk[0] is None, chunk[0] or 0))
+        run = None
+        for chunk_index, rank, payload, score, cite in chunks:
+            text = payload.get("text", "")
+            if run is not None and chunk_index is not None and run["last_index"] is not None \
+                    and chunk_index == run["last_index"] + 1:
+                run["text"] = merge_overlapping(run["text"], text)
+                run["last_index"] = chunk_index
+                run["rank"] = min(run["rank"], rank)
+                run["score"] = max(run["score"], score)
+                if cite not in run["sources"]:
+                    run["sources"].append(cite)
+                continue
+            run = {"text": text, "last_index": chunk_index, "rank": rank, "score": score, "sources": [cite]}
+            passages.append(run)
+
+    passages.sort(key=lambda passage: passage["rank"])
+    return [{"text": p["text"], "sources": p["sources"], "score": p["score"]} for p in passages]
+
+
+def _packed_tokens(passages):
+    return count_tokens(CONTEXT_SEPARATOR.join(passage["text"] for passage in passages))
+
+
+def pack_context(chunks, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Pack (payload, score, cite) chunks, best first, into passages fitting token_budget.
+
+    Returns passages as dicts with text, sources and score, most relevant first.
+    """
+    selected = []
+    passages = []
+    seen_hashes = set()
+    for payload, score, cite in chunks:
+        text = payload.get("text", "")
+        if not text.strip():
+            continue
+
+        # Identical chunks (shared content) and spans already inside a passage add nothing
+        if payload.get("chunk_hash") in seen_hashes:
+            continue
+        normalized = _normalize(text)
+        if any(normalized in _normalize(passage["text"]) for passage in passages):
+            continue
+
+        candidate = _build_passages(selected + [(payload, score, cite)])
+        if _packed_tokens(candidate) > token_budget:
+            # Skip it; a shorter or adjacent chunk further down may still fit
+            continue
+        selected.append((payload, score, cite))
+        passages = candidate
+        if payload.get("chunk_hash"):
+            seen_hashes.add(payload["chunk_hash"])
+
+    if not passages and chunks:
+        # Even the best chunk is over budget: send its beginning rather than nothing
+        payload, score, cite = chunks[0]
+        passages = [{"text": truncate_tokens(payload.get("text", ""), token_budget), "sources": [cite], "score": score}]
+
+    return passages
@@ -0,0 +1,97 @@
+import io
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Characters per streamed section for unpaged formats (DOCX, TXT)
+SECTION_SIZE = int(os.getenv("SECTION_SIZE", "20000"))
+
+
+def _iter_text_sections(file, section_size=SECTION_SIZE):
+    """Group lines from a text stream into sections of roughly section_size characters."""
+    lines = []
+    size = 0
+    for line in file:
+        lines.append(line)
+        size += len(line)
+        # Close sections on blank lines so paragraphs are not cut in half
+        if size >= section_size and not line.strip():
+            yield "".join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield "".join(lines)
+
+
+def iter_text_from_file(file_path):
+    """Lazily yield (page_number, text) sections from a document; page_number is None when unpaged."""
+    file_extension = os.path.splitext(file_path)[1].lower()
+
+    if file_extension == '.pdf':
+        try:
+            import PyPDF2
+        except ImportError:
+            raise ImportError("PyPDF2 is required for PDF processing. Install it with: pip install PyPDF2")
+        try:
+            with open(file_path, 'rb') as file:
+                pdf_reader = PyPDF2.PdfReader(file)
+                for page_number, page in enumerate(pdf_reader.pages, start=1):
+                    yield page_number, page.extract_text() or ""
+        except Exception as e:
+            raise Exception(f"Error processing PDF: {e}")
+
+    elif file_extension == '.docx':
+        try:
+            import mammoth
+            with open(file_path, 'rb') as file:
+                result = mammoth.extract_raw_text(file)
+            for section in _iter_text_sections(io.StringIO(result.value)):
+                yield None, section
+        except Exception as e:
+            raise Exception(f"Error processing DOCX: {e}")
+
+    elif file_extension == '.txt':
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                for section in _iter_text_sections(file):
+                    yield None, section
+        except Exception as e:
+            raise Exception(f"Error processing TXT: {e}")
+
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+
+def extract_text_from_file(file_path):
+    """Extract text content from various file formats."""
+    return "\n".join(text for _, text in iter_text_from_file(file_path))
+
+
+def iter_document_chunks(sections):
+    """Split (page_number, text) sections into (chunk_index, page_number, chunk) lazily."""
+    # Imported on first use: langchain is slow to import and the API does not need it to start
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    # Initialize text splitter
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,  # 1000 characters per chunk
+        chunk_overlap=200,  # 200 characters overlap
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]  # Try to split on paragraphs, then lines, then spaces
+    )
+
+    chunk_index = 0
+    for page_number, text in sections:
+        if not text.strip():
+            continue
+        for chunk in text_splitter.split_text(text):
+            if chunk.strip():  # Only yield non-empty chunks
+                yield chunk_index, page_number, chunk
+                chunk_index += 1
+
+
+def extract_document_chunks(file_path):
+    """Extract and chunk a whole document; used by process-pool workers, which must not load models."""
+    return list(iter_document_chunks(iter_text_from_file(file_path)))
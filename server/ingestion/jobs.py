@@ -0,0 +1,533 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import traceback
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+from server.connections import (
+    ingestion_jobs_collection,
+    document_logs_collection,
+    content_locks_collection,
+    qdrant,
+    SUPPLIER_DOC_COLLECTION
+)
+from server.ingestion.utils import (
+    chunk_and_embed_document,
+    count_content_chunks,
+    content_chunk_total,
+    delete_document_chunks,
+    set_content_references,
+    load_chunk_vectors,
+    release_content_chunks
+)
+from server.ingestion.bulk import ingest_documents, BULK_EXTRACT_WORKERS
+from server.ingestion.utils.embeddings import EMBED_WINDOW_SIZE
+from server.ingestion.versions import bump_documents_version
+
+# Maximum number of documents extracted/chunked/embedded at the same time
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))
+
+# Seconds a content lock lives without renewal; a lock its job stopped renewing (crashed worker) is taken over
+CONTENT_LOCK_LEASE_SECONDS = int(os.getenv("CONTENT_LOCK_LEASE_SECONDS", "300"))
+
+# Seconds between attempts to take a content lock another job holds
+CONTENT_LOCK_POLL_SECONDS = float(os.getenv("CONTENT_LOCK_POLL_SECONDS", "0.5"))
+
+# Seconds a job's lease lives without renewal; a queued or running job whose worker stopped renewing
+# it (restart, crash) is taken over and run again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+# Times a job may be started before an interruption fails it instead of running it again
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Worker pool running the blocking ingestion work off the event loop
+_executor = ThreadPoolExecutor(max_workers=INGEST_CONCURRENCY, thread_name_prefix="ingest")
+_semaphore = None
+
+# Keep references to running tasks so they are not garbage collected
+_tasks = set()
+
+# Owner recorded on the jobs this process runs, and those jobs by id
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+_jobs = {}
+
+# Job ids whose work has been handed to the worker pool
+_started = set()
+
+# Lease renewal and recovery of abandoned jobs
+_maintenance = None
+
+
+def _get_semaphore():
+    """Create the concurrency semaphore lazily, on the running event loop."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+    return _semaphore
+
+
+async def _update_job(job_id, document_ids, fields):
+    """Update job state and mirror the status onto the document logs."""
+    await ingestion_jobs_collection.update_one({"job_id": job_id}, {"$set": fields})
+    await document_logs_collection.update_many(
+        {"file_id": {"$in": document_ids}},
+        {"$set": {"ingestion_status": fields["status"]}}
+    )
+
+
+async def content_references(content_hash, exclude_document_id=None):
+    """Document and vendor ids of every upload of the given content, as sorted lists."""
+    query = {"content_hash": content_hash}
+    if exclude_document_id:
+        query["file_id"] = {"$ne": exclude_document_id}
+    logs = await document_logs_collection.find(query, {"file_id": 1, "supplier_id": 1}).to_list(length=None)
+    return sorted({log["file_id"] for log in logs}), sorted({log["supplier_id"] for log in logs})
+
+
+async def _acquire_content_lock(content_hash, owner):
+    """Wait until this job holds the lock of a file content; the lock is a Mongo document keyed by the hash."""
+    while True:
+        try:
+            await content_locks_collection.insert_one({
+                "_id": content_hash,
+                "owner": owner,
+                "expires_at": datetime.utcnow() + timedelta(seconds=CONTENT_LOCK_LEASE_SECONDS)
+            })
+            return
+        except DuplicateKeyError:
+            # Held by another job, in this worker or another one; free it if its lease ran out
+            await content_locks_collection.delete_one({"_id": content_hash, "expires_at": {"$lt": datetime.utcnow()}})
+            await asyncio.sleep(CONTENT_LOCK_POLL_SECONDS)
+
+
+async def _renew_content_locks(content_hashes, owner):
+    while True:
+        await asyncio.sleep(CONTENT_LOCK_LEASE_SECONDS / 3)
+        await content_locks_collection.update_many(
+            {"_id": {"$in": content_hashes}, "owner": owner},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=CONTENT_LOCK_LEASE_SECONDS)}}
+        )
+
+
+@asynccontextmanager
+async def content_locks(content_hashes, owner):
+    """Hold the locks of the given file contents, so each content is embedded by one job at a time.
+
+    Locks are taken in sorted order so jobs sharing several contents cannot deadlock.
+    """
+    acquired = []
+    renewal = None
+    try:
+        for content_hash in sorted(set(content_hashes)):
+            await _acquire_content_lock(content_hash, owner)
+            acquired.append(content_hash)
+        if acquired:
+            renewal = asyncio.create_task(_renew_content_locks(acquired, owner))
+        yield
+    finally:
+        if renewal:
+            renewal.cancel()
+        if acquired:
+            await content_locks_collection.delete_many({"_id": {"$in": acquired}, "owner": owner})
+
+
+async def _refresh_content_references(content_hashes):
+    """Point the chunks of each content at the uploads logged now, which may have changed while a job ran."""
+    for content_hash in content_hashes:
+        document_ids, vendor_ids = await content_references(content_hash)
+        if document_ids:
+            await run_in_threadpool(
+                set_content_references, qdrant, SUPPLIER_DOC_COLLECTION, content_hash, document_ids, vendor_ids
+            )
+
+
+async def _run_job(job_id, document_ids, vendor_ids, content_hashes, queued, work, *args):
+    """Run an ingestion job on the worker pool and record its outcome.
+
+    work(references, *args) runs in a worker thread and returns the fields to store on success;
+    references maps each of content_hashes to its (document_ids, vendor_ids), read while the job
+    holds the locks of those contents.
+    """
+    async with content_locks(content_hashes, job_id), _get_semaphore():
+        started = time.perf_counter()
+        _started.add(job_id)
+        await _update_job(job_id, document_ids, {
+            "status": JOB_RUNNING,
+            "started_at": datetime.now().isoformat(),
+            "timings.queue_seconds": started - queued
+        })
+        await ingestion_jobs_collection.update_one({"job_id": job_id}, {"$inc": {"attempts": 1}})
+
+        try:
+            # Read just before writing: uploads of the same content since submission are included
+            references = {content_hash: await content_references(content_hash) for content_hash in content_hashes}
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(_executor, work, references, *args)
+            await _refresh_content_references(content_hashes)
+            print(f"RAG processing: {result['message']}")
+            failed_ids = result.pop("failed_document_ids", [])
+            # Bulk jobs report per-stage throughput, stored alongside the job's other timings
+            stages = result.pop("stages", None)
+            if stages is not None:
+                result["timings.stages"] = stages
+            await _update_job(job_id, [doc_id for doc_id in document_ids if doc_id not in failed_ids], {
+                "status": JOB_DONE,
+                "finished_at": datetime.now().isoformat(),
+                "timings.processing_seconds": time.perf_counter() - started,
+                **result
+            })
+            if failed_ids:
+                await document_logs_collection.update_many(
+                    {"file_id": {"$in": failed_ids}},
+                    {"$set": {"ingestion_status": JOB_FAILED}}
+                )
+        except Exception as e:
+            print(f"Warning: RAG processing failed for job {job_id}: {e}")
+            traceback.print_exc()
+            await _update_job(job_id, document_ids, {
+                "status": JOB_FAILED,
+                "error": str(e),
+                "finished_at": datetime.now().isoformat(),
+                "timings.processing_seconds": time.perf_counter() - started
+            })
+        finally:
+            # Searchable content changed: invalidate cached assessments for these vendors
+            await bump_documents_version(vendor_ids)
+
+
+def _reuse_existing_content(content_hash, references):
+    """Attach a duplicate upload to chunks already stored for the same bytes, if they are complete.
+
+    Chunks left behind by an interrupted or failed job carry no chunk total (or fewer chunks than it),
+    so they are ingested again rather than reused.
+    """
+    if not content_hash:
+        return None
+    chunk_count = count_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, content_hash)
+    if not chunk_count or content_chunk_total(qdrant, SUPPLIER_DOC_COLLECTION, content_hash) != chunk_count:
+        return None
+    set_content_references(qdrant, SUPPLIER_DOC_COLLECTION, content_hash, *references)
+    return {"chunk_count": chunk_count, "message": f"Reused {chunk_count} existing chunks", "deduplicated": True}
+
+
+def _ingest_single(references_by_hash, file_path, document_id, vendor_id, filename, content_hash):
+    """Worker-thread body of a single-document job."""
+    references = references_by_hash.get(content_hash)
+    reused = _reuse_existing_content(content_hash, references)
+    if reused:
+        return reused
+    chunk_count, message = chunk_and_embed_document(
+        file_path, document_id, vendor_id, filename, qdrant, SUPPLIER_DOC_COLLECTION,
+        content_hash=content_hash, references=references
+    )
+    return {"chunk_count": chunk_count, "message": message, "deduplicated": False}
+
+
+def _ingest_revision(references_by_hash, file_path, document_id, vendor_id, filename, content_hash,
+                     previous_content_hash):
+    """Worker-thread body of a revised-document job; only changed chunks are embedded."""
+    references = references_by_hash.get(content_hash)
+    if not previous_content_hash:
+        # Chunks stored before content hashing carry no chunk hashes to reuse
+        delete_document_chunks(qdrant, SUPPLIER_DOC_COLLECTION, document_id)
+
+    result = _reuse_existing_content(content_hash, references)
+    if not result:
+        reuse_vectors = {}
+        if previous_content_hash:
+            reuse_vectors = load_chunk_vectors(qdrant, SUPPLIER_DOC_COLLECTION, previous_content_hash)
+        chunk_count, message = chunk_and_embed_document(
+            file_path, document_id, vendor_id, filename, qdrant, SUPPLIER_DOC_COLLECTION,
+            content_hash=content_hash, references=references, reuse_vectors=reuse_vectors
+        )
+        result = {"chunk_count": chunk_count, "message": message, "deduplicated": False}
+
+    # Drop this document's reference to the chunks of its previous version
+    if previous_content_hash:
+        release_content_chunks(
+            qdrant, SUPPLIER_DOC_COLLECTION, previous_content_hash, *references_by_hash[previous_content_hash]
+        )
+    return result
+
+
+def ingest_bulk_documents(documents, workers=BULK_EXTRACT_WORKERS, window_size=EMBED_WINDOW_SIZE):
+    """Ingest many documents in one bulk pass, embedding each distinct content once.
+
+    Content already stored only gains the documents' references, and a document sharing its
+    content with an earlier one in the list takes that one's result. Blocking; the body of
+    bulk jobs and of the bulk CLI.
+    """
+    reused = {}
+    to_ingest = []
+    first_upload = {}
+    duplicates = {}
+    for doc in documents:
+        content_hash = doc.get("content_hash")
+        if content_hash and content_hash in first_upload:
+            duplicates[doc["document_id"]] = first_upload[content_hash]
+            continue
+        if content_hash:
+            first_upload[content_hash] = doc["document_id"]
+        result = _reuse_existing_content(content_hash, (doc.get("document_ids"), doc.get("vendor_ids")))
+        if result:
+            reused[doc["document_id"]] = {"chunk_count": result["chunk_count"], "error": None, "deduplicated": True}
+        else:
+            to_ingest.append(doc)
+
+    report = ingest_documents(to_ingest, qdrant, SUPPLIER_DOC_COLLECTION, workers=workers, window_size=window_size)
+    results = {**report["documents"], **reused}
+    for document_id, original_id in duplicates.items():
+        results[document_id] = {**results[original_id], "deduplicated": True}
+    failed = {doc_id: r["error"] for doc_id, r in results.items() if r["error"]}
+    return {
+        "chunk_count": report["chunk_count"],
+        "message": f"Processed {len(documents) - len(failed)} of {len(documents)} documents "
+                   f"into {report['chunk_count']} new chunks ({len(reused) + len(duplicates)} duplicates reused)",
+        "documents": results,
+        "stages": report["stages"],
+        "failed_document_ids": list(failed)
+    }
+
+
+def _ingest_bulk(references_by_hash, documents):
+    """Worker-thread body of a bulk job: ingest_bulk_documents with the references read for the job."""
+    for doc in documents:
+        if doc.get("content_hash"):
+            doc["document_ids"], doc["vendor_ids"] = references_by_hash[doc["content_hash"]]
+    return ingest_bulk_documents(documents)
+
+
+def _new_job(vendor_id, **fields):
+    """Build a fresh job record."""
+    return {
+        "job_id": str(uuid.uuid4()),
+        "supplier_id": vendor_id,
+        **fields,
+        "status": JOB_QUEUED,
+        "chunk_count": 0,
+        "message": None,
+        "error": None,
+        "queued_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "timings": {"queue_seconds": None, "processing_seconds": None},
+        "attempts": 0,
+        "owner": WORKER_ID,
+        "lease_expires_at": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+    }
+
+
+def _schedule_job(job, document_ids, content_hashes, work, *args):
+    """Run a job this process holds the lease of on the worker pool."""
+    job_id = job["job_id"]
+    task = asyncio.create_task(_run_job(
+        job_id, document_ids, [job["supplier_id"]], [h for h in content_hashes if h], time.perf_counter(),
+        work, *args
+    ))
+    _jobs[job_id] = task
+    _tasks.add(task)
+
+    def forget(task):
+        _tasks.discard(task)
+        _started.discard(job_id)
+        if _jobs.get(job_id) is task:
+            del _jobs[job_id]
+    task.add_done_callback(forget)
+    start_job_maintenance()
+
+
+async def _start_job(job, document_ids, content_hashes, work, *args):
+    """Persist a job record and schedule it on the worker pool."""
+    await ingestion_jobs_collection.insert_one(job)
+    job.pop("_id", None)
+    _schedule_job(job, document_ids, content_hashes, work, *args)
+    return job
+
+
+async def submit_ingestion_job(file_path, document_id, vendor_id, filename, content_hash=None):
+    """Queue a document for background chunking and embedding, returning the job record.
+
+    The chunks reference every upload sharing content_hash, as logged when the job runs.
+    """
+    job = _new_job(vendor_id, kind="document", document_id=document_id, filename=filename, file_path=file_path)
+    return await _start_job(
+        job, [document_id], [content_hash], _ingest_single, file_path, document_id, vendor_id, filename, content_hash
+    )
+
+
+async def submit_revision_job(file_path, document_id, vendor_id, filename, content_hash, previous_content_hash):
+    """Queue re-ingestion of a revised document, reusing vectors of chunks that did not change."""
+    job = _new_job(vendor_id, kind="revision", document_id=document_id, filename=filename, file_path=file_path,
+                   previous_content_hash=previous_content_hash)
+    return await _start_job(
+        job, [document_id], [content_hash, previous_content_hash], _ingest_revision,
+        file_path, document_id, vendor_id, filename, content_hash, previous_content_hash
+    )
+
+
+async def submit_bulk_ingestion_job(documents, vendor_id):
+    """Queue many documents for the multi-process bulk pipeline, returning the job record.
+
+    Each document is a dict with file_path, document_id, vendor_id, filename and the optional
+    content_hash of its bytes.
+    """
+    document_ids = [doc["document_id"] for doc in documents]
+    job = _new_job(vendor_id, kind="bulk", document_ids=document_ids)
+    return await _start_job(
+        job, document_ids, [doc.get("content_hash") for doc in documents], _ingest_bulk, documents
+    )
+
+
+async def get_ingestion_job(job_id):
+    """Fetch a job record by id."""
+    return await ingestion_jobs_collection.find_one({"job_id": job_id}, {"_id": 0, "lease_expires_at": 0})
+
+
+async def _resume_job(job):
+    """Schedule a claimed job again, with the arguments rebuilt from its record and its documents' logs.
+
+    Returns False, after failing the job, when its documents were deleted in the meantime.
+    """
+    document_ids = job.get("document_ids") or [job["document_id"]]
+    logs = await document_logs_collection.find(
+        {"file_id": {"$in": document_ids}},
+        {"file_id": 1, "supplier_id": 1, "file_path": 1, "filename": 1, "content_hash": 1}
+    ).to_list(length=None)
+    if not logs:
+        await _update_job(job["job_id"], [], {
+            "status": JOB_FAILED,
+            "error": "The job's documents were deleted before it ran",
+            "finished_at": datetime.now().isoformat()
+        })
+        return False
+
+    if job.get("kind") == "bulk":
+        documents = [
+            {
+                "file_path": log["file_path"],
+                "document_id": log["file_id"],
+                "vendor_id": log["supplier_id"],
+                "filename": log["filename"],
+                "content_hash": log.get("content_hash")
+            }
+            for log in logs
+        ]
+        _schedule_job(job, [doc["document_id"] for doc in documents],
+                      [doc["content_hash"] for doc in documents], _ingest_bulk, documents)
+        return True
+
+    log = logs[0]
+    args = (log["file_path"], log["file_id"], log["supplier_id"], log["filename"], log.get("content_hash"))
+    if job.get("kind") == "revision":
+        previous_content_hash = job.get("previous_content_hash")
+        _schedule_job(job, [log["file_id"]], [log.get("content_hash"), previous_content_hash], _ingest_revision,
+                      *args, previous_content_hash)
+    else:
+        _schedule_job(job, [log["file_id"]], [log.get("content_hash")], _ingest_single, *args)
+    return True
+
+
+async def recover_ingestion_jobs():
+    """Take over queued and running jobs whose lease ran out, after their worker restarted or crashed.
+
+    Each is claimed atomically, so with several workers only one resumes it. A job interrupted
+    while running INGEST_MAX_ATTEMPTS times is failed instead of being run again. Returns the
+    ids of the jobs resumed.
+    """
+    resumed = []
+    expired = {"$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": datetime.utcnow()}}]}
+    candidates = await ingestion_jobs_collection.find(
+        {"status": {"$in": [JOB_QUEUED, JOB_RUNNING]}, **expired}, {"job_id": 1}
+    ).to_list(length=None)
+    for candidate in candidates:
+        job = await ingestion_jobs_collection.find_one_and_update(
+            {"job_id": candidate["job_id"], "status": {"$in": [JOB_QUEUED, JOB_RUNNING]}, **expired},
+            {"$set": {
+                "owner": WORKER_ID,
+                "lease_expires_at": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+            }},
+            projection={"_id": 0}
+        )
+        if job is None:
+            continue
+        document_ids = job.get("document_ids") or [job["document_id"]]
+        if job["status"] == JOB_RUNNING and job.get("attempts", 1) >= INGEST_MAX_ATTEMPTS:
+            await _update_job(job["job_id"], document_ids, {
+                "status": JOB_FAILED,
+                "error": f"Interrupted {job.get('attempts', 1)} times while running; upload the document again",
+                "finished_at": datetime.now().isoformat()
+            })
+            continue
+        print(f"Resuming ingestion job {job['job_id']} ({job['status']} when its worker stopped)")
+        await _update_job(job["job_id"], document_ids, {"status": JOB_QUEUED, "queued_at": datetime.now().isoformat()})
+        if await _resume_job(job):
+            resumed.append(job["job_id"])
+    return resumed
+
+
+async def _maintain_jobs():
+    """Renew the leases of this process's jobs and take over abandoned ones, every third of a lease."""
+    while True:
+        try:
+            if _jobs:
+                await ingestion_jobs_collection.update_many(
+                    {"job_id": {"$in": list(_jobs)}, "owner": WORKER_ID},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}}
+                )
+            await recover_ingestion_jobs()
+        except Exception as e:
+            print(f"Warning: ingestion job maintenance failed: {e}")
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+
+
+def start_job_maintenance():
+    """Start lease renewal and job recovery on the running event loop, once."""
+    global _maintenance
+    if _maintenance is None or _maintenance.done() or _maintenance.get_loop() is not asyncio.get_running_loop():
+        _maintenance = asyncio.create_task(_maintain_jobs())
+    return _maintenance
+
+
+async def _update_job_statuses(job_ids, status, fields=None):
+    """Set the status of several jobs and of their documents."""
+    jobs = await ingestion_jobs_collection.find(
+        {"job_id": {"$in": job_ids}}, {"job_id": 1, "document_id": 1, "document_ids": 1}
+    ).to_list(length=None)
+    for job in jobs:
+        await _update_job(job["job_id"], job.get("document_ids") or [job["document_id"]], {"status": status, **(fields or {})})
+
+
+async def shutdown_ingestion_workers():
+    """Wait for in-flight ingestion to finish and hand the jobs that have not started back to the queue.
+
+    Released jobs keep their queued status with an expired lease, so the next worker to start (or
+    another running one) resumes them straight away.
+    """
+    global _maintenance
+    if _maintenance is not None:
+        _maintenance.cancel()
+        _maintenance = None
+
+    waiting = {job_id: task for job_id, task in _jobs.items() if job_id not in _started}
+    for task in waiting.values():
+        task.cancel()
+    await asyncio.gather(*waiting.values(), return_exceptions=True)
+    if waiting:
+        await _update_job_statuses(list(waiting), JOB_QUEUED, {"lease_expires_at": None})
+        print(f"Released {len(waiting)} queued ingestion jobs for the next worker")
+
+    # Off the loop, so the running jobs can still record their outcome
+    await run_in_threadpool(_executor.shutdown, wait=True)
+    await asyncio.gather(*_tasks, return_exceptions=True)
+
@@ -0,0 +1,231 @@
+"""HTML previews of DOCX uploads, rendered once and stored next to the upload.
+
+A preview is converted with mammoth in a worker thread at upload, or on first view,
+and written as <file_id>.preview.html plus a gzipped copy, so every later view is
+served from disk. Concurrent first views share one conversion. Revising or deleting
+the document removes its preview.
+"""
+import os
+import gzip
+import html
+import asyncio
+from starlette.concurrency import run_in_threadpool
+
+# Upload types that can be previewed
+PREVIEW_EXTENSIONS = [".docx"]
+
+# Render previews when a document is uploaded rather than on its first view
+PREVIEW_AT_UPLOAD = os.getenv("PREVIEW_AT_UPLOAD", "true").lower() == "true"
+
+# Compression level of the stored gzipped preview
+PREVIEW_GZIP_LEVEL = int(os.getenv("PREVIEW_GZIP_LEVEL", "6"))
+
+PREVIEW_SUFFIX = ".preview.html"
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{filename} - Preview</title>
+    <style>
+        body {{
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            line-height: 1.6;
+            margin: 0;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }}
+        .document-container {{
+            max-width: 800px;
+            margin: 0 auto;
+            background: white;
+            padding: 30px;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }}
+        .document-header {{
+            text-align: center;
+            margin-bottom: 30px;
+            padding-bottom: 20px;
+            border-bottom: 1px solid #eee;
+        }}
+        .document-header h1 {{
+            color: #333;
+            margin-bottom: 10px;
+            font-size: 24px;
+        }}
+        .document-meta {{
+            color: #666;
+            font-size: 14px;
+        }}
+        .document-content {{
+            color: #333;
+            overflow-wrap: break-word;
+        }}
+        .document-content h1,
+        .document-content h2,
+        .document-content h3,
+        .document-content h4,
+        .document-content h5,
+        .document-content h6 {{
+            color: #2c3e50;
+            margin-top: 1.5em;
+            margin-bottom: 0.5em;
+        }}
+        .document-content p {{
+            margin-bottom: 1em;
+        }}
+        .document-content ul,
+        .document-content ol {{
+            margin-bottom: 1em;
+            padding-left: 30px;
+        }}
+        .document-content table {{
+            border-collapse: collapse;
+            width: 100%;
+            margin-bottom: 1em;
+        }}
+        .document-content td,
+        .document-content th {{
+            border: 1px solid #ddd;
+            padding: 8px;
+            text-align: left;
+        }}
+        .document-content th {{
+            background-color: #f2f2f2;
+            font-weight: bold;
+        }}
+    </style>
+</head>
+<body>
+    <div class="document-container">
+        <div class="document-header">
+            <h1>{filename}</h1>
+            <div class="document-meta">
+                Uploaded: {uploaded_at}
+            </div>
+        </div>
+        <div class="document-content">
+            {content}
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+# file_id -> in-flight render, shared by concurrent first views
+_renders = {}
+
+# file_id -> invalidation count; a render started before an invalidation is discarded
+_generations = {}
+
+# Keep references to upload-time renders so they are not garbage collected
+_tasks = set()
+
+
+def preview_path(document):
+    """Where a document's rendered preview is stored; the gzipped copy adds .gz."""
+    return os.path.join(os.path.dirname(document["file_path"]), f"{document['file_id']}{PREVIEW_SUFFIX}")
+
+
+def render_preview_page(document):
+    """Convert the DOCX to HTML and wrap it in the preview page. Raises ValueError for unreadable files."""
+    # Imported on first use, like the other document parsers
+    import mammoth
+    try:
+        with open(document["file_path"], "rb") as docx_file:
+            result = mammoth.convert_to_html(docx_file)
+    except OSError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Document conversion error: {e}")
+
+    # The filename comes from the uploader, so it is escaped; mammoth escapes the document text itself
+    return PAGE_TEMPLATE.format(
+        filename=html.escape(document.get("filename") or ""),
+        uploaded_at=html.escape(str(document.get("uploaded_at", ""))),
+        content=result.value
+    )
+
+
+def _write_file(path, data):
+    """Write via a temporary file so readers never see a partial preview."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+
+def _build_preview(document):
+    page = render_preview_page(document).encode("utf-8")
+    return page, gzip.compress(page, compresslevel=PREVIEW_GZIP_LEVEL)
+
+
+def _store_preview(path, page, compressed):
+    # The plain file is written last: its presence means both copies are complete
+    _write_file(f"{path}.gz", compressed)
+    _write_file(path, page)
+
+
+async def _render(document, path):
+    file_id = document["file_id"]
+    generation = _generations.get(file_id, 0)
+    page, compressed = await run_in_threadpool(_build_preview, document)
+    if _generations.get(file_id, 0) != generation:
+        raise Exception(f"Document {file_id} changed while its preview was rendering")
+    await run_in_threadpool(_store_preview, path, page, compressed)
+    return path
+
+
+async def ensure_preview(document):
+    """Path of the document's stored preview, rendering it in a worker thread if it does not exist yet."""
+    path = preview_path(document)
+    if os.path.exists(path) and os.path.exists(f"{path}.gz"):
+        return path
+
+    file_id = document["file_id"]
+    render = _renders.get(file_id)
+    if render is None:
+        render = asyncio.ensure_future(_render(document, path))
+        _renders[file_id] = render
+
+        def forget(task):
+            if _renders.get(file_id) is task:
+                del _renders[file_id]
+        render.add_done_callback(forget)
+
+    # A viewer disconnecting must not cancel the render the other viewers are waiting on
+    return await asyncio.shield(render)
+
+
+def schedule_preview(document):
+    """Render a new upload's preview in the background when PREVIEW_AT_UPLOAD is on."""
+    if not PREVIEW_AT_UPLOAD or document.get("file_extension", "").lower() not in PREVIEW_EXTENSIONS:
+        return None
+
+    async def render():
+        try:
+            await ensure_preview(document)
+        except Exception as e:
+            print(f"Warning: preview rendering failed for document {document['file_id']}: {e}")
+
+    task = asyncio.create_task(render())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def invalidate_preview(document):
+    """Remove a document's stored preview and discard any render in progress."""
+    file_id = document["file_id"]
+    _generations[file_id] = _generations.get(file_id, 0) + 1
+    _renders.pop(file_id, None)
+    path = preview_path(document)
+    for stale in (path, f"{path}.gz"):
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Could not delete preview {stale}: {e}")
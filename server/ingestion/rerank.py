@@ -0,0 +1,152 @@
+"""Reranking between vector search and LLM context assembly.
+
+Search returns a pool of RERANK_CANDIDATES chunks ranked against the SSR paragraph.
+A reranker rescores them against the analyst's actual question (a local cross-encoder
+by default), and MMR then trades relevance against similarity to chunks already
+picked, so the context does not hold three overlapping chunks of one document.
+"""
+import os
+import threading
+import numpy as np
+
+# Reranker scoring the candidate pool: cross-encoder or none (keep search order)
+RERANKER = os.getenv("RERANKER", "cross-encoder").lower()
+
+# Cross-encoder model, run on CPU in batches
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_DEVICE = os.getenv("RERANK_DEVICE", "cpu")
+
+# Chunks fetched from search for the reranker to choose from
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+
+# Maximal marginal relevance: on/off and relevance weight (1.0 ignores diversity)
+RERANK_MMR = os.getenv("RERANK_MMR", "true").lower() == "true"
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))
+
+_cross_encoder = None
+_cross_encoder_error = None
+_cross_encoder_lock = threading.Lock()
+
+
+def _get_cross_encoder():
+    """Load the cross-encoder on first use; None once loading it failed.
+
+    A failed load is logged once and not retried, so the process stays on the search order.
+    """
+    global _cross_encoder, _cross_encoder_error
+    with _cross_encoder_lock:
+        if _cross_encoder is None and _cross_encoder_error is None:
+            try:
+                from sentence_transformers import CrossEncoder
+                _cross_encoder = CrossEncoder(RERANK_MODEL, device=RERANK_DEVICE)
+            except Exception as e:
+                _cross_encoder_error = e
+                print(f"Warning: cross-encoder {RERANK_MODEL} unavailable, keeping search order: {e}")
+        return _cross_encoder
+
+
+def load_reranker():
+    """Load the configured reranker model ahead of the first request and run one pair through it."""
+    if RERANKER == "cross-encoder":
+        model = _get_cross_encoder()
+        if model is None:
+            raise Exception(f"Cross-encoder {RERANK_MODEL} unavailable: {_cross_encoder_error}")
+        model.predict([("warm-up", "warm-up")], show_progress_bar=False)
+
+
+def reranker_loaded():
+    """Whether the configured reranker is ready without loading a model on the next request
+    (a cross-encoder that failed to load is replaced by the search order)."""
+    return RERANKER != "cross-encoder" or _cross_encoder is not None or _cross_encoder_error is not None
+
+
+def _search_order_scores(query, texts):
+    """Keep the search ranking: scores decrease with rank."""
+    return np.linspace(1.0, 0.0, num=len(texts), endpoint=False) if texts else np.array([])
+
+
+def _cross_encoder_scores(query, texts):
+    """Score (query, chunk) pairs with the cross-encoder, or keep the search order when it could not be loaded."""
+    model = _get_cross_encoder()
+    if model is None:
+        return _search_order_scores(query, texts)
+    scores = model.predict(
+        [(query, text) for text in texts],
+        batch_size=RERANK_BATCH_SIZE,
+        show_progress_bar=False
+    )
+    return np.asarray(scores, dtype=np.float32)
+
+
+# Name -> function(query, texts) returning one relevance score per text
+RERANKERS = {
+    "none": _search_order_scores,
+    "cross-encoder": _cross_encoder_scores
+}
+
+
+def register_reranker(name, score_fn):
+    """Make a scoring function selectable through RERANKER."""
+    RERANKERS[name] = score_fn
+
+
+def reranking_enabled():
+    """Whether search should fetch a candidate pool for rerank() rather than the final chunks."""
+    return RERANKER != "none" or RERANK_MMR
+
+
+def _dense_vector(point):
+    vector = point.vector
+    if isinstance(vector, dict):
+        vector = vector.get("")
+    return None if vector is None else np.asarray(vector, dtype=np.float32)
+
+
+def _mmr(relevance, vectors, top_k, lambda_mult):
+    """Greedy maximal marginal relevance over normalized relevance and cosine similarity between candidates."""
+    matrix = np.stack(vectors)
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    similarity = matrix @ matrix.T
+
+    selected = [int(np.argmax(relevance))]
+    remaining = [i for i in range(len(relevance)) if i != selected[0]]
+    while remaining and len(selected) < top_k:
+        redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        mmr_scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining[int(np.argmax(mmr_scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def rerank(query, points, top_k, reranker=None, mmr=None):
+    """Pick top_k of the candidate points for query; returns (point, score) pairs, best first.
+
+    Points need their vectors for MMR; without them MMR is skipped. A failing reranker
+    falls back to the search order rather than failing the request.
+    """
+    if not points:
+        return []
+    reranker = reranker or RERANKER
+    mmr = RERANK_MMR if mmr is None else mmr
+    texts = [point.payload.get("text", "") for point in points]
+
+    score_fn = RERANKERS.get(reranker)
+    if score_fn is None:
+        raise ValueError(f"Unknown reranker '{reranker}'; expected one of {', '.join(RERANKERS)}")
+    try:
+        scores = np.asarray(score_fn(query, texts), dtype=np.float32)
+    except Exception as e:
+        print(f"Warning: reranker '{reranker}' failed, keeping search order: {e}")
+        scores = _search_order_scores(query, texts)
+
+    vectors = [_dense_vector(point) for point in points]
+    if mmr and len(points) > 1 and all(v is not None for v in vectors):
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        order = _mmr(relevance, vectors, top_k, RERANK_MMR_LAMBDA)
+    else:
+        order = [int(i) for i in np.argsort(-scores, kind="stable")[:top_k]]
+
+    return [(points[i], float(scores[i])) for i in order]
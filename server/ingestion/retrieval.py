@@ -0,0 +1,114 @@
+"""Chunk retrieval for /analyze.
+
+Hybrid collections are searched twice, densely with the SSR embedding and lexically with
+the query's BM25 vector (exact certificate numbers, sanctions names, ISO codes), and
+Qdrant fuses the two candidate lists with reciprocal-rank fusion.
+
+Vendor-scoped searches filter on the indexed vendor_id payload. With fan-out, each
+selected vendor is searched separately (one batched request) so a vendor with many
+documents cannot crowd the others out of the context.
+"""
+import os
+from qdrant_client.models import Prefetch, FusionQuery, Fusion, QueryRequest, Filter, FieldCondition, MatchAny
+from server.ingestion.utils import SPARSE_VECTOR_NAME, sparse_query_vector, collection_has_sparse_vectors
+from server.connections.collection import search_params
+
+# Candidates fetched per branch (dense and sparse) before fusion
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+
+# Chunks returned after fusion
+RETRIEVAL_LIMIT = int(os.getenv("RETRIEVAL_LIMIT", "5"))
+
+# Minimum cosine similarity for dense hits
+DENSE_SCORE_THRESHOLD = float(os.getenv("DENSE_SCORE_THRESHOLD", "0.10"))
+
+# Search each selected vendor separately and interleave a balanced top-k per vendor
+RETRIEVAL_FANOUT = os.getenv("RETRIEVAL_FANOUT", "false").lower() == "true"
+
+# Chunks fetched per vendor when fanning out
+RETRIEVAL_PER_VENDOR_LIMIT = int(os.getenv("RETRIEVAL_PER_VENDOR_LIMIT", "2"))
+
+
+def vendor_filter(vendor_ids):
+    """Filter matching chunks of any of the given vendors (None searches all vendors)."""
+    if not vendor_ids:
+        return None
+    return Filter(
+        must=[
+            FieldCondition(
+                key="vendor_id",
+                match=MatchAny(any=list(vendor_ids))
+            )
+        ]
+    )
+
+
+def _query(qdrant_client, collection_name, dense_vector, query_text, query_filter, limit, with_vectors=False):
+    """QueryRequest arguments for one search, dense-only or hybrid."""
+    if not collection_has_sparse_vectors(qdrant_client, collection_name):
+        return {
+            "query": dense_vector,
+            "filter": query_filter,
+            "params": search_params(),
+            "score_threshold": DENSE_SCORE_THRESHOLD,
+            "limit": limit,
+            "with_vector": with_vectors
+        }
+
+    sparse_vector = sparse_query_vector(query_text)
+    prefetch = [
+        Prefetch(
+            query=dense_vector,
+            limit=RETRIEVAL_CANDIDATES,
+            filter=query_filter,
+            params=search_params(),
+            score_threshold=DENSE_SCORE_THRESHOLD
+        )
+    ]
+    if sparse_vector.indices:
+        prefetch.append(Prefetch(
+            query=sparse_vector,
+            using=SPARSE_VECTOR_NAME,
+            limit=RETRIEVAL_CANDIDATES,
+            filter=query_filter
+        ))
+    # Prefetches are already filtered, so the fusion stage needs no filter of its own
+    return {"prefetch": prefetch, "query": FusionQuery(fusion=Fusion.RRF), "limit": limit, "with_vector": with_vectors}
+
+
+def search_chunks(qdrant_client, collection_name, dense_vector, query_text, query_filter=None, limit=RETRIEVAL_LIMIT,
+                  with_vectors=False):
+    """Return the best chunks for a query, fusing dense and BM25 hits when the collection supports it."""
+    query = _query(qdrant_client, collection_name, dense_vector, query_text, query_filter, limit, with_vectors)
+    # query_points names the filter, search params and vector flag differently from QueryRequest
+    return qdrant_client.query_points(
+        collection_name=collection_name,
+        query_filter=query.pop("filter", None),
+        search_params=query.pop("params", None),
+        with_vectors=query.pop("with_vector"),
+        **query
+    ).points
+
+
+def search_chunks_per_vendor(qdrant_client, collection_name, dense_vector, query_text, vendor_ids,
+                             per_vendor_limit=RETRIEVAL_PER_VENDOR_LIMIT):
+    """Search each vendor separately in one batched request and interleave the results round-robin,
+    so the best chunk of every vendor comes before any vendor's second chunk."""
+    requests = []
+    for vendor_id in vendor_ids:
+        query = _query(
+            qdrant_client, collection_name, dense_vector, query_text, vendor_filter([vendor_id]), per_vendor_limit
+        )
+        requests.append(QueryRequest(with_payload=True, **query))
+
+    responses = qdrant_client.query_batch_points(collection_name=collection_name, requests=requests)
+
+    results = []
+    seen = set()
+    for rank in range(per_vendor_limit):
+        for response in responses:
+            if rank < len(response.points) and response.points[rank].id not in seen:
+                # Chunks shared by several vendors' uploads are returned once
+                seen.add(response.points[rank].id)
+                results.append(response.points[rank])
+    return results
@@ -0,0 +1,146 @@
+"""Memoized synthetic-signal (SSR) stage.
+
+The hypothetical paragraph generated for a query, and its embedding, are
+stored per normalized query in Mongo (shared by all workers) with an
+in-process tier in front. Common queries can be precomputed:
+
+    python -m server.ingestion.ssr --file standard_queries.txt
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from starlette.concurrency import run_in_threadpool
+from server.connections import ssr_cache_collection
+from server.ingestion.utils import EMBED_MODEL, call_llm, embed_query, generate_ssr_prompt
+from server.ingestion.utils.response_cache import normalize_query
+
+# Seconds a generated SSR paragraph is reused
+SSR_CACHE_TTL = float(os.getenv("SSR_CACHE_TTL", "86400"))
+
+# Entries kept in the in-process tier
+SSR_CACHE_MEMORY_ITEMS = int(os.getenv("SSR_CACHE_MEMORY_ITEMS", "1000"))
+
+# Recurring risk questions precomputed by the warm-up command
+STANDARD_RISK_QUERIES = [
+    "Does this supplier show signs of financial distress?",
+    "Is this supplier exposed to sanctions or export-control restrictions?",
+    "Are we dependent on this supplier as a single source?",
+    "Are there any supply chain disruptions mentioned?",
+    "Has this vendor been involved in any regulatory issues?",
+    "Is there political instability in the supplier's region?",
+    "Are there quality or certification lapses in the supplier's documents?",
+    "Are there ESG or labour compliance concerns for this supplier?",
+]
+
+_memory = OrderedDict()
+_stats = {"memory_hits": 0, "stored_hits": 0, "misses": 0}
+
+
+def _remember(key, paragraph, vector, expires_at):
+    _memory[key] = (paragraph, vector, expires_at)
+    _memory.move_to_end(key)
+    while len(_memory) > SSR_CACHE_MEMORY_ITEMS:
+        _memory.popitem(last=False)
+
+
+async def _generate(user_query):
+    """Call the LLM for the hypothetical paragraph and embed it."""
+    paragraph = await call_llm([{"role": "user", "content": generate_ssr_prompt(user_query)}], temperature=0.7, max_tokens=200)
+    vector = await run_in_threadpool(embed_query, paragraph)
+    return paragraph, vector
+
+
+async def _store(key, user_query, paragraph, vector):
+    """Persist an SSR entry for all workers and return its expiry."""
+    now = datetime.utcnow()
+    await ssr_cache_collection.replace_one(
+        {"_id": key},
+        {
+            "query": user_query,
+            "paragraph": paragraph,
+            "vector": vector,
+            "model": EMBED_MODEL,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=SSR_CACHE_TTL)
+        },
+        upsert=True
+    )
+    return time.monotonic() + SSR_CACHE_TTL
+
+
+async def generate_ssr(user_query):
+    """Return (hypothetical paragraph, embedding) for a query, reusing a fresh cached entry."""
+    key = normalize_query(user_query)
+
+    cached = _memory.get(key)
+    if cached and cached[2] > time.monotonic():
+        _memory.move_to_end(key)
+        _stats["memory_hits"] += 1
+        return cached[0], cached[1]
+
+    stored = await ssr_cache_collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+    if stored:
+        vector = stored["vector"]
+        if stored.get("model") != EMBED_MODEL:
+            # Paragraph is still valid, but the vector belongs to another embedding space
+            vector = await run_in_threadpool(embed_query, stored["paragraph"])
+            await ssr_cache_collection.update_one({"_id": key}, {"$set": {"vector": vector, "model": EMBED_MODEL}})
+        remaining = (stored["expires_at"] - datetime.utcnow()).total_seconds()
+        _remember(key, stored["paragraph"], vector, time.monotonic() + remaining)
+        _stats["stored_hits"] += 1
+        return stored["paragraph"], vector
+
+    _stats["misses"] += 1
+    paragraph, vector = await _generate(user_query)
+    expires_at = await _store(key, user_query, paragraph, vector)
+    _remember(key, paragraph, vector, expires_at)
+    return paragraph, vector
+
+
+async def warm_ssr_cache(queries, force=False):
+    """Precompute SSR entries; existing fresh entries are kept unless force is set."""
+    warmed = 0
+    for user_query in queries:
+        key = normalize_query(user_query)
+        if not force and await ssr_cache_collection.find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.utcnow()}, "model": EMBED_MODEL}, {"_id": 1}
+        ):
+            continue
+        paragraph, vector = await _generate(user_query)
+        await _store(key, user_query, paragraph, vector)
+        warmed += 1
+    return warmed
+
+
+def ssr_cache_stats():
+    """Hit/miss counters of this worker's SSR cache."""
+    lookups = sum(_stats.values())
+    return {
+        **_stats,
+        "memory_items": len(_memory),
+        "hit_rate": round((_stats["memory_hits"] + _stats["stored_hits"]) / lookups, 4) if lookups else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute SSR paragraphs and embeddings for common risk queries.")
+    parser.add_argument("--file", help="Text file with one query per line (defaults to the built-in standard queries)")
+    parser.add_argument("--force", action="store_true", help="Regenerate entries that are still fresh")
+    args = parser.parse_args(argv)
+
+    queries = STANDARD_RISK_QUERIES
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as file:
+            queries = [line.strip() for line in file if line.strip()]
+
+    warmed = asyncio.run(warm_ssr_cache(queries, force=args.force))
+    print(f"Warmed {warmed} of {len(queries)} SSR entries.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,33 @@
 import os
 import uuid
-import requests
+import hashlib
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.text_splitters import RecursiveCharacterTextSplitter
-from qdrant_client.models import PointStruct
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue, ValuesCount, PointIdsList
+from server.ingestion.extraction import iter_text_from_file, extract_text_from_file, iter_document_chunks
+from server.ingestion.utils.embeddings import (
+    EMBED_MODEL,
+    EMBED_BACKEND,
+    get_embedding_backend,
+    embedder_loaded,
+    embedding_cache,
+    embed_texts,
+    embed_query,
+    embedding_dimension,
+    iter_embedded_windows
+)
+from server.ingestion.utils.llm import LLM, OPENROUTER_URL, call_llm, stream_llm, close_llm_client
+from server.ingestion.utils.sparse import (
+    HYBRID_SEARCH_ENABLED,
+    SPARSE_VECTOR_NAME,
+    sparse_vectors_config,
+    sparse_document_vector,
+    sparse_query_vector,
+    collection_has_sparse_vectors
+)
 
 # Load environment variables
 load_dotenv()
 
-EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
-LLM = "openai/gpt-oss-20b:free"
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-OPENROUTER_API_KEY = os.getenv("MODEL_PROVIDER_KEY")
-
-
-# Check if API key is set and valid
-if not OPENROUTER_API_KEY:
-    raise ValueError(
-        "MODEL_PROVIDER_KEY is not set properly in .env file.\n"
-        "Please get an API key from https://openrouter.ai/keys and update MODEL_PROVIDER_KEY in your .env file."
-    )
-
-# Embeddings
-embedder = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-
 RISK_TEMPLATE = """
 You are a domain expert specialized in supply chain risk analysis.
 
@@ -55,181 +58,276 @@ def generate_ssr_prompt(user_query):
     return ssr_prompt
 
 
-def call_llm(messages, temperature=0.7, max_tokens=200):
-    """Call LLM with given messages."""
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-    }
+def parse_risk_assessment(assessment_text):
+    """Parse risk assessment to extract risk level."""
+    risk_level = "Moderate"  # default
+    if "High" in assessment_text[:50]:
+        risk_level = "High"
+    elif "Low" in assessment_text[:50]:
+        risk_level = "Low"
+    return risk_level
 
-    payload = {
-        "model": LLM,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens
-    }
 
-    try:
-        r = requests.post(OPENROUTER_URL, json=payload, headers=headers)
-        resp = r.json()
+def chunk_hash(text):
+    """SHA-256 of a chunk's text; identical chunks share one hash."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-        # ---- Case 1: OpenAI-style response ----
-        if "choices" in resp and resp["choices"]:
-            choice = resp["choices"][0]
 
-            # Format A: choices[].message.content
-            if "message" in choice and "content" in choice["message"]:
-                return choice["message"]["content"]
+def _point_id(content_hash, chunk_index):
+    """Deterministic point id for content-addressed chunks, so re-ingesting identical bytes overwrites in place."""
+    if content_hash:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{content_hash}:{chunk_index}"))
+    return str(uuid.uuid4())
 
-            # Format B: choices[].text  (Anthropic / Cohere models)
-            if "text" in choice:
-                return choice["text"]
 
-            # Format C: multi-part content
-            if "content" in choice:
-                parts = choice["content"]
-                if isinstance(parts, list):
-                    return "".join([p.get("text", "") for p in parts])
-                if isinstance(parts, str):
-                    return parts
+def build_chunk_point(chunk_index, page_number, chunk, embedding, document, sparse=False):
+    """Create the Qdrant point for one embedded chunk.
 
-        # ---- Case 2: OpenRouter error object ----
-        if "error" in resp:
-            raise Exception(resp["error"])
+    document holds document_id, vendor_id, filename and optionally content_hash plus the
+    document_ids/vendor_ids of every upload sharing that content. With sparse, the point also
+    carries the chunk's BM25 vector for hybrid search.
+    """
+    content_hash = document.get("content_hash")
+    vector = embedding.tolist()
+    if sparse:
+        vector = {"": vector, SPARSE_VECTOR_NAME: sparse_document_vector(chunk)}
+    return PointStruct(
+        id=_point_id(content_hash, chunk_index),
+        vector=vector,
+        payload={
+            "text": chunk,
+            "document_id": document.get("document_ids") or [document["document_id"]],
+            "vendor_id": document.get("vendor_ids") or [document["vendor_id"]],
+            "filename": document["filename"],
+            "chunk_index": chunk_index,
+            "page": page_number,
+            "source": document["filename"],
+            "content_hash": content_hash,
+            "chunk_hash": chunk_hash(chunk)
+        }
+    )
 
-        raise Exception("Unknown LLM response format")
 
-    except Exception as e:
-        raise Exception(f"LLM call error: {e}")
+def set_document_chunk_total(qdrant_client, collection_name, document_id, chunk_count):
+    """Record the chunk total on every chunk of a document once it is known."""
+    qdrant_client.set_payload(
+        collection_name=collection_name,
+        payload={"total_chunks": chunk_count},
+        points=_document_filter(document_id)
+    )
 
 
-def parse_risk_assessment(assessment_text):
-    """Parse risk assessment to extract risk level."""
-    risk_level = "Moderate"  # default
-    if "High" in assessment_text[:50]:
-        risk_level = "High"
-    elif "Low" in assessment_text[:50]:
-        risk_level = "Low"
-    return risk_level
-
+def chunk_and_embed_document(file_path, document_id, vendor_id, filename, qdrant_client, collection_name,
+                             content_hash=None, references=None, reuse_vectors=None):
+    """Chunk document and store embeddings in Qdrant, streaming pages through extraction and embedding.
 
-def extract_text_from_file(file_path):
-    """Extract text content from various file formats."""
-    file_extension = os.path.splitext(file_path)[1].lower()
-
-    if file_extension == '.pdf':
-        try:
-            import PyPDF2
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
-        except ImportError:
-            raise ImportError("PyPDF2 is required for PDF processing. Install it with: pip install PyPDF2")
-        except Exception as e:
-            raise Exception(f"Error processing PDF: {e}")
-
-    elif file_extension == '.docx':
-        try:
-            import mammoth
-            with open(file_path, 'rb') as file:
-                result = mammoth.extract_raw_text(file)
-                return result.value
-        except Exception as e:
-            raise Exception(f"Error processing DOCX: {e}")
-
-    elif file_extension == '.txt':
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        except Exception as e:
-            raise Exception(f"Error processing TXT: {e}")
-
-    else:
-        raise ValueError(f"Unsupported file type: {file_extension}")
-
-
-def chunk_and_embed_document(file_path, document_id, vendor_id, filename, qdrant_client, collection_name):
-    """Chunk document and store embeddings in Qdrant."""
+    references is an optional (document_ids, vendor_ids) pair of every upload sharing content_hash;
+    reuse_vectors maps chunk hashes to vectors that need not be embedded again. If the stream
+    fails partway, the chunks already upserted are deleted again before the error is raised.
+    """
+    upserted_ids = []
     try:
-        # Extract text from the file
-        raw_text = extract_text_from_file(file_path)
-
-        if not raw_text.strip():
-            return [], "No text content extracted from document"
-
-        # Initialize text splitter
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,  # 1000 characters per chunk
-            chunk_overlap=200,  # 200 characters overlap
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]  # Try to split on paragraphs, then lines, then spaces
-        )
+        document = {
+            "document_id": document_id,
+            "vendor_id": vendor_id,
+            "filename": filename,
+            "content_hash": content_hash
+        }
+        if references:
+            document["document_ids"], document["vendor_ids"] = references
+
+        chunks = iter_document_chunks(iter_text_from_file(file_path))
+        sparse = collection_has_sparse_vectors(qdrant_client, collection_name)
+
+        # Embed and upsert in windows of batched forward passes
+        chunk_count = 0
+        reused_count = 0
+        for window, vectors in iter_embedded_windows(chunks, known=reuse_vectors, key=chunk_hash):
+            points = [
+                build_chunk_point(i, page_number, chunk, embedding, document, sparse=sparse)
+                for (i, page_number, chunk), embedding in zip(window, vectors)
+            ]
 
-        # Split the text into chunks
-        chunks = text_splitter.split_text(raw_text)
-
-        # Prepare points for Qdrant
-        points = []
-        for i, chunk in enumerate(chunks):
-            if chunk.strip():  # Only process non-empty chunks
-                # Create embedding for the chunk
-                embedding = embedder.embed_query(chunk)
-
-                # Create point for Qdrant
-                chunk_id = str(uuid.uuid4())
-                point = PointStruct(
-                    id=chunk_id,
-                    vector=embedding,
-                    payload={
-                        "text": chunk,
-                        "document_id": document_id,
-                        "vendor_id": vendor_id,
-                        "filename": filename,
-                        "chunk_index": i,
-                        "total_chunks": len(chunks),
-                        "source": filename
-                    }
-                )
-                points.append(point)
-
-        # Upsert points to Qdrant
-        if points:
+            # Upsert points to Qdrant
             qdrant_client.upsert(
                 collection_name=collection_name,
                 points=points
             )
+            upserted_ids.extend(point.id for point in points)
+            chunk_count += len(points)
+            if reuse_vectors:
+                reused_count += sum(1 for _, _, chunk in window if chunk_hash(chunk) in reuse_vectors)
+
+        if not chunk_count:
+            return 0, "No text content extracted from document"
 
-        return points, f"Successfully processed {len(points)} chunks"
+        # The chunk total is only known once the stream is exhausted
+        set_document_chunk_total(qdrant_client, collection_name, document_id, chunk_count)
+
+        if reuse_vectors is not None:
+            return chunk_count, f"Successfully processed {chunk_count} chunks ({reused_count} unchanged, not re-embedded)"
+        return chunk_count, f"Successfully processed {chunk_count} chunks"
 
     except Exception as e:
+        # Chunks of a failed document have no total_chunks and would still be retrieved
+        if upserted_ids:
+            try:
+                delete_chunk_points(qdrant_client, collection_name, upserted_ids)
+            except Exception as cleanup_error:
+                print(f"Warning: could not remove partial chunks of document {document_id}: {cleanup_error}")
         raise Exception(f"Error processing document: {e}")
 
 
-def delete_document_chunks(qdrant_client, collection_name, document_id):
-    """Delete all chunks for a specific document from Qdrant."""
+def _document_filter(document_id):
+    """Filter matching all chunks of a document."""
+    return Filter(
+        must=[
+            FieldCondition(
+                key="document_id",
+                match=MatchValue(value=document_id)
+            )
+        ]
+    )
+
+
+def _content_filter(content_hash):
+    """Filter matching all chunks stored for one file content."""
+    return Filter(
+        must=[
+            FieldCondition(
+                key="content_hash",
+                match=MatchValue(value=content_hash)
+            )
+        ]
+    )
+
+
+def count_content_chunks(qdrant_client, collection_name, content_hash):
+    """Number of chunks already stored for a file content."""
+    return qdrant_client.count(
+        collection_name=collection_name,
+        count_filter=_content_filter(content_hash),
+        exact=True
+    ).count
+
+
+def content_chunk_total(qdrant_client, collection_name, content_hash):
+    """Chunk total recorded on the stored chunks of a file content, or None if it was never recorded."""
+    points, _ = qdrant_client.scroll(
+        collection_name=collection_name,
+        scroll_filter=_content_filter(content_hash),
+        with_payload=["total_chunks"],
+        limit=1
+    )
+    return points[0].payload.get("total_chunks") if points else None
+
+
+def set_content_references(qdrant_client, collection_name, content_hash, document_ids, vendor_ids):
+    """Point the shared chunks of a file content at every document and vendor that uploaded it."""
+    qdrant_client.set_payload(
+        collection_name=collection_name,
+        payload={"document_id": list(document_ids), "vendor_id": list(vendor_ids)},
+        points=_content_filter(content_hash)
+    )
+
+
+def load_chunk_vectors(qdrant_client, collection_name, content_hash):
+    """Map chunk hash to stored vector for every chunk of a file content."""
+    vectors = {}
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=_content_filter(content_hash),
+            with_payload=["chunk_hash"],
+            with_vectors=True,
+            limit=256,
+            offset=offset
+        )
+        for point in points:
+            if point.payload.get("chunk_hash"):
+                # Hybrid collections return named vectors; only the dense one is reused
+                vector = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+                vectors[point.payload["chunk_hash"]] = vector
+        if offset is None:
+            return vectors
+
+
+def release_content_chunks(qdrant_client, collection_name, content_hash, document_ids, vendor_ids):
+    """Drop a document's reference to shared chunks, deleting them once no document references them."""
     try:
-        from qdrant_client.models import Filter, FieldCondition, MatchValue
-
-        # Create filter to find all chunks for this document
-        document_filter = Filter(
-            must=[
-                FieldCondition(
-                    key="document_id",
-                    match=MatchValue(value=document_id)
-                )
-            ]
+        if document_ids:
+            set_content_references(qdrant_client, collection_name, content_hash, document_ids, vendor_ids)
+            return True, f"Chunks kept for {len(document_ids)} other documents"
+
+        qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=_content_filter(content_hash)
         )
+        return True, "Document chunks deleted successfully"
 
+    except Exception as e:
+        raise Exception(f"Error releasing document chunks: {e}")
+
+
+def delete_document_chunks(qdrant_client, collection_name, document_id):
+    """Delete all chunks for a specific document from Qdrant."""
+    try:
         # Delete all points matching the filter
         qdrant_client.delete(
             collection_name=collection_name,
-            points_selector=document_filter
+            points_selector=_document_filter(document_id)
         )
 
         return True, "Document chunks deleted successfully"
 
     except Exception as e:
         raise Exception(f"Error deleting document chunks: {e}")
+
+
+def _exclusive_vendor_filter(vendor_id):
+    """Filter matching chunks referenced by this vendor and no other."""
+    return Filter(
+        must=[
+            FieldCondition(
+                key="vendor_id",
+                match=MatchValue(value=vendor_id)
+            ),
+            FieldCondition(
+                key="vendor_id",
+                values_count=ValuesCount(lte=1)
+            )
+        ]
+    )
+
+
+def delete_vendor_chunks(qdrant_client, collection_name, vendor_id):
+    """Delete, in one filtered request, every chunk only this vendor references; returns how many."""
+    try:
+        vendor_filter = _exclusive_vendor_filter(vendor_id)
+        count = qdrant_client.count(
+            collection_name=collection_name,
+            count_filter=vendor_filter,
+            exact=True
+        ).count
+        if count:
+            qdrant_client.delete(
+                collection_name=collection_name,
+                points_selector=vendor_filter
+            )
+        return count
+
+    except Exception as e:
+        raise Exception(f"Error deleting vendor chunks: {e}")
+
+
+def delete_chunk_points(qdrant_client, collection_name, point_ids):
+    """Delete chunks by point id."""
+    try:
+        qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=list(point_ids))
+        )
+
+    except Exception as e:
+        raise Exception(f"Error deleting chunks: {e}")
@@ -0,0 +1,332 @@
+"""Embedding backends: what turns texts into vectors for EMBED_MODEL.
+
+torch runs the model through HuggingFaceEmbeddings (sentence-transformers on PyTorch).
+onnx runs the same model exported to ONNX on ONNX Runtime. It can use dynamic int8
+quantization, which is faster and far smaller on CPU-only nodes. Vectors must stay
+interchangeable with those already stored in Qdrant, so export the model once and
+check parity before switching EMBED_BACKEND:
+
+    python -m server.ingestion.utils.embedding_backends export
+    python -m server.ingestion.utils.embedding_backends parity
+"""
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+# Directory holding the ONNX export (model.onnx, model.int8.onnx, tokenizer.json, export.json)
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "models/embedding-onnx")
+
+# Run the dynamically int8-quantized model written by export (model.int8.onnx)
+EMBED_ONNX_QUANTIZE = os.getenv("EMBED_ONNX_QUANTIZE", "true").lower() == "true"
+
+# ONNX Runtime intra-op threads per worker; 0 lets the runtime use every core
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))
+
+# Lowest cosine similarity to the torch vectors a backend may produce for any parity text
+EMBED_PARITY_MIN_COSINE = float(os.getenv("EMBED_PARITY_MIN_COSINE", "0.99"))
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model.int8.onnx"
+ONNX_EXPORT_FILE = "export.json"
+
+# Parity texts: short and long (past the 256-token limit), mixed case, ids and numbers
+PARITY_TEXTS = [
+    "Supplier financial distress and late payments",
+    "ISO 9001:2015 certificate SUP-0042 expires 2026-03-31.",
+    "The vendor sources cobalt from regions subject to export restrictions and sanctions screening.",
+    "Delivery performance: 97.4% on-time in Q3, down from 99.1% in Q2 after the port strike.",
+    "Force majeure clause: neither party is liable for delays caused by events beyond reasonable control. " * 20,
+    "Cyber incident disclosed in March; customer data exposure under investigation by the regulator.",
+    "Single-source dependency on one fab for the ASIC controller used in all product lines.",
+    "ok"
+]
+
+
+class EmbeddingBackend:
+    """Turns texts into float32 vectors; subclasses load their model in __init__."""
+
+    name = None
+
+    def __init__(self, model_name, max_seq_length=None):
+        self.model_name = model_name
+        self.max_seq_length = int(max_seq_length) if max_seq_length else None
+
+    def encode(self, texts, batch_size):
+        """Embed texts in batches, returning a float32 array of shape (len(texts), dim) in input order."""
+        raise NotImplementedError
+
+    def dimension(self):
+        """Dimension of the vectors encode() returns."""
+        return int(self.encode(["dimension"], 1).shape[1])
+
+
+class TorchBackend(EmbeddingBackend):
+    """sentence-transformers on PyTorch, through HuggingFaceEmbeddings."""
+
+    name = "torch"
+
+    def __init__(self, model_name, max_seq_length=None):
+        super().__init__(model_name, max_seq_length)
+        from langchain_huggingface import HuggingFaceEmbeddings
+        self.embedder = HuggingFaceEmbeddings(model_name=model_name)
+
+        # The SentenceTransformer wrapped by the embedder, if it is reachable
+        model = getattr(self.embedder, "client", None) or getattr(self.embedder, "_client", None)
+        if model is None or not hasattr(model, "encode"):
+            model = None
+        elif self.max_seq_length and hasattr(model, "max_seq_length"):
+            model.max_seq_length = self.max_seq_length
+        self.model = model
+
+    def encode(self, texts, batch_size):
+        if self.model is not None:
+            # SentenceTransformer sorts by length internally, so each batch pads to similar lengths
+            encode_kwargs = {
+                k: v for k, v in (getattr(self.embedder, "encode_kwargs", None) or {}).items()
+                if k not in ("batch_size", "convert_to_numpy", "show_progress_bar")
+            }
+            vectors = self.model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+                **encode_kwargs
+            )
+            return np.asarray(vectors, dtype=np.float32)
+
+        # Fallback: batch through embed_documents, grouping similar lengths to limit padding
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        vectors = None
+        for start in range(0, len(texts), batch_size):
+            batch_idx = order[start:start + batch_size]
+            batch = np.asarray(self.embedder.embed_documents([texts[i] for i in batch_idx]), dtype=np.float32)
+            if vectors is None:
+                vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[batch_idx] = batch
+        return vectors
+
+    def dimension(self):
+        if self.model is not None and hasattr(self.model, "get_sentence_embedding_dimension"):
+            return self.model.get_sentence_embedding_dimension()
+        return len(self.embedder.embed_query("dimension"))
+
+
+def quantize_onnx_model(model_path, quantized_path):
+    """Dynamic int8 quantization of the model's weights; activations are quantized at run time."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """The exported transformer on ONNX Runtime (CPU), with sentence-transformers' mean pooling
+    and normalization done in numpy."""
+
+    name = "onnx"
+
+    def __init__(self, model_name, max_seq_length=None, model_dir=EMBED_ONNX_DIR,
+                 quantize=EMBED_ONNX_QUANTIZE, threads=EMBED_ONNX_THREADS):
+        super().__init__(model_name, max_seq_length)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        export_path = os.path.join(model_dir, ONNX_EXPORT_FILE)
+        if not os.path.exists(export_path):
+            raise Exception(
+                f"No ONNX export in {model_dir}; run python -m server.ingestion.utils.embedding_backends export"
+            )
+        with open(export_path, "r", encoding="utf-8") as file:
+            export = json.load(file)
+        if export["model"] != model_name:
+            raise ValueError(f"ONNX export in {model_dir} is of {export['model']}, not {model_name}")
+
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if quantize:
+            # Quantizing is left to export: doing it here would write into a possibly read-only model
+            # directory, and every worker starting together would race to write the same file
+            model_path = os.path.join(model_dir, ONNX_QUANTIZED_MODEL_FILE)
+            if not os.path.exists(model_path):
+                raise Exception(
+                    f"No int8 model ({ONNX_QUANTIZED_MODEL_FILE}) in {model_dir}; rerun "
+                    f"python -m server.ingestion.utils.embedding_backends export, or set EMBED_ONNX_QUANTIZE=false"
+                )
+        self.quantized = quantize
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.max_seq_length = self.max_seq_length or export["max_seq_length"]
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.no_padding()
+        self.normalize = export.get("normalize", True)
+        self._dimension = export["dimension"]
+
+    def encode(self, texts, batch_size):
+        # Tokenize every text in one call (the Rust tokenizer parallelizes it), then run batches of
+        # similar length so little of each forward pass is padding
+        encodings = self.tokenizer.encode_batch(list(texts))
+        order = np.argsort([len(encoding.ids) for encoding in encodings], kind="stable")
+
+        vectors = np.empty((len(texts), self._dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch_idx = order[start:start + batch_size]
+            length = max(len(encodings[i].ids) for i in batch_idx)
+            input_ids = np.zeros((len(batch_idx), length), dtype=np.int64)
+            attention_mask = np.zeros((len(batch_idx), length), dtype=np.int64)
+            token_type_ids = np.zeros((len(batch_idx), length), dtype=np.int64)
+            for row, i in enumerate(batch_idx):
+                size = len(encodings[i].ids)
+                input_ids[row, :size] = encodings[i].ids
+                attention_mask[row, :size] = 1
+                token_type_ids[row, :size] = encodings[i].type_ids
+
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = token_type_ids
+            hidden = self.session.run(None, feeds)[0]
+
+            # Mean pooling over real tokens, then unit length, as the sentence-transformers pipeline does
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if self.normalize:
+                pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            vectors[batch_idx] = pooled
+        return vectors
+
+    def dimension(self):
+        return self._dimension
+
+
+def export_onnx_model(model_name, output_dir=EMBED_ONNX_DIR, quantize=True, opset=14):
+    """Export a mean-pooling sentence-transformers model to ONNX, with its tokenizer and pooling settings.
+
+    Needs torch and sentence-transformers, so run it once at build time rather than on the serving nodes.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    pooling = model[1]
+    if not getattr(pooling, "pooling_mode_mean_tokens", False):
+        raise ValueError(f"{model_name} does not use mean pooling; only mean pooling is supported")
+    normalize = any(type(module).__name__ == "Normalize" for module in model)
+
+    os.makedirs(output_dir, exist_ok=True)
+    transformer = model[0].auto_model.eval()
+    sample = model.tokenizer(["Export sample sentence"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=opset
+        )
+    model.tokenizer.save_pretrained(output_dir)
+
+    with open(os.path.join(output_dir, ONNX_EXPORT_FILE), "w", encoding="utf-8") as file:
+        json.dump({
+            "model": model_name,
+            "max_seq_length": model.max_seq_length,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "normalize": normalize,
+            "pooling": "mean"
+        }, file, indent=2)
+
+    quantized_path = os.path.join(output_dir, ONNX_QUANTIZED_MODEL_FILE)
+    if os.path.exists(quantized_path):
+        os.remove(quantized_path)
+    if quantize:
+        quantize_onnx_model(model_path, quantized_path)
+    return output_dir
+
+
+# Name -> backend class taking (model_name, max_seq_length=None)
+EMBEDDING_BACKENDS = {
+    "torch": TorchBackend,
+    "onnx": OnnxBackend
+}
+
+
+def register_embedding_backend(name, backend_class):
+    """Make a backend selectable through EMBED_BACKEND."""
+    EMBEDDING_BACKENDS[name] = backend_class
+
+
+def create_backend(name, model_name, max_seq_length=None, **options):
+    """Load the named backend for model_name."""
+    backend_class = EMBEDDING_BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Unknown embedding backend '{name}'; expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    return backend_class(model_name, max_seq_length=max_seq_length, **options)
+
+
+def check_parity(candidate, reference, texts=PARITY_TEXTS, min_cosine=EMBED_PARITY_MIN_COSINE, batch_size=8):
+    """Compare two loaded backends on the same texts; passes when every pair of vectors is within min_cosine."""
+    # Same preprocessing as embed_texts
+    texts = [text.replace("\n", " ") for text in texts]
+    expected = reference.encode(texts, batch_size)
+    actual = candidate.encode(texts, batch_size)
+    if expected.shape != actual.shape:
+        return {"passed": False, "error": f"Shape mismatch: {reference.name} {expected.shape}, {candidate.name} {actual.shape}"}
+
+    cosine = (expected * actual).sum(axis=1) / np.maximum(
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1), 1e-12
+    )
+    return {
+        "passed": bool(cosine.min() >= min_cosine),
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "texts": len(texts),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(expected - actual).max()),
+        "threshold": min_cosine
+    }
+
+
+def main(argv=None):
+    from server.ingestion.utils.embeddings import EMBED_MODEL, EMBED_MAX_SEQ_LENGTH
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX and check backend parity.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Export EMBED_MODEL to ONNX (needs torch)")
+    export.add_argument("--output", default=EMBED_ONNX_DIR)
+    export.add_argument("--no-quantize", action="store_true", help="Skip writing the int8 model")
+    parity = commands.add_parser("parity", help="Compare a backend's vectors with the torch backend")
+    parity.add_argument("--backend", default="onnx")
+    parity.add_argument("--fp32", action="store_true", help="Check the unquantized ONNX model")
+    parity.add_argument("--file", help="Text file with one text per line (defaults to built-in samples)")
+    parity.add_argument("--min-cosine", type=float, default=EMBED_PARITY_MIN_COSINE)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        output_dir = export_onnx_model(EMBED_MODEL, args.output, quantize=not args.no_quantize)
+        print(f"Exported {EMBED_MODEL} to {output_dir}")
+        return 0
+
+    texts = PARITY_TEXTS
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as file:
+            texts = [line.strip() for line in file if line.strip()]
+    options = {"quantize": not args.fp32} if args.backend == "onnx" else {}
+    candidate = create_backend(args.backend, EMBED_MODEL, EMBED_MAX_SEQ_LENGTH, **options)
+    reference = create_backend("torch", EMBED_MODEL, EMBED_MAX_SEQ_LENGTH)
+    result = check_parity(candidate, reference, texts, min_cosine=args.min_cosine)
+    print(json.dumps(result, indent=2))
+    return 0 if result["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
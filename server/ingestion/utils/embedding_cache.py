@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Entries kept in the in-process LRU tier
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "10000"))
+
+# SQLite file backing the on-disk tier, opened on first use; empty disables it. Resolved when the
+# module is imported, so the file does not move with the working directory of later calls
+DEFAULT_EMBED_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "safebot", "embedding_cache.sqlite3")
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", DEFAULT_EMBED_CACHE_PATH)
+if EMBED_CACHE_PATH:
+    EMBED_CACHE_PATH = os.path.abspath(EMBED_CACHE_PATH)
+
+# Bytes of the SQLite file mapped into memory for reads
+EMBED_CACHE_MMAP_SIZE = int(os.getenv("EMBED_CACHE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+def normalize_text(text):
+    """Collapse whitespace; the tokenizer splits on whitespace, so this does not change the embedding."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by (model name, backend, quantization, max sequence length,
+    normalized text hash).
+
+    Backends of one model only agree to within their parity threshold, and the max sequence
+    length changes how long texts are truncated, so each combination has its own entries.
+    A bounded in-memory LRU sits in front of a SQLite table of float32 vectors.
+    """
+
+    def __init__(self, model_name, backend=None, quantized=False, max_seq_length=None, path=EMBED_CACHE_PATH,
+                 max_memory_items=EMBED_CACHE_MEMORY_ITEMS):
+        self.model_name = model_name
+        self.backend = backend
+        self.quantized = bool(quantized)
+        self.max_seq_length = int(max_seq_length) if max_seq_length else None
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._variant = f"{model_name}\0{backend}\0{'int8' if self.quantized else 'fp32'}\0{self.max_seq_length}"
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        """The SQLite tier, opened on first use (caller holds the lock); None when disabled."""
+        if self._db is None and self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(f"PRAGMA mmap_size={EMBED_CACHE_MMAP_SIZE}")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vector BLOB)"
+            )
+            db.commit()
+            self._db = db
+        return self._db
+
+    def key(self, text):
+        """Cache key of a text under this cache's model and backend settings."""
+        return hashlib.sha256(f"{self._variant}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts):
+        """Return a list of cached float32 vectors, with None for texts not in the cache."""
+        keys = [self.key(text) for text in texts]
+        vectors = [None] * len(texts)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    vectors[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(i)
+
+            db = self._connect() if missing else None
+            if db is not None:
+                found = {}
+                wanted = list({keys[i] for i in missing})
+                # Stay below SQLite's bound-parameter limit
+                for start in range(0, len(wanted), 500):
+                    batch = wanted[start:start + 500]
+                    rows = db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32)
+                still_missing = []
+                for i in missing:
+                    vector = found.get(keys[i])
+                    if vector is not None:
+                        vectors[i] = vector
+                        self._remember(keys[i], vector)
+                        self.disk_hits += 1
+                    else:
+                        still_missing.append(i)
+                missing = still_missing
+
+            self.misses += len(missing)
+        return vectors
+
+    def put_many(self, texts, vectors):
+        """Store float32 vectors for texts in both tiers."""
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, self.model_name, vector.shape[0], vector.tobytes()))
+            db = self._connect() if rows else None
+            if db is not None:
+                db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                db.commit()
+
+    def stats(self):
+        """Hit/miss counters for both tiers."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "quantized": self.quantized,
+            "max_seq_length": self.max_seq_length,
+            "memory_items": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None
+        }
@@ -0,0 +1,381 @@
+"""Shared embedding server on a Unix socket.
+
+Without it every API worker and ingestion process loads its own copy of the model and
+embeds each SSR paragraph in a forward pass of one. With EMBED_SERVER_SOCKET set, they
+send texts to one local process instead. That process holds the only copy of the model
+and coalesces concurrent requests into micro-batches: a batch is run once it holds
+EMBED_SERVER_MAX_BATCH texts or EMBED_SERVER_MAX_WAIT_MS after its first request arrived.
+
+    python -m server.ingestion.utils.embedding_server
+
+Messages are frames of a 4-byte big-endian length followed by the payload. Requests are
+JSON ({"op": "embed", "texts": [...]}, "info" or "stats"). An embed answer is a JSON
+frame with the shape, then a frame of float32 vector bytes.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from server.ingestion.utils.embedding_backends import EmbeddingBackend, create_backend
+
+# Socket of the shared embedding server; empty embeds in-process
+EMBED_SERVER_SOCKET = os.getenv("EMBED_SERVER_SOCKET", "")
+
+# Most texts coalesced into one forward pass
+EMBED_SERVER_MAX_BATCH = int(os.getenv("EMBED_SERVER_MAX_BATCH", "64"))
+
+# How long a batch waits for more requests after its first one arrived
+EMBED_SERVER_MAX_WAIT_MS = float(os.getenv("EMBED_SERVER_MAX_WAIT_MS", "5"))
+
+# Seconds a client waits for an answer, covering time queued behind other requests
+EMBED_SERVER_TIMEOUT = float(os.getenv("EMBED_SERVER_TIMEOUT", "60"))
+
+# Largest request frame the server accepts
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def _frame(payload):
+    return len(payload).to_bytes(4, "big") + payload
+
+
+class _Request:
+    def __init__(self, texts, future):
+        self.texts = texts
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Queues embed requests and runs them through the backend in coalesced batches.
+
+    The model runs on a single worker thread, so the event loop keeps queueing requests
+    while a batch is being embedded and the next batch forms in the meantime.
+    """
+
+    def __init__(self, backend, max_batch=EMBED_SERVER_MAX_BATCH, max_wait_ms=EMBED_SERVER_MAX_WAIT_MS):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending = deque()
+        self._pending_texts = 0
+        self._arrived = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._started_at = time.time()
+        self._stats = {
+            "requests": 0,
+            "batched_requests": 0,
+            "texts": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "max_queue_depth": 0,
+            "wait_seconds": 0.0,
+            "encode_seconds": 0.0,
+            "batch_sizes": {bucket: 0 for bucket in BATCH_SIZE_BUCKETS + ["more"]}
+        }
+
+    async def embed(self, texts):
+        """Embed texts as part of the next batch; returns a float32 array in input order."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Request(texts, future))
+        self._pending_texts += len(texts)
+        self._stats["requests"] += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._pending_texts)
+        self._arrived.set()
+        return await future
+
+    async def _next_batch(self):
+        while not self._pending:
+            self._arrived.clear()
+            await self._arrived.wait()
+
+        # Give concurrent requests a short window to join the batch
+        deadline = time.perf_counter() + self.max_wait
+        while self._pending_texts < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        # Whole requests in arrival order; a request is never split, so one larger than
+        # max_batch makes a batch of its own
+        batch = [self._pending.popleft()]
+        size = len(batch[0].texts)
+        while self._pending and size + len(self._pending[0].texts) <= self.max_batch:
+            request = self._pending.popleft()
+            batch.append(request)
+            size += len(request.texts)
+        self._pending_texts -= size
+        return batch, size
+
+    def _record_batch(self, batch, size, started, finished):
+        self._stats["batches"] += 1
+        self._stats["batched_requests"] += len(batch)
+        self._stats["texts"] += size
+        self._stats["encode_seconds"] += finished - started
+        self._stats["wait_seconds"] += sum(started - request.queued_at for request in batch)
+        bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), "more")
+        self._stats["batch_sizes"][bucket] += 1
+
+    async def run(self):
+        """Form and embed batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch, size = await self._next_batch()
+            texts = [text for request in batch for text in request.texts]
+            started = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(self._executor, self.backend.encode, texts, self.max_batch)
+            except Exception as e:
+                self._stats["failed_batches"] += 1
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            self._record_batch(batch, size, started, time.perf_counter())
+
+            offset = 0
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+    def stats(self):
+        """Queue depth now and since start, request and batch counters and mean batch size and latencies."""
+        stats = self._stats
+        batches = stats["batches"]
+        return {
+            "queue_depth": self._pending_texts,
+            "queued_requests": len(self._pending),
+            "max_queue_depth": stats["max_queue_depth"],
+            "requests": stats["requests"],
+            "texts": stats["texts"],
+            "batches": batches,
+            "failed_batches": stats["failed_batches"],
+            "mean_batch_size": round(stats["texts"] / batches, 2) if batches else None,
+            "batch_sizes": {str(bucket): count for bucket, count in stats["batch_sizes"].items()},
+            "mean_wait_ms": round(stats["wait_seconds"] / stats["batched_requests"] * 1000, 3)
+            if stats["batched_requests"] else None,
+            "mean_encode_ms": round(stats["encode_seconds"] / batches * 1000, 3) if batches else None,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "uptime_seconds": round(time.time() - self._started_at, 1)
+        }
+
+
+async def _read_frame(reader):
+    length = int.from_bytes(await reader.readexactly(4), "big")
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES}-byte limit")
+    return await reader.readexactly(length)
+
+
+async def _handle_connection(batcher, info, reader, writer):
+    """Answer one client's requests in order until it disconnects."""
+    try:
+        while True:
+            try:
+                request = json.loads(await _read_frame(reader))
+            except asyncio.IncompleteReadError:
+                break
+            op = request.get("op")
+            try:
+                if op == "embed":
+                    vectors = await batcher.embed([str(text) for text in request["texts"]])
+                    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+                    writer.write(_frame(json.dumps({"ok": True, "shape": list(vectors.shape)}).encode()))
+                    writer.write(_frame(vectors.tobytes()))
+                elif op == "info":
+                    writer.write(_frame(json.dumps({"ok": True, **info}).encode()))
+                elif op == "stats":
+                    writer.write(_frame(json.dumps({"ok": True, **batcher.stats()}).encode()))
+                else:
+                    raise ValueError(f"Unknown op '{op}'")
+            except Exception as e:
+                writer.write(_frame(json.dumps({"ok": False, "error": str(e)}).encode()))
+            await writer.drain()
+    except (ConnectionError, ValueError) as e:
+        print(f"Warning: embedding server connection closed: {e}")
+    finally:
+        writer.close()
+
+
+async def serve(socket_path=EMBED_SERVER_SOCKET, backend_name=None, max_batch=EMBED_SERVER_MAX_BATCH,
+                max_wait_ms=EMBED_SERVER_MAX_WAIT_MS):
+    """Load the backend and serve embed requests on socket_path until cancelled."""
+    from server.ingestion.utils.embeddings import EMBED_MODEL, EMBED_BACKEND, EMBED_MAX_SEQ_LENGTH
+
+    if not socket_path:
+        raise ValueError("No socket path; set EMBED_SERVER_SOCKET or pass --socket")
+    backend_name = backend_name or EMBED_BACKEND
+    backend = create_backend(backend_name, EMBED_MODEL, EMBED_MAX_SEQ_LENGTH)
+    # The configured settings the clients' cache keys are built from, not the backend's effective ones
+    info = {
+        "model": EMBED_MODEL,
+        "backend": backend_name,
+        "quantized": bool(getattr(backend, "quantized", False)),
+        "max_seq_length": int(EMBED_MAX_SEQ_LENGTH) if EMBED_MAX_SEQ_LENGTH else None,
+        "dimension": backend.dimension(),
+        "max_batch": max_batch
+    }
+    # One pass before accepting requests, so the first client does not pay for lazy initialisation
+    backend.encode(["warm-up"], 1)
+
+    batcher = MicroBatcher(backend, max_batch, max_wait_ms)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: _handle_connection(batcher, info, reader, writer),
+        path=socket_path
+    )
+    print(f"Embedding server ({EMBED_MODEL} on {backend_name}) listening on {socket_path}")
+    batching = asyncio.create_task(batcher.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batching.cancel()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class EmbeddingServerClient(EmbeddingBackend):
+    """Embedding backend that sends texts to the shared embedding server.
+
+    Blocking, for the worker threads embedding runs in; each thread keeps its own connection.
+    variant maps the backend, quantized and max_seq_length settings the caller keys its
+    embedding cache by to the values the server must run with.
+    """
+
+    name = "server"
+
+    def __init__(self, model_name, socket_path=EMBED_SERVER_SOCKET, timeout=EMBED_SERVER_TIMEOUT, variant=None):
+        super().__init__(model_name)
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.variant = variant or {}
+        self._local = threading.local()
+        self._info = None
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            try:
+                connection.connect(self.socket_path)
+            except OSError:
+                connection.close()
+                raise
+            self._local.connection = connection
+        return connection
+
+    def _close(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            connection.close()
+
+    @staticmethod
+    def _receive(connection, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Embedding server closed the connection")
+            data.extend(chunk)
+        return bytes(data)
+
+    def _read_frame(self, connection):
+        return self._receive(connection, int.from_bytes(self._receive(connection, 4), "big"))
+
+    def _request(self, request):
+        """Send a request and return (answer, vector bytes or None), reconnecting once if the server restarted."""
+        payload = _frame(json.dumps(request).encode())
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                connection.sendall(payload)
+                answer = json.loads(self._read_frame(connection))
+                data = self._read_frame(connection) if answer.get("ok") and "shape" in answer else None
+                break
+            except socket.timeout:
+                # Retrying would queue the same texts again behind a busy server
+                self._close()
+                raise Exception(f"Embedding server at {self.socket_path} did not answer within {self.timeout}s")
+            except (OSError, ConnectionError) as e:
+                self._close()
+                if attempt:
+                    raise Exception(f"Embedding server at {self.socket_path} unavailable: {e}")
+        if not answer.get("ok"):
+            raise Exception(f"Embedding server error: {answer.get('error')}")
+        return answer, data
+
+    def info(self):
+        """Model, backend settings and dimension the server embeds with; checked against this worker's once."""
+        if self._info is None:
+            info, _ = self._request({"op": "info"})
+            info.pop("ok")
+            if info["model"] != self.model_name:
+                raise ValueError(f"Embedding server at {self.socket_path} runs {info['model']}, not {self.model_name}")
+            # Its vectors would be cached under this worker's settings
+            mismatched = {name: value for name, value in self.variant.items() if info.get(name) != value}
+            if mismatched:
+                raise ValueError(
+                    f"Embedding server at {self.socket_path} embeds with "
+                    + ", ".join(f"{name}={info.get(name)}" for name in mismatched)
+                    + ", not " + ", ".join(f"{name}={value}" for name, value in mismatched.items())
+                )
+            self._info = info
+        return self._info
+
+    def encode(self, texts, batch_size):
+        if not texts:
+            return np.empty((0, self.dimension()), dtype=np.float32)
+        # Requests of at most one server batch, so a large ingestion window does not hold up queries behind it
+        step = min(batch_size, self.info()["max_batch"])
+        parts = []
+        for start in range(0, len(texts), step):
+            answer, data = self._request({"op": "embed", "texts": list(texts[start:start + step])})
+            parts.append(np.frombuffer(data, dtype=np.float32).reshape(answer["shape"]))
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def dimension(self):
+        return self.info()["dimension"]
+
+    def stats(self):
+        """The server's queue depth and batching statistics."""
+        answer, _ = self._request({"op": "stats"})
+        answer.pop("ok")
+        return answer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve embeddings to local workers over a Unix socket.")
+    parser.add_argument("--socket", default=EMBED_SERVER_SOCKET or "/tmp/safebot-embed.sock")
+    parser.add_argument("--backend", help="Embedding backend (defaults to EMBED_BACKEND)")
+    parser.add_argument("--max-batch", type=int, default=EMBED_SERVER_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBED_SERVER_MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.socket, args.backend, args.max_batch, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
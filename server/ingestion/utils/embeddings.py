@@ -0,0 +1,153 @@
+import os
+import threading
+import numpy as np
+from server.ingestion.utils.embedding_cache import EmbeddingCache
+from server.ingestion.utils.embedding_backends import create_backend, EMBED_ONNX_QUANTIZE
+from server.ingestion.utils.embedding_server import EMBED_SERVER_SOCKET, EmbeddingServerClient
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# What runs the model: torch (sentence-transformers) or onnx (ONNX Runtime, see embedding_backends)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+
+# Texts per forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Chunks embedded and upserted together; bounds peak memory on very large documents
+EMBED_WINDOW_SIZE = int(os.getenv("EMBED_WINDOW_SIZE", "512"))
+
+# Optional cap on tokens per text; batches are padded to the longest text up to this length
+EMBED_MAX_SEQ_LENGTH = os.getenv("EMBED_MAX_SEQ_LENGTH")
+
+# Cache embeddings so re-ingestion and repeated queries skip the model
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+
+# Vector dimension of EMBED_MODEL, so startup can validate the collection without loading the model;
+# empty uses KNOWN_EMBED_DIMENSIONS, or loads the model for models not listed there
+EMBED_DIMENSION = os.getenv("EMBED_DIMENSION")
+KNOWN_EMBED_DIMENSIONS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384
+}
+
+# Settings that change the vectors of EMBED_MODEL: backends only agree to within their parity
+# threshold, so the cache keeps their vectors apart and a shared embedding server must match them
+EMBED_VARIANT = {
+    "backend": EMBED_BACKEND,
+    "quantized": EMBED_BACKEND == "onnx" and EMBED_ONNX_QUANTIZE,
+    "max_seq_length": int(EMBED_MAX_SEQ_LENGTH) if EMBED_MAX_SEQ_LENGTH else None
+}
+
+embedding_cache = EmbeddingCache(EMBED_MODEL, **EMBED_VARIANT) if EMBED_CACHE_ENABLED else None
+
+# Embedding backend, loaded on first use: importing the runtime and the model takes seconds.
+# With EMBED_SERVER_SOCKET it is a client of the shared embedding server instead
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_embedding_backend():
+    """The EMBED_BACKEND backend for EMBED_MODEL, loaded on first call.
+
+    With EMBED_SERVER_SOCKET, a client of the shared embedding server; it counts as loaded
+    once the server answered and runs EMBED_MODEL with the EMBED_VARIANT settings.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if EMBED_SERVER_SOCKET:
+                    backend = EmbeddingServerClient(EMBED_MODEL, EMBED_SERVER_SOCKET, variant=EMBED_VARIANT)
+                    backend.info()
+                else:
+                    backend = create_backend(EMBED_BACKEND, EMBED_MODEL, EMBED_MAX_SEQ_LENGTH)
+                _backend = backend
+    return _backend
+
+
+def embedder_loaded():
+    """Whether the embedding model has been loaded."""
+    return _backend is not None
+
+
+def _encode_texts(texts, batch_size=EMBED_BATCH_SIZE):
+    """Run the model over texts in batches, returning a float32 array of shape (len(texts), dim)."""
+
+    # Match HuggingFaceEmbeddings preprocessing so vectors equal embed_query output
+    texts = [text.replace("\n", " ") for text in texts]
+    return get_embedding_backend().encode(texts, batch_size)
+
+
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE):
+    """Embed texts in batches, returning a float32 array of shape (len(texts), dim) in input order.
+
+    Texts already in the embedding cache skip the model.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    if embedding_cache is None:
+        return _encode_texts(texts, batch_size)
+
+    cached = embedding_cache.get_many(texts)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    if missing:
+        # Embed each distinct missing text once
+        by_key = {}
+        for i in missing:
+            by_key.setdefault(embedding_cache.key(texts[i]), texts[i])
+        unique_texts = list(by_key.values())
+        encoded = dict(zip(by_key, _encode_texts(unique_texts, batch_size)))
+        embedding_cache.put_many(unique_texts, encoded.values())
+        for i in missing:
+            cached[i] = encoded[embedding_cache.key(texts[i])]
+    return np.stack(cached).astype(np.float32, copy=False)
+
+
+def embed_query(text):
+    """Embed a single query text as a list of floats, through the cache."""
+    return embed_texts([text])[0].tolist()
+
+
+def embedding_dimension():
+    """Dimension of the vectors EMBED_MODEL produces; only loads the model when it is not configured or known."""
+    if not embedder_loaded():
+        if EMBED_DIMENSION:
+            return int(EMBED_DIMENSION)
+        if EMBED_MODEL in KNOWN_EMBED_DIMENSIONS:
+            return KNOWN_EMBED_DIMENSIONS[EMBED_MODEL]
+    return get_embedding_backend().dimension()
+
+
+def _embed_window(window, batch_size, known, key):
+    """Embed a window's texts, taking vectors for texts whose key is in known instead of re-embedding."""
+    texts = [item[-1] for item in window]
+    if not known:
+        return embed_texts(texts, batch_size)
+
+    keys = [key(text) for text in texts]
+    missing = [i for i, k in enumerate(keys) if k not in known]
+    embedded = embed_texts([texts[i] for i in missing], batch_size)
+
+    dim = embedded.shape[1] if len(missing) else len(next(iter(known.values())))
+    vectors = np.empty((len(texts), dim), dtype=np.float32)
+    for i, k in enumerate(keys):
+        if k in known:
+            vectors[i] = known[k]
+    if len(missing):
+        vectors[missing] = embedded
+    return vectors
+
+
+def iter_embedded_windows(items, window_size=EMBED_WINDOW_SIZE, batch_size=EMBED_BATCH_SIZE, known=None, key=None):
+    """Yield (items, vectors) windows so only one window of vectors is held in memory.
+
+    Items are tuples whose last element is the text to embed. When known maps key(text)
+    to a vector, those texts are not embedded again.
+    """
+    window = []
+    for item in items:
+        window.append(item)
+        if len(window) >= window_size:
+            yield window, _embed_window(window, batch_size, known, key)
+            window = []
+    if window:
+        yield window, _embed_window(window, batch_size, known, key)
@@ -0,0 +1,211 @@
+import os
+import json
+import random
+import asyncio
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+LLM = "openai/gpt-oss-20b:free"
+# Chat completions endpoint; overridable for OpenRouter-compatible gateways and the offline benchmarks
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+OPENROUTER_API_KEY = os.getenv("MODEL_PROVIDER_KEY")
+
+# Seconds to wait for a completion, and for the TCP/TLS connection
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+
+# Retries on 429/5xx and transport errors, with exponential backoff starting at LLM_BACKOFF_BASE seconds
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+# Requests in flight to the provider across the whole worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+
+# Connection pool size; idle keep-alive connections are reused between calls
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+
+
+# Check if API key is set and valid
+if not OPENROUTER_API_KEY:
+    raise ValueError(
+        "MODEL_PROVIDER_KEY is not set properly in .env file.\n"
+        "Please get an API key from https://openrouter.ai/keys and update MODEL_PROVIDER_KEY in your .env file."
+    )
+
+_client = None
+_semaphore = None
+
+
+def _get_client():
+    """Shared pooled client, created on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE)
+        )
+    return _client
+
+
+def _get_semaphore():
+    """Global concurrency limit, created on the running event loop."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def close_llm_client():
+    """Close pooled connections; called on app shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _backoff_delay(attempt, response=None):
+    """Seconds to wait before the next attempt, honouring Retry-After when the provider sends it."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX)
+            except ValueError:
+                pass
+    delay = min(LLM_BACKOFF_BASE * (2 ** attempt), LLM_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _extract_content(resp):
+    """Pull the completion text out of a provider response."""
+    # ---- Case 1: OpenAI-style response ----
+    if "choices" in resp and resp["choices"]:
+        choice = resp["choices"][0]
+
+        # Format A: choices[].message.content
+        if "message" in choice and "content" in choice["message"]:
+            return choice["message"]["content"]
+
+        # Format B: choices[].text  (Anthropic / Cohere models)
+        if "text" in choice:
+            return choice["text"]
+
+        # Format C: multi-part content
+        if "content" in choice:
+            parts = choice["content"]
+            if isinstance(parts, list):
+                return "".join([p.get("text", "") for p in parts])
+            if isinstance(parts, str):
+                return parts
+
+    # ---- Case 2: OpenRouter error object ----
+    if "error" in resp:
+        raise Exception(resp["error"])
+
+    raise Exception("Unknown LLM response format")
+
+
+async def call_llm(messages, temperature=0.7, max_tokens=200, timeout=None):
+    """Call LLM with given messages, retrying rate limits and server errors with backoff."""
+    payload = {
+        "model": LLM,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    request_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+
+    try:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            response = None
+            try:
+                async with _get_semaphore():
+                    response = await _get_client().post(OPENROUTER_URL, json=payload, timeout=request_timeout)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt == LLM_MAX_RETRIES:
+                    raise Exception(f"request failed after {attempt + 1} attempts: {e!r}")
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    return _extract_content(response.json())
+                if attempt == LLM_MAX_RETRIES:
+                    raise Exception(f"provider returned {response.status_code} after {attempt + 1} attempts")
+
+            await asyncio.sleep(_backoff_delay(attempt, response))
+
+    except Exception as e:
+        raise Exception(f"LLM call error: {e}")
+
+
+def _extract_delta(event):
+    """Pull the incremental text out of one streamed completion event."""
+    if "error" in event:
+        raise Exception(event["error"])
+    for choice in event.get("choices") or []:
+        delta = choice.get("delta") or {}
+        if delta.get("content"):
+            return delta["content"]
+        if choice.get("text"):
+            return choice["text"]
+    return ""
+
+
+async def stream_llm(messages, temperature=0.7, max_tokens=200, timeout=None):
+    """Stream completion text chunks as the provider produces them.
+
+    Rate limits, server errors and transport errors are retried with backoff until the
+    first chunk has been yielded; after that a failure ends the stream with an error.
+    """
+    payload = {
+        "model": LLM,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    request_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+    started = False
+
+    try:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            retry_response = None
+            try:
+                async with _get_semaphore():
+                    async with _get_client().stream("POST", OPENROUTER_URL, json=payload, timeout=request_timeout) as response:
+                        if response.status_code == 429 or response.status_code >= 500:
+                            retry_response = response
+                        elif response.status_code >= 400:
+                            await response.aread()
+                            raise Exception(_extract_content(response.json()))
+                        else:
+                            async for line in response.aiter_lines():
+                                # Skip keep-alive comments and blank separators
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[len("data:"):].strip()
+                                if data == "[DONE]":
+                                    return
+                                text = _extract_delta(json.loads(data))
+                                if text:
+                                    started = True
+                                    yield text
+                            return
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if started or attempt == LLM_MAX_RETRIES:
+                    raise Exception(f"stream failed after {attempt + 1} attempts: {e!r}")
+
+            if retry_response is not None and attempt == LLM_MAX_RETRIES:
+                raise Exception(f"provider returned {retry_response.status_code} after {attempt + 1} attempts")
+
+            await asyncio.sleep(_backoff_delay(attempt, retry_response))
+
+    except Exception as e:
+        raise Exception(f"LLM call error: {e}")
@@ -0,0 +1,122 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Seconds an assessment stays servable from the cache
+ANALYZE_CACHE_TTL = float(os.getenv("ANALYZE_CACHE_TTL", "600"))
+
+# Assessments kept per worker before least-recently-used eviction
+ANALYZE_CACHE_MAX_ENTRIES = int(os.getenv("ANALYZE_CACHE_MAX_ENTRIES", "1000"))
+
+# Cosine similarity above which a different query reuses an assessment; 0 disables near-duplicate matching
+ANALYZE_CACHE_SIMILARITY = float(os.getenv("ANALYZE_CACHE_SIMILARITY", "0"))
+
+
+def normalize_query(query):
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+
+class ResponseCache:
+    """TTL + LRU cache of final assessments keyed by normalized query, vendor set and document-set version."""
+
+    def __init__(self, max_entries=ANALYZE_CACHE_MAX_ENTRIES, ttl_seconds=ANALYZE_CACHE_TTL,
+                 similarity_threshold=ANALYZE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _scope(vendor_ids, version):
+        return f"{','.join(sorted(set(vendor_ids)))}@{version}"
+
+    def _key(self, query, scope):
+        return hashlib.sha256(f"{normalize_query(query)}\0{scope}".encode("utf-8")).hexdigest()
+
+    def _live(self, key, entry, now):
+        if entry["expires_at"] > now:
+            return True
+        del self._entries[key]
+        return False
+
+    def get(self, query, vendor_ids, version, query_vector=None):
+        """Return (response, match) where match is "exact" or "semantic", or None on a miss."""
+        scope = self._scope(vendor_ids, version)
+        key = self._key(query, scope)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._live(key, entry, now):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["response"], "exact"
+
+            if query_vector is not None and self.similarity_threshold > 0:
+                query_vector = np.asarray(query_vector, dtype=np.float32)
+                best_key, best_score = None, self.similarity_threshold
+                for other_key, other in list(self._entries.items()):
+                    if other["scope"] != scope or other["vector"] is None or not self._live(other_key, other, now):
+                        continue
+                    score = float(np.dot(query_vector, other["vector"]) /
+                                  (np.linalg.norm(query_vector) * np.linalg.norm(other["vector"]) or 1.0))
+                    if score >= best_score:
+                        best_key, best_score = other_key, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                    return self._entries[best_key]["response"], "semantic"
+
+            self.misses += 1
+            return None
+
+    def put(self, query, vendor_ids, version, response, query_vector=None):
+        """Store an assessment."""
+        scope = self._scope(vendor_ids, version)
+        with self._lock:
+            key = self._key(query, scope)
+            self._entries[key] = {
+                "scope": scope,
+                "vendor_ids": set(vendor_ids),
+                "vector": np.asarray(query_vector, dtype=np.float32) if query_vector is not None else None,
+                "response": response,
+                "expires_at": time.monotonic() + self.ttl_seconds
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_vendors(self, vendor_ids):
+        """Drop entries covering any of the vendors, plus all-vendor entries."""
+        vendor_ids = set(vendor_ids)
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if not entry["vendor_ids"] or entry["vendor_ids"] & vendor_ids
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def stats(self):
+        """Hit/miss counters."""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "invalidated": self.invalidations,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else None
+        }
+
+
+analyze_response_cache = ResponseCache()
@@ -0,0 +1,88 @@
+import os
+import re
+import zlib
+from collections import Counter
+from qdrant_client.models import SparseVector, SparseVectorParams, Modifier
+
+# Store BM25 sparse vectors next to the dense vectors and fuse both at query time
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+
+# Name of the sparse vector in the Qdrant collection
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "bm25")
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Average chunk length in tokens (1000-character chunks run to roughly 160 tokens)
+BM25_AVG_DOC_LENGTH = float(os.getenv("BM25_AVG_DOC_LENGTH", "160"))
+
+# Identifiers such as ISO-27001, CERT/2023/114 or sanctions list entries stay whole tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have if in into is it its of on or that the their
+there these they this to was were will with what which who does do any our your
+""".split())
+
+
+# Collection name -> whether it has the sparse vector
+_sparse_collections = {}
+
+
+def tokenize(text):
+    """Lowercase word tokens; compound identifiers also yield their parts so 'ISO-27001' matches 'ISO 27001'."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            tokens.append(token)
+        tokens.extend(part for part in parts if part not in STOPWORDS)
+    return tokens
+
+
+def _token_index(token):
+    """Stable 32-bit index of a token (Python's hash() is salted per process)."""
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _sparse(weights):
+    indices = sorted(weights)
+    return SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+def sparse_document_vector(text):
+    """BM25 term weights of a chunk; Qdrant applies the IDF half at query time (Modifier.IDF)."""
+    tokens = tokenize(text)
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_LENGTH)
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        index = _token_index(token)
+        weights[index] = weights.get(index, 0.0) + tf * (BM25_K1 + 1) / (tf + length_norm)
+    return _sparse(weights)
+
+
+def sparse_query_vector(text):
+    """Query terms with unit weight; each matching document term contributes IDF * BM25 TF."""
+    return _sparse({_token_index(token): 1.0 for token in tokenize(text)})
+
+
+def sparse_vectors_config():
+    """Collection config for the BM25 sparse vector."""
+    return {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+
+
+def collection_has_sparse_vectors(qdrant_client, collection_name):
+    """Whether hybrid search is on and the collection was created with the BM25 sparse vector (cached per collection).
+
+    Qdrant cannot add a sparse vector to an existing collection, so older collections stay dense-only
+    until they are recreated with test.py and re-ingested.
+    """
+    if not HYBRID_SEARCH_ENABLED:
+        return False
+    if collection_name not in _sparse_collections:
+        info = qdrant_client.get_collection(collection_name)
+        _sparse_collections[collection_name] = SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+        if not _sparse_collections[collection_name]:
+            print(f"Warning: collection {collection_name} has no '{SPARSE_VECTOR_NAME}' sparse vector; using dense search only")
+    return _sparse_collections[collection_name]
@@ -0,0 +1,27 @@
+from server.connections import suppliers_collection, counters_collection
+from server.ingestion.utils.response_cache import analyze_response_cache
+
+GLOBAL_DOCUMENTS_VERSION = "documents_version"
+
+
+async def bump_documents_version(vendor_ids):
+    """Record that the searchable document set of these vendors changed."""
+    vendor_ids = list(vendor_ids)
+    if vendor_ids:
+        await suppliers_collection.update_many({"id": {"$in": vendor_ids}}, {"$inc": {"documents_version": 1}})
+    await counters_collection.update_one({"_id": GLOBAL_DOCUMENTS_VERSION}, {"$inc": {"value": 1}}, upsert=True)
+    analyze_response_cache.invalidate_vendors(vendor_ids)
+
+
+async def get_documents_version(vendor_ids):
+    """Version stamp of the document sets behind a vendor selection; an empty selection means all vendors."""
+    if not vendor_ids:
+        counter = await counters_collection.find_one({"_id": GLOBAL_DOCUMENTS_VERSION})
+        return f"all:{counter['value'] if counter else 0}"
+
+    suppliers = await suppliers_collection.find(
+        {"id": {"$in": list(vendor_ids)}},
+        {"id": 1, "documents_version": 1}
+    ).to_list(length=None)
+    versions = {supplier["id"]: supplier.get("documents_version", 0) for supplier in suppliers}
+    return ",".join(f"{vendor_id}:{versions.get(vendor_id, 0)}" for vendor_id in sorted(set(vendor_ids)))
@@ -0,0 +1,95 @@
+"""Background warm-up of the models and parsers the API loads lazily.
+
+Nothing heavy is loaded at import time, so a worker binds its port in well under
+a second. With WARMUP_ON_STARTUP the models are loaded right after startup in a
+worker thread, and /ready answers 503 until the required ones are in memory, so
+a rolling restart only routes traffic to a pod once its first request will not
+pay for loading them. Without warm-up, models load on first use and /ready
+reports ready straight away.
+"""
+import os
+import time
+import asyncio
+from starlette.concurrency import run_in_threadpool
+from server.ingestion.utils import get_embedding_backend, embedder_loaded
+from server.ingestion.rerank import load_reranker, reranker_loaded
+from server.ingestion.context import load_tokenizer, tokenizer_loaded
+
+# Load models in the background when the server starts
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+_parsers_loaded = False
+
+
+def _load_embedder():
+    # One forward pass so the first query does not pay for lazy initialisation either
+    get_embedding_backend().encode(["warm-up"], 1)
+
+
+def _load_parsers():
+    global _parsers_loaded
+    import PyPDF2  # noqa: F401
+    import mammoth  # noqa: F401
+    import langchain_text_splitters  # noqa: F401
+    _parsers_loaded = True
+
+
+# Name -> (load, loaded, required for readiness); optional components degrade instead of failing requests
+COMPONENTS = {
+    "embedder": (_load_embedder, embedder_loaded, True),
+    "reranker": (load_reranker, reranker_loaded, True),
+    "tokenizer": (load_tokenizer, tokenizer_loaded, True),
+    "parsers": (_load_parsers, lambda: _parsers_loaded, False)
+}
+
+_state = {"started_at": None, "finished_at": None, "errors": {}, "seconds": {}}
+
+# Keep a reference to the warm-up task so it is not garbage collected
+_task = None
+
+
+async def warm_up():
+    """Load every component in a worker thread, one after the other, recording errors and timings."""
+    _state["started_at"] = time.time()
+    for name, (load, _, _) in COMPONENTS.items():
+        started = time.perf_counter()
+        try:
+            await run_in_threadpool(load)
+        except Exception as e:
+            print(f"Warning: warm-up of {name} failed: {e}")
+            _state["errors"][name] = str(e)
+        _state["seconds"][name] = round(time.perf_counter() - started, 3)
+    _state["finished_at"] = time.time()
+    print(f"Warm-up finished in {_state['finished_at'] - _state['started_at']:.1f}s")
+
+
+def start_warmup():
+    """Start the background warm-up when WARMUP_ON_STARTUP is on."""
+    global _task
+    if WARMUP_ON_STARTUP and _task is None:
+        _task = asyncio.create_task(warm_up())
+    return _task
+
+
+def readiness():
+    """Readiness report: ready once every required component is loaded (always, without warm-up)."""
+    components = {
+        name: {
+            "loaded": loaded(),
+            "required": required,
+            "error": _state["errors"].get(name),
+            "seconds": _state["seconds"].get(name)
+        }
+        for name, (_, loaded, required) in COMPONENTS.items()
+    }
+    if WARMUP_ON_STARTUP:
+        ready = all(c["loaded"] for c in components.values() if c["required"])
+    else:
+        ready = True
+    return {
+        "ready": ready,
+        "warmup": "off" if not WARMUP_ON_STARTUP else
+                  "done" if _state["finished_at"] else
+                  "running" if _state["started_at"] else "pending",
+        "components": components
+    }
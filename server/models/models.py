@@ -10,6 +10,10 @@ class AnalyzeQuery(BaseModel):
     query: str
     vendor_ids: List[str]
 
+class AssessmentRunCreate(BaseModel):
+    queries: Optional[List[str]] = None       # defaults to the standard risk queries
+    supplier_ids: Optional[List[str]] = None  # defaults to all active suppliers
+
 class SupplierCreate(BaseModel):
     name: str
     category: str
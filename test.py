@@ -1,14 +1,18 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance
+from qdrant_client.models import SparseVectorParams, Modifier
+from server.connections.collection import ensure_collection
 
 client = QdrantClient(url="http://localhost:6333")
 
-client.create_collection(
-    collection_name="supplier_docs",
-    vectors_config=VectorParams(
-        size=384,            # embedding size for all-MiniLM-L6-v2
-        distance=Distance.COSINE
-    )
+# Creates the collection with the configured HNSW, quantization and on-disk settings,
+# or migrates an existing one, plus keyword indexes for vendor_id, document_id and content_hash
+report = ensure_collection(
+    client,
+    "supplier_docs",
+    384,                 # embedding size for all-MiniLM-L6-v2
+    sparse_vectors={
+        "bm25": SparseVectorParams(modifier=Modifier.IDF)   # BM25 term weights for hybrid search
+    }
 )
 
-print("Collection created!")
\ No newline at end of file
+print(f"Collection ready: {report}")
@@ -0,0 +1,118 @@
+"""Shared test setup.
+
+The server modules read their settings and bind their Mongo and Qdrant clients at import
+time, so the environment and the stand-ins (mongomock and an in-memory Qdrant) are
+installed here, before any test module imports them. Embeddings come from a small
+deterministic backend instead of the model.
+"""
+import os
+import sys
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+UPLOAD_DIR = tempfile.mkdtemp(prefix="supplier-uploads-")
+DIMENSION = 8
+
+os.environ["MODEL_PROVIDER_KEY"] = "test"
+os.environ["SUPPLIER_DOC_COLLECTION"] = "test_supplier_docs"
+os.environ["UPLOAD_DIR"] = UPLOAD_DIR
+os.environ["EMBED_DIMENSION"] = str(DIMENSION)
+os.environ["EMBED_CACHE_ENABLED"] = "false"
+os.environ["EMBED_SERVER_SOCKET"] = ""
+os.environ["WARMUP_ON_STARTUP"] = "false"
+os.environ["RECONCILE_INTERVAL_HOURS"] = "0"
+os.environ["RECONCILE_GRACE_MINUTES"] = "0"
+os.environ["QDRANT_QUANTIZATION"] = "none"
+os.environ["MAX_UPLOAD_SIZE_MB"] = "1"
+# The in-memory Qdrant is not safe to write from several threads at once
+os.environ["INGEST_CONCURRENCY"] = "1"
+
+from qdrant_client import QdrantClient
+from mongomock_motor import AsyncMongoMockClient
+import server.connections as connections
+
+connections.qdrant = QdrantClient(":memory:")
+connections.mongo_client = AsyncMongoMockClient()
+connections.database = connections.mongo_client["supply_chain_analyzer_test"]
+for _name, _collection in list(vars(connections).items()):
+    if _name.endswith("_collection"):
+        setattr(connections, _name, connections.database[_collection.name])
+
+from server.connections.collection import ensure_collection
+from server.ingestion.utils import sparse_vectors_config, embeddings
+from server.ingestion.utils.embedding_backends import EmbeddingBackend
+
+
+class HashBackend(EmbeddingBackend):
+    """Unit vectors derived from a hash of the text: equal texts embed equally, nothing is loaded."""
+
+    name = "hash"
+
+    def encode(self, texts, batch_size):
+        vectors = np.array([
+            np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:DIMENSION], dtype=np.uint8)
+            for text in texts
+        ], dtype=np.float32).reshape(len(texts), DIMENSION) + 1
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def dimension(self):
+        return DIMENSION
+
+
+@pytest.fixture
+def qdrant():
+    """The in-memory Qdrant with an empty supplier document collection."""
+    client = connections.qdrant
+    if client.collection_exists(connections.SUPPLIER_DOC_COLLECTION):
+        client.delete_collection(connections.SUPPLIER_DOC_COLLECTION)
+    ensure_collection(client, connections.SUPPLIER_DOC_COLLECTION, DIMENSION, sparse_vectors=sparse_vectors_config())
+    return client
+
+
+@pytest.fixture
+def mongo():
+    """The mongomock database, emptied."""
+    async def clear():
+        for name in await connections.database.list_collection_names():
+            await connections.database[name].delete_many({})
+    asyncio.run(clear())
+    return connections.database
+
+
+@pytest.fixture
+def upload_dir():
+    """UPLOAD_DIR, emptied."""
+    for entry in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, entry)
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    return UPLOAD_DIR
+
+
+@pytest.fixture
+def hash_embeddings(monkeypatch):
+    """Embed with HashBackend instead of the model; returns the backend."""
+    backend = HashBackend(embeddings.EMBED_MODEL)
+    monkeypatch.setattr(embeddings, "_backend", backend)
+    return backend
+
+
+@pytest.fixture
+def api(qdrant, mongo, upload_dir, hash_embeddings, monkeypatch):
+    """A test client of the API, started up against the emptied stores."""
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi.testclient import TestClient
+    from server.api.main import app
+    from server.ingestion import jobs
+
+    # Shutdown stops the ingestion workers, and each client runs its own event loop
+    monkeypatch.setattr(jobs, "_executor", ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest"))
+    monkeypatch.setattr(jobs, "_semaphore", None)
+
+    with TestClient(app) as client:
+        yield client
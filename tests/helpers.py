@@ -0,0 +1,69 @@
+"""Sample documents and API helpers shared by the tests."""
+import io
+import time
+import zipfile
+from xml.sax.saxutils import escape
+from server.connections import SUPPLIER_DOC_COLLECTION
+
+
+def make_docx(*paragraphs):
+    """A minimal DOCX with one paragraph per argument."""
+    body = "".join(f"<w:p><w:r><w:t>{escape(text)}</w:t></w:r></w:p>" for text in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as docx:
+        docx.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>'
+        )
+        docx.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+            'officeDocument" Target="word/document.xml"/></Relationships>'
+        )
+        docx.writestr(
+            "word/document.xml",
+            '<?xml version="1.0"?><w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f"<w:body>{body}</w:body></w:document>"
+        )
+    return buffer.getvalue()
+
+
+def create_supplier(api, name):
+    response = api.post("/api/suppliers", json={"name": name, "category": "Metals", "location": "Lyon"})
+    return response.json()["supplier"]["id"]
+
+
+def upload(api, supplier_id, filename, *paragraphs):
+    response = api.post(
+        f"/api/suppliers/{supplier_id}/documents",
+        files={"file": (filename, make_docx(*paragraphs), "application/octet-stream")}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def wait_for_jobs(api, job_ids, timeout=10):
+    deadline = time.monotonic() + timeout
+    pending = set(job_ids)
+    while pending and time.monotonic() < deadline:
+        for job_id in list(pending):
+            job = api.get(f"/api/ingestion/jobs/{job_id}").json()["job"]
+            assert job["status"] != "failed", job
+            if job["status"] == "done":
+                pending.discard(job_id)
+        time.sleep(0.05)
+    assert not pending, f"jobs still running: {pending}"
+
+
+def chunk_points(qdrant):
+    points, _ = qdrant.scroll(SUPPLIER_DOC_COLLECTION, limit=1000, with_payload=True)
+    return {
+        point.id: (tuple(point.payload["document_id"]), tuple(point.payload["vendor_id"]),
+                   point.payload.get("content_hash"))
+        for point in points
+    }
@@ -0,0 +1,82 @@
+import json
+import pytest
+from server.api.routes import rag
+from server.ingestion.analysis import NO_MATERIAL_RESPONSE
+from server.ingestion.utils.response_cache import ResponseCache
+
+PASSAGES = [
+    {"text": "Overdue payments to three creditors.", "sources": ["audit.docx (p. 2)"], "score": 0.91},
+    {"text": "Credit line cut by the bank.", "sources": ["bank.pdf", "memo.docx"], "score": 0.84}
+]
+
+
+def read_events(api, query="Financial distress?"):
+    """POST /analyze/stream and parse the SSE body into (event, data) pairs."""
+    response = api.post("/analyze/stream", json={"query": query, "vendor_ids": ["SUP-A"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def pipeline(api, monkeypatch):
+    """Retrieval returns PASSAGES and the LLM streams two tokens; returns the passages to serve."""
+    passages = list(PASSAGES)
+
+    async def retrieve_passages(user_query, vendor_ids):
+        return passages or None
+
+    async def stream_llm(messages, **kwargs):
+        for text in ("Risk level: High. ", "Payments overdue."):
+            yield text
+
+    monkeypatch.setattr(rag, "retrieve_passages", retrieve_passages)
+    monkeypatch.setattr(rag, "stream_llm", stream_llm)
+    monkeypatch.setattr(rag, "analyze_response_cache", ResponseCache(similarity_threshold=0))
+    return passages
+
+
+def test_evidence_then_tokens_then_result(api, pipeline):
+    events = read_events(api)
+    assert [event for event, _ in events] == ["evidence", "token", "token", "result"]
+
+    evidence = events[0][1]["evidence"]
+    assert evidence == [
+        {"source": "audit.docx (p. 2)", "score": 0.91},
+        {"source": "bank.pdf", "score": 0.84},
+        {"source": "memo.docx", "score": 0.84}
+    ]
+    assert "".join(data["text"] for event, data in events if event == "token") == "Risk level: High. Payments overdue."
+    result = events[-1][1]
+    assert result["summary"] == "Risk level: High. Payments overdue."
+    assert result["cache"] == {"hit": False, "match": None}
+
+
+def test_repeat_is_a_single_cached_result(api, pipeline):
+    streamed = read_events(api)[-1][1]
+    [(event, data)] = read_events(api)
+    assert event == "result" and data["cache"]["hit"]
+    assert {k: v for k, v in data.items() if k != "cache"} == {k: v for k, v in streamed.items() if k != "cache"}
+
+
+def test_no_material_skips_the_llm(api, pipeline):
+    pipeline.clear()
+    assert read_events(api) == [
+        ("evidence", {"evidence": []}),
+        ("result", {**NO_MATERIAL_RESPONSE, "cache": {"hit": False, "match": None}})
+    ]
+
+
+def test_llm_failure_ends_the_stream_with_an_error(api, pipeline, monkeypatch):
+    async def failing_stream(messages, **kwargs):
+        yield "Risk level"
+        raise Exception("stream failed after 1 attempts")
+
+    monkeypatch.setattr(rag, "stream_llm", failing_stream)
+    events = read_events(api)
+    assert [event for event, _ in events] == ["evidence", "token", "error"]
+    assert "stream failed" in events[-1][1]["detail"]
@@ -0,0 +1,104 @@
+import time
+import asyncio
+import pytest
+from server.connections import suppliers_collection
+from server.ingestion import assessment
+from server.ingestion.utils.response_cache import ResponseCache
+from helpers import create_supplier
+
+QUERIES = ["Signs of financial distress?", "Sanctions exposure?", "Single-source dependency?"]
+
+
+@pytest.fixture
+def assessor(monkeypatch):
+    """Stands in for SSR and the LLM: records calls and the most pairs in flight at once."""
+    state = {"calls": [], "in_flight": 0, "max_in_flight": 0, "fail": set()}
+
+    async def generate_ssr(user_query):
+        return "Hypothetical paragraph.", [0.1] * 8
+
+    async def assess_risk(user_query, vendor_ids, ssr_embedding=None):
+        state["calls"].append((vendor_ids[0], user_query))
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(0.01)
+            if (vendor_ids[0], user_query) in state["fail"]:
+                raise Exception("LLM error: provider timed out")
+            level = "High" if user_query == QUERIES[1] else "Low"
+            return {"risk_level": level, "evidence": ["audit.pdf"], "summary": f"{level} risk."}
+        finally:
+            state["in_flight"] -= 1
+
+    monkeypatch.setattr(assessment, "generate_ssr", generate_ssr)
+    monkeypatch.setattr(assessment, "assess_risk", assess_risk)
+    monkeypatch.setattr(assessment, "analyze_response_cache", ResponseCache())
+    monkeypatch.setattr(assessment, "ASSESSMENT_CONCURRENCY", 2)
+    return state
+
+
+def run_to_completion(api, body):
+    response = api.post("/api/assessments/runs", json=body)
+    assert response.status_code == 200, response.text
+    run_id = response.json()["run_id"]
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        run = api.get(f"/api/assessments/runs/{run_id}").json()
+        if run["status"] in ("done", "failed"):
+            return run
+        time.sleep(0.02)
+    raise AssertionError(f"assessment run {run_id} did not finish")
+
+
+def test_every_pair_is_assessed_by_a_bounded_pool_and_the_worst_level_is_written(api, assessor):
+    suppliers = [create_supplier(api, name) for name in ("Acme Castings", "Borealis Forge", "Cobalt Mining")]
+    run = run_to_completion(api, {"queries": QUERIES, "supplier_ids": suppliers})
+
+    assert (run["status"], run["completed"], run["failed"], run["suppliers_updated"]) == ("done", 9, 0, 3)
+    assert sorted(assessor["calls"]) == sorted((s, q) for s in suppliers for q in QUERIES)
+    assert assessor["max_in_flight"] == 2
+    levels = asyncio.run(suppliers_collection.find({"id": {"$in": suppliers}}, {"risk_level": 1}).to_list(length=None))
+    assert [supplier["risk_level"] for supplier in levels] == ["High"] * 3
+
+
+def test_a_failed_pair_is_isolated_and_only_it_is_redone_on_resume(api, assessor):
+    suppliers = [create_supplier(api, name) for name in ("Acme Castings", "Borealis Forge")]
+    assessor["fail"].add((suppliers[0], QUERIES[2]))
+    run = run_to_completion(api, {"queries": QUERIES, "supplier_ids": suppliers})
+    assert (run["status"], run["completed"], run["failed"], run["suppliers_updated"]) == ("done", 5, 1, 1)
+
+    results = api.get(f"/api/assessments/runs/{run['run_id']}/results").json()["results"]
+    failed = [r for r in results if r["error"]]
+    assert [(r["supplier_id"], r["query"]) for r in failed] == [(suppliers[0], QUERIES[2])]
+    assert "provider timed out" in failed[0]["error"]
+
+    assessor["fail"].clear()
+    assessor["calls"].clear()
+    assert api.post(f"/api/assessments/runs/{run['run_id']}/resume").status_code == 200
+    deadline = time.monotonic() + 10
+    while api.get(f"/api/assessments/runs/{run['run_id']}").json()["status"] != "done" \
+            and time.monotonic() < deadline:
+        time.sleep(0.02)
+    resumed = api.get(f"/api/assessments/runs/{run['run_id']}").json()
+    assert (resumed["completed"], resumed["failed"]) == (6, 0)
+    # Successful pairs keep their results; only the failed one is assessed again
+    assert assessor["calls"] == [(suppliers[0], QUERIES[2])]
+
+
+def test_repeated_runs_over_unchanged_documents_are_answered_from_the_cache(api, assessor):
+    supplier_id = create_supplier(api, "Acme Castings")
+    run_to_completion(api, {"queries": QUERIES, "supplier_ids": [supplier_id]})
+    assert len(assessor["calls"]) == len(QUERIES)
+
+    second = run_to_completion(api, {"queries": QUERIES, "supplier_ids": [supplier_id]})
+    assert (second["completed"], second["suppliers_updated"]) == (len(QUERIES), 1)
+    assert len(assessor["calls"]) == len(QUERIES)
+
+
+def test_runs_over_the_pair_limit_are_rejected(api, assessor, monkeypatch):
+    monkeypatch.setattr("server.api.routes.assessments.MAX_ASSESSMENT_PAIRS", 5)
+    suppliers = [create_supplier(api, name) for name in ("Acme Castings", "Borealis Forge")]
+    response = api.post("/api/assessments/runs", json={"queries": QUERIES, "supplier_ids": suppliers})
+    assert response.status_code == 400
+    assert "over the limit of 5" in response.json()["detail"]
+    assert assessor["calls"] == []
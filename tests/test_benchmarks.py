@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from benchmarks.fake_openrouter import FakeOpenRouter, SSR_ANSWER, ASSESSMENT_ANSWER
+from benchmarks.run import compare, summarize
+from server.ingestion.utils import llm
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """The benchmarks' OpenRouter stand-in, with the real LLM client pointed at it."""
+    fake = FakeOpenRouter(latency_ms=0, jitter_ms=0).start()
+    monkeypatch.setattr(llm, "OPENROUTER_URL", fake.url)
+    monkeypatch.setattr(llm, "_client", None)
+    monkeypatch.setattr(llm, "_semaphore", None)
+    yield fake
+    fake.stop()
+
+
+def test_summary_percentiles_are_in_milliseconds():
+    summary = summarize([0.001 * i for i in range(1, 101)])
+    assert summary["runs"] == 100
+    assert summary["min_ms"] == 1.0 and summary["max_ms"] == 100.0
+    assert summary["p50_ms"] == 50.5 and summary["p95_ms"] == pytest.approx(95.05)
+    assert summarize([]) == {"runs": 0}
+
+
+def test_compare_flags_only_regressions_beyond_the_tolerance():
+    baseline = {"benchmarks": {"chunking": {"p50_ms": 10.0, "p95_ms": 20.0}, "removed": {"p50_ms": 1.0}}}
+    results = {"benchmarks": {"chunking": {"p50_ms": 11.0, "p95_ms": 30.0}, "analyze": {"p50_ms": 5.0}}}
+    rows = compare(results, baseline, tolerance=0.2)
+    assert [(row["metric"], row["ratio"], row["regressed"]) for row in rows] == [
+        ("p50_ms", 1.1, False),
+        ("p95_ms", 1.5, True)
+    ]
+
+
+def test_llm_client_talks_to_the_fake_provider(fake_llm):
+    async def run():
+        ssr = await llm.call_llm([{"role": "user", "content": "Hypothetical Analysis of the supplier"}])
+        streamed = [chunk async for chunk in llm.stream_llm([{"role": "user", "content": "Assess the risk"}])]
+        await llm.close_llm_client()
+        return ssr, streamed
+
+    ssr, streamed = asyncio.run(run())
+    assert ssr == SSR_ANSWER
+    assert "".join(streamed).strip() == ASSESSMENT_ANSWER
+    assert fake_llm.stats()["requests"] == 2
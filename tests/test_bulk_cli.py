@@ -0,0 +1,118 @@
+import os
+import time
+import pytest
+from server.connections import SUPPLIER_DOC_COLLECTION
+from server.ingestion import bulk
+from helpers import make_docx, create_supplier, upload, wait_for_jobs, chunk_points
+
+
+def test_cli_reingests_api_uploads_in_place(api, qdrant):
+    supplier_id = create_supplier(api, "Acme Castings")
+    uploads = [
+        upload(api, supplier_id, "audit.docx", "Annual audit found no findings."),
+        upload(api, supplier_id, "iso.docx", "ISO 9001 certificate 12-345 valid until 2027.")
+    ]
+    wait_for_jobs(api, [u["job_id"] for u in uploads])
+    before = chunk_points(qdrant)
+    assert {doc_id for doc_ids, _, _ in before.values() for doc_id in doc_ids} == {u["document_id"] for u in uploads}
+
+    directory = os.path.join(os.environ["UPLOAD_DIR"], supplier_id)
+    assert bulk.main([directory, "--workers", "1"]) == 0
+
+    # Same points, ids and references: the CLI replaced the API's chunks instead of adding copies
+    assert chunk_points(qdrant) == before
+
+
+def test_cli_embeds_duplicate_uploads_once_with_all_references(api, qdrant, capsys):
+    first = create_supplier(api, "Acme Castings")
+    second = create_supplier(api, "Borealis Forge")
+    paragraphs = ("Shared sanctions screening report.", "No matches on the consolidated list.")
+    uploads = [upload(api, first, "screening.docx", *paragraphs), upload(api, second, "screening.docx", *paragraphs)]
+    wait_for_jobs(api, [u["job_id"] for u in uploads])
+    before = chunk_points(qdrant)
+
+    # The second upload reuses the stored file, so both logs point into the first supplier's directory
+    assert bulk.main([os.path.join(os.environ["UPLOAD_DIR"], first), "--workers", "1"]) == 0
+    assert "1 duplicates reused" in capsys.readouterr().out
+
+    after = chunk_points(qdrant)
+    assert after == before
+    for document_ids, vendor_ids, content_hash in after.values():
+        assert set(document_ids) == {u["document_id"] for u in uploads}
+        assert set(vendor_ids) == {first, second}
+        assert content_hash
+
+
+def test_cli_keep_existing_reuses_stored_content(api, qdrant, monkeypatch):
+    supplier_id = create_supplier(api, "Acme Castings")
+    uploaded = upload(api, supplier_id, "audit.docx", "Annual audit found no findings.")
+    wait_for_jobs(api, [uploaded["job_id"]])
+    before = chunk_points(qdrant)
+
+    def embed_texts(texts, *args):
+        raise AssertionError("stored content was embedded again")
+
+    monkeypatch.setattr(bulk, "embed_texts", embed_texts)
+    directory = os.path.join(os.environ["UPLOAD_DIR"], supplier_id)
+    assert bulk.main([directory, "--workers", "1", "--keep-existing"]) == 0
+    assert chunk_points(qdrant) == before
+
+
+def test_bulk_upload_job_records_stage_timings(api, qdrant):
+    supplier_id = create_supplier(api, "Acme Castings")
+    response = api.post(f"/api/suppliers/{supplier_id}/documents/bulk", files=[
+        ("files", ("audit.docx", make_docx("Annual audit found no findings."), "application/octet-stream")),
+        ("files", ("iso.docx", make_docx("ISO 9001 certificate 12-345."), "application/octet-stream"))
+    ])
+    assert response.status_code == 200, response.text
+    job_id = response.json()["job_id"]
+    wait_for_jobs(api, [job_id])
+
+    job = api.get(f"/api/ingestion/jobs/{job_id}").json()["job"]
+    assert "stages" not in job and "timings.stages" not in job
+    assert {"extract", "embed", "upsert"} <= set(job["timings"]["stages"])
+    assert job["timings"]["processing_seconds"] >= 0
+
+
+def test_bulk_result_reports_stages_under_a_plain_key(qdrant):
+    from server.ingestion.jobs import ingest_bulk_documents
+
+    result = ingest_bulk_documents([])
+    assert result["stages"] == {}
+    assert "timings.stages" not in result
+
+
+def test_failed_window_removes_the_windows_already_upserted(qdrant, upload_dir, hash_embeddings, monkeypatch):
+    documents = []
+    for name in ("audit.docx", "iso.docx", "policy.docx"):
+        path = os.path.join(upload_dir, name)
+        with open(path, "wb") as file:
+            file.write(make_docx(f"{name} clause on delivery terms. " * 60))
+        documents.append({"file_path": path, "document_id": name, "vendor_id": "SUP-A", "filename": name})
+
+    embed_texts = bulk.embed_texts
+    calls = []
+
+    def failing_embed_texts(texts):
+        calls.append(len(texts))
+        if len(calls) == 3:
+            raise RuntimeError("embedding backend went away")
+        return embed_texts(texts)
+
+    monkeypatch.setattr(bulk, "embed_texts", failing_embed_texts)
+    with pytest.raises(RuntimeError, match="went away"):
+        bulk.ingest_documents(documents, qdrant, SUPPLIER_DOC_COLLECTION, workers=1, window_size=2, log=lambda _: None)
+    assert len(calls) == 3
+    assert chunk_points(qdrant) == {}
+
+
+def test_timed_counts_only_the_wait_for_each_item():
+    def slow_items():
+        for item in range(2):
+            time.sleep(0.02)
+            yield item
+
+    timings = {"extract": 0.0}
+    for _ in bulk._timed(slow_items(), timings, "extract"):
+        time.sleep(0.1)
+    assert 0.04 <= timings["extract"] < 0.1
@@ -0,0 +1,86 @@
+import os
+import asyncio
+from qdrant_client.models import PointStruct
+from server.connections import SUPPLIER_DOC_COLLECTION, suppliers_collection, document_logs_collection
+from server.ingestion.cleanup import create_reconciliation_run, run_reconciliation
+from server.ingestion.utils import build_chunk_point, delete_vendor_chunks, embed_texts
+
+
+def store_chunks(qdrant, document, texts):
+    vectors = embed_texts(texts)
+    points = [build_chunk_point(i, None, text, vector, document) for i, (text, vector) in enumerate(zip(texts, vectors))]
+    qdrant.upsert(SUPPLIER_DOC_COLLECTION, points)
+    return [point.id for point in points]
+
+
+def point_ids(qdrant):
+    points, _ = qdrant.scroll(SUPPLIER_DOC_COLLECTION, limit=1000)
+    return {point.id for point in points}
+
+
+def reconcile(repair):
+    async def run():
+        created = await create_reconciliation_run(repair=repair)
+        return await run_reconciliation(created["run_id"])
+    return asyncio.run(run())
+
+
+def test_reconciler_deletes_unreferenced_content_but_leaves_unhashed_chunks(qdrant, mongo, upload_dir, hash_embeddings):
+    async def seed():
+        await suppliers_collection.insert_one({"id": "SUP-A", "name": "Acme", "document_count": 1})
+        await document_logs_collection.insert_one({
+            "file_id": "doc-live", "supplier_id": "SUP-A", "content_hash": "live-hash", "file_path": None
+        })
+    asyncio.run(seed())
+    live = store_chunks(qdrant, {
+        "document_id": "doc-live", "vendor_id": "SUP-A", "filename": "live.docx", "content_hash": "live-hash"
+    }, ["Live chunk one.", "Live chunk two."])
+    orphaned = store_chunks(qdrant, {
+        "document_id": "doc-gone", "vendor_id": "SUP-A", "filename": "gone.docx", "content_hash": "gone-hash"
+    }, ["Chunk of a deleted document."])
+    # Written without a content hash, under an id no document log has (e.g. an older CLI run)
+    vector = embed_texts(["Legacy chunk."])[0].tolist()
+    qdrant.upsert(SUPPLIER_DOC_COLLECTION, [PointStruct(id=7, vector={"": vector}, payload={
+        "text": "Legacy chunk.", "document_id": ["legacy-stem"], "vendor_id": ["SUP-A"]
+    })])
+
+    dry_run = reconcile(repair=False)["report"]
+    assert (dry_run["orphan_vectors"], dry_run["unhashed_vectors"]) == (1, 1)
+    assert point_ids(qdrant) == set(live) | set(orphaned) | {7}
+
+    result = reconcile(repair=True)
+    assert result["status"] == "done"
+    assert (result["report"]["orphan_vectors"], result["report"]["unhashed_vectors"]) == (1, 1)
+    assert point_ids(qdrant) == set(live) | {7}
+
+
+def test_delete_vendor_chunks_keeps_chunks_shared_with_other_vendors(qdrant, hash_embeddings):
+    own = store_chunks(qdrant, {
+        "document_id": "doc-a", "vendor_id": "SUP-A", "filename": "a.docx", "content_hash": "a-hash"
+    }, ["Only supplier A uploaded this."])
+    shared = store_chunks(qdrant, {
+        "document_id": "doc-a2", "vendor_id": "SUP-A", "filename": "s.docx", "content_hash": "shared-hash",
+        "document_ids": ["doc-a2", "doc-b"], "vendor_ids": ["SUP-A", "SUP-B"]
+    }, ["Both suppliers uploaded this."])
+
+    assert delete_vendor_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "SUP-A") == len(own)
+    assert point_ids(qdrant) == set(shared)
+
+
+def test_scheduled_runs_only_report_unless_repair_is_enabled(qdrant, mongo, upload_dir, monkeypatch):
+    from datetime import timedelta
+    from server.ingestion import cleanup
+
+    orphan = os.path.join(upload_dir, "SUP-GONE", "left-behind.pdf")
+    os.makedirs(os.path.dirname(orphan))
+    with open(orphan, "wb") as file:
+        file.write(b"%PDF-1.4 no document log points at this file")
+
+    result = asyncio.run(cleanup.run_scheduled_reconciliation(timedelta(0)))
+    assert result["repair"] is False and result["report"]["orphan_files"] == 1
+    assert os.path.exists(orphan)
+
+    monkeypatch.setattr(cleanup, "RECONCILE_REPAIR", True)
+    result = asyncio.run(cleanup.run_scheduled_reconciliation(timedelta(0)))
+    assert result["repair"] is True and result["report"]["orphan_files"] == 1
+    assert not os.path.exists(orphan)
@@ -0,0 +1,24 @@
+import pytest
+from server.connections import SUPPLIER_DOC_COLLECTION
+from server.connections.collection import ensure_collection
+from server.ingestion.utils import sparse_vectors_config
+
+
+def test_existing_collection_is_migrated_not_recreated(qdrant, hash_embeddings):
+    report = ensure_collection(
+        qdrant, SUPPLIER_DOC_COLLECTION, hash_embeddings.dimension(), sparse_vectors=sparse_vectors_config()
+    )
+    assert "created" not in report["changes"]
+
+
+def test_dimension_mismatch_fails_fast(qdrant, hash_embeddings):
+    with pytest.raises(ValueError, match="re-ingest"):
+        ensure_collection(qdrant, SUPPLIER_DOC_COLLECTION, hash_embeddings.dimension() * 2)
+
+
+def test_prepare_collection_creates_a_missing_collection(api, qdrant, hash_embeddings):
+    from server.api.main import prepare_collection
+
+    qdrant.delete_collection(SUPPLIER_DOC_COLLECTION)
+    prepare_collection()
+    assert qdrant.get_collection(SUPPLIER_DOC_COLLECTION).config.params.vectors.size == hash_embeddings.dimension()
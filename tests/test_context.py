@@ -0,0 +1,110 @@
+import re
+import pytest
+from server.ingestion import context
+from server.ingestion.context import pack_context, merge_overlapping, count_tokens, CONTEXT_SEPARATOR
+
+OVERLAP = "the supplier disclosed two late shipments in March"
+
+
+class WordEncoding:
+    """Stands in for the tiktoken encoding: one token per word with its trailing whitespace."""
+
+    def encode(self, text, disallowed_special=()):
+        return re.findall(r"\S+\s*|\s+", text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    """Count tokens without loading (or downloading) a real encoding."""
+    monkeypatch.setattr(context, "_encoding", WordEncoding())
+    monkeypatch.setattr(context, "_encoding_failed", False)
+
+
+def chunk(text, index, document="doc-1", chunk_hash=None):
+    return {"text": text, "chunk_index": index, "content_hash": f"hash-{document}", "document_id": [document],
+            "chunk_hash": chunk_hash or f"{document}:{index}"}
+
+
+def packed_tokens(passages):
+    return count_tokens(CONTEXT_SEPARATOR.join(passage["text"] for passage in passages))
+
+
+def test_merge_drops_the_splitter_overlap():
+    first = f"Audit summary: {OVERLAP}"
+    second = f"{OVERLAP} and one quality escape."
+    assert merge_overlapping(first, second) == f"Audit summary: {OVERLAP} and one quality escape."
+
+
+def test_merge_keeps_short_coincidental_overlaps():
+    assert merge_overlapping("Rated grade A", "A grade suppliers") == "Rated grade A\nA grade suppliers"
+
+
+def test_neighbouring_chunks_become_one_passage_ranked_by_their_best_chunk():
+    chunks = [
+        (chunk(f"{OVERLAP} and one quality escape.", 4), 0.9, "audit.pdf p.2"),
+        (chunk("Unrelated certificate listing.", 0, document="doc-2"), 0.8, "iso.pdf p.1"),
+        (chunk(f"Audit summary: {OVERLAP}", 3), 0.7, "audit.pdf p.1"),
+    ]
+    passages = pack_context(chunks, token_budget=1000)
+    assert [p["text"] for p in passages] == [
+        f"Audit summary: {OVERLAP} and one quality escape.",
+        "Unrelated certificate listing."
+    ]
+    # Sources follow the passage, in document order
+    assert passages[0]["sources"] == ["audit.pdf p.1", "audit.pdf p.2"]
+    assert passages[0]["score"] == 0.9
+
+
+def test_shared_and_contained_chunks_are_not_repeated():
+    chunks = [
+        (chunk("Sanctions screening found no matches on the consolidated list.", 0), 0.9, "a"),
+        (chunk("Sanctions screening found no matches on the consolidated list.", 0, document="doc-2",
+               chunk_hash="doc-1:0"), 0.85, "b"),
+        (chunk("no matches on the  consolidated list", 7, document="doc-3"), 0.8, "c"),
+    ]
+    passages = pack_context(chunks, token_budget=1000)
+    assert len(passages) == 1 and passages[0]["sources"] == ["a"]
+
+
+def test_packing_stays_within_the_budget_and_skips_chunks_that_do_not_fit():
+    long_text = "Lengthy financial statement narrative. " * 40
+    chunks = [
+        (chunk("Credit rating downgraded to BB.", 0), 0.9, "a"),
+        (chunk(long_text, 5, document="doc-2"), 0.8, "b"),
+        (chunk("Auditor raised a going concern note.", 9, document="doc-3"), 0.7, "c"),
+    ]
+    budget = count_tokens(long_text) // 2
+    passages = pack_context(chunks, token_budget=budget)
+    assert [p["sources"] for p in passages] == [["a"], ["c"]]
+    assert packed_tokens(passages) <= budget
+
+
+def test_an_oversized_best_chunk_is_truncated_rather_than_dropped():
+    text = "Factory fire halted production for six weeks. " * 30
+    passages = pack_context([(chunk(text, 0), 0.9, "a")], token_budget=20)
+    assert len(passages) == 1 and text.startswith(passages[0]["text"])
+    assert count_tokens(passages[0]["text"]) <= 20
+
+
+def test_an_encoding_that_cannot_be_loaded_falls_back_to_the_estimate(monkeypatch, capsys):
+    class OfflineTiktoken:
+        calls = 0
+
+        @classmethod
+        def get_encoding(cls, name):
+            cls.calls += 1
+            raise ConnectionError("no route to the BPE file")
+
+    monkeypatch.setattr(context, "tiktoken", OfflineTiktoken)
+    monkeypatch.setattr(context, "_encoding", None)
+    assert not context.tokenizer_loaded()
+
+    assert count_tokens("twelve chars") == 3
+    assert count_tokens("sixteen chars!!!") == 4
+    assert context.tokenizer_loaded()
+    # Warned and tried once, not on every count
+    assert OfflineTiktoken.calls == 1
+    assert capsys.readouterr().out.count("could not load tokenizer") == 1
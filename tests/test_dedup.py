@@ -0,0 +1,173 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from server.connections import SUPPLIER_DOC_COLLECTION, document_logs_collection, content_locks_collection
+from server.ingestion import jobs
+from server.ingestion.utils import (
+    chunk_and_embed_document,
+    count_content_chunks,
+    set_content_references,
+    release_content_chunks,
+    load_chunk_vectors,
+    set_document_chunk_total,
+    chunk_hash
+)
+from helpers import make_docx, create_supplier, upload, wait_for_jobs, chunk_points
+
+PARAGRAPHS = ["Supplier code of conduct signed in 2024.", "Quarterly audit found two minor findings."]
+
+
+def write_docx(directory, name, *paragraphs):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as file:
+        file.write(make_docx(*paragraphs))
+    return path
+
+
+def references(qdrant):
+    return {(document_ids, vendor_ids) for document_ids, vendor_ids, _ in chunk_points(qdrant).values()}
+
+
+def test_shared_chunks_live_until_the_last_reference_is_released(qdrant, upload_dir, hash_embeddings):
+    path = write_docx(upload_dir, "contract.docx", *PARAGRAPHS)
+    count, _ = chunk_and_embed_document(path, "doc-a", "SUP-A", "contract.docx", qdrant, SUPPLIER_DOC_COLLECTION,
+                                        content_hash="h1", references=(["doc-a"], ["SUP-A"]))
+    assert count_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "h1") == count
+
+    set_content_references(qdrant, SUPPLIER_DOC_COLLECTION, "h1", ["doc-a", "doc-b"], ["SUP-A", "SUP-B"])
+    assert references(qdrant) == {(("doc-a", "doc-b"), ("SUP-A", "SUP-B"))}
+
+    release_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "h1", ["doc-b"], ["SUP-B"])
+    assert references(qdrant) == {(("doc-b",), ("SUP-B",))}
+    assert count_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "h1") == count
+
+    release_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "h1", [], [])
+    assert count_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "h1") == 0
+
+
+def test_reingesting_identical_content_overwrites_in_place(qdrant, upload_dir, hash_embeddings):
+    path = write_docx(upload_dir, "contract.docx", *PARAGRAPHS)
+    for _ in range(2):
+        chunk_and_embed_document(path, "doc-a", "SUP-A", "contract.docx", qdrant, SUPPLIER_DOC_COLLECTION,
+                                 content_hash="h1")
+    assert len(chunk_points(qdrant)) == count_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "h1")
+
+
+def test_revision_embeds_only_changed_chunks(qdrant, upload_dir, hash_embeddings, monkeypatch):
+    # Paragraphs long enough to be chunked separately
+    unchanged = "Unchanged clause on delivery terms. " * 40
+    original = write_docx(upload_dir, "v1.docx", unchanged, "Original clause on penalties. " * 40)
+    chunk_and_embed_document(original, "doc-a", "SUP-A", "v1.docx", qdrant, SUPPLIER_DOC_COLLECTION, content_hash="v1")
+    reuse = load_chunk_vectors(qdrant, SUPPLIER_DOC_COLLECTION, "v1")
+
+    embedded = []
+    encode = hash_embeddings.encode
+
+    def recording_encode(texts, batch_size):
+        embedded.extend(texts)
+        return encode(texts, batch_size)
+
+    monkeypatch.setattr(hash_embeddings, "encode", recording_encode)
+    revised = write_docx(upload_dir, "v2.docx", unchanged, "Revised clause on penalties. " * 40)
+    count, _ = chunk_and_embed_document(revised, "doc-a", "SUP-A", "v2.docx", qdrant, SUPPLIER_DOC_COLLECTION,
+                                        content_hash="v2", reuse_vectors=reuse)
+
+    assert 0 < len(embedded) < count
+    assert not any(chunk_hash(text) in reuse for text in embedded)
+
+
+def test_only_complete_chunk_sets_are_reused(qdrant, upload_dir, hash_embeddings):
+    path = write_docx(upload_dir, "contract.docx", "Delivery terms. " * 200, "Penalty clauses. " * 200)
+    count, _ = chunk_and_embed_document(path, "doc-a", "SUP-A", "contract.docx", qdrant, SUPPLIER_DOC_COLLECTION,
+                                        content_hash="h1", references=(["doc-a"], ["SUP-A"]))
+    assert count > 1
+    assert jobs._reuse_existing_content("h1", (["doc-a", "doc-b"], ["SUP-A", "SUP-B"]))["chunk_count"] == count
+
+    # Windows upserted before the total was recorded
+    qdrant.delete_payload(SUPPLIER_DOC_COLLECTION, keys=["total_chunks"], points=list(chunk_points(qdrant)))
+    assert jobs._reuse_existing_content("h1", (["doc-b"], ["SUP-B"])) is None
+
+    # Fewer chunks than the recorded total
+    set_document_chunk_total(qdrant, SUPPLIER_DOC_COLLECTION, "doc-a", count)
+    qdrant.delete(SUPPLIER_DOC_COLLECTION, points_selector=[next(iter(chunk_points(qdrant)))])
+    assert jobs._reuse_existing_content("h1", (["doc-b"], ["SUP-B"])) is None
+
+
+def test_duplicate_uploads_share_chunks_until_both_are_deleted(api, qdrant):
+    first = create_supplier(api, "Acme Castings")
+    second = create_supplier(api, "Borealis Forge")
+    uploads = [upload(api, first, "coc.docx", *PARAGRAPHS), upload(api, second, "coc.docx", *PARAGRAPHS)]
+    wait_for_jobs(api, [u["job_id"] for u in uploads])
+    stored = chunk_points(qdrant)
+    assert references(qdrant) == {(
+        tuple(sorted(u["document_id"] for u in uploads)), tuple(sorted([first, second]))
+    )}
+    assert api.get(f"/api/ingestion/jobs/{uploads[1]['job_id']}").json()["job"]["deduplicated"]
+
+    assert api.delete(f"/api/suppliers/{first}/documents/{uploads[0]['document_id']}").status_code == 200
+    assert set(chunk_points(qdrant)) == set(stored)
+    assert references(qdrant) == {((uploads[1]["document_id"],), (second,))}
+    assert os.path.exists(uploads[1]["file_path"])
+
+    assert api.delete(f"/api/suppliers/{second}/documents/{uploads[1]['document_id']}").status_code == 200
+    assert chunk_points(qdrant) == {}
+    assert not os.path.exists(uploads[1]["file_path"])
+
+
+def test_content_lock_admits_one_job_at_a_time_and_takes_over_lapsed_leases(mongo, monkeypatch):
+    monkeypatch.setattr(jobs, "CONTENT_LOCK_POLL_SECONDS", 0.01)
+    events = []
+
+    async def job(name):
+        async with jobs.content_locks(["h1"], name):
+            events.append(f"{name} in")
+            await asyncio.sleep(0.05)
+            events.append(f"{name} out")
+
+    async def run():
+        await asyncio.gather(job("a"), job("b"))
+        # Left behind by a worker that died holding it
+        await content_locks_collection.insert_one(
+            {"_id": "h1", "owner": "crashed", "expires_at": datetime.utcnow() - timedelta(seconds=1)}
+        )
+        await asyncio.wait_for(job("c"), timeout=2)
+        return await content_locks_collection.count_documents({})
+
+    assert asyncio.run(run()) == 0
+    assert events == ["a in", "a out", "b in", "b out", "c in", "c out"]
+
+
+def test_concurrent_jobs_for_the_same_bytes_embed_once_and_reference_every_upload(
+        qdrant, mongo, upload_dir, hash_embeddings, monkeypatch):
+    path = write_docx(upload_dir, "coc.docx", *PARAGRAPHS)
+    monkeypatch.setattr(jobs, "CONTENT_LOCK_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(jobs, "INGEST_CONCURRENCY", 2)
+    monkeypatch.setattr(jobs, "_semaphore", None)
+    monkeypatch.setattr(jobs, "_executor", ThreadPoolExecutor(max_workers=2, thread_name_prefix="ingest"))
+
+    embedded = []
+    encode = hash_embeddings.encode
+
+    def recording_encode(texts, batch_size):
+        embedded.extend(texts)
+        return encode(texts, batch_size)
+
+    monkeypatch.setattr(hash_embeddings, "encode", recording_encode)
+
+    async def run():
+        submitted = []
+        for document_id, vendor_id in (("doc-a", "SUP-A"), ("doc-b", "SUP-B")):
+            await document_logs_collection.insert_one(
+                {"file_id": document_id, "supplier_id": vendor_id, "content_hash": "h1", "file_path": path}
+            )
+            submitted.append(await jobs.submit_ingestion_job(path, document_id, vendor_id, "coc.docx", "h1"))
+        await asyncio.gather(*list(jobs._tasks))
+        return [await jobs.get_ingestion_job(job["job_id"]) for job in submitted]
+
+    finished = asyncio.run(run())
+    assert [job["status"] for job in finished] == ["done", "done"]
+    assert sorted(job["deduplicated"] for job in finished) == [False, True]
+    assert len(embedded) == count_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "h1")
+    # The first job was queued before the second upload was logged, and still references it
+    assert references(qdrant) == {(("doc-a", "doc-b"), ("SUP-A", "SUP-B"))}
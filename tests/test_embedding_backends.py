@@ -0,0 +1,91 @@
+import os
+import json
+import numpy as np
+import pytest
+from server.ingestion.utils.embedding_backends import (
+    ONNX_EXPORT_FILE,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_MODEL_FILE,
+    PARITY_TEXTS,
+    EmbeddingBackend,
+    OnnxBackend,
+    check_parity
+)
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+tokenizers = pytest.importorskip("tokenizers")
+
+MODEL = "stub-model"
+WORDS = sorted({word for text in PARITY_TEXTS for word in text.lower().split()})
+TABLE = np.random.default_rng(7).normal(size=(len(WORDS) + 1, 4)).astype(np.float32)
+
+
+def stub_tokenizer():
+    """Lowercased whitespace tokens over the parity vocabulary; id 0 is unknown."""
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+    tokenizer = Tokenizer(models.WordLevel({"[UNK]": 0, **{w: i + 1 for i, w in enumerate(WORDS)}}, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    return tokenizer
+
+
+class TableBackend(EmbeddingBackend):
+    """The stub model in numpy: mean of each token's row of TABLE, unit length."""
+
+    name = "table"
+
+    def __init__(self, table=TABLE):
+        super().__init__(MODEL)
+        self.table = table
+        self.tokenizer = stub_tokenizer()
+        # The long parity text is cut where the export's max_seq_length cuts it
+        self.tokenizer.enable_truncation(max_length=256)
+
+    def encode(self, texts, batch_size):
+        vectors = np.array([self.table[encoding.ids].mean(axis=0) for encoding in self.tokenizer.encode_batch(texts)])
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def onnx_export(tmp_path):
+    """An export directory whose model.onnx looks each token's row up in TABLE."""
+    from onnx import TensorProto, helper, numpy_helper
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "stub",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "sequence"])
+        ],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", 4])],
+        [numpy_helper.from_array(TABLE, "table")]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 14)])
+    model.ir_version = 8
+    onnx.save(model, str(tmp_path / ONNX_MODEL_FILE))
+    stub_tokenizer().save(str(tmp_path / "tokenizer.json"))
+    with open(tmp_path / ONNX_EXPORT_FILE, "w", encoding="utf-8") as file:
+        json.dump({"model": MODEL, "max_seq_length": 256, "dimension": 4, "normalize": True, "pooling": "mean"}, file)
+    return str(tmp_path)
+
+
+def test_onnx_backend_matches_the_reference(onnx_export):
+    backend = OnnxBackend(MODEL, model_dir=onnx_export, quantize=False)
+    result = check_parity(backend, TableBackend(), batch_size=3)
+    assert result["passed"], result
+    assert result["min_cosine"] > 0.9999
+
+
+def test_parity_fails_for_diverging_vectors(onnx_export):
+    backend = OnnxBackend(MODEL, model_dir=onnx_export, quantize=False)
+    shuffled = TableBackend(np.random.default_rng(8).permutation(TABLE))
+    result = check_parity(backend, shuffled)
+    assert not result["passed"]
+    assert result["min_cosine"] < result["threshold"]
+
+
+def test_missing_int8_model_is_not_quantized_on_load(onnx_export):
+    with pytest.raises(Exception, match="rerun python -m server.ingestion.utils.embedding_backends export"):
+        OnnxBackend(MODEL, model_dir=onnx_export, quantize=True)
+    assert not os.path.exists(os.path.join(onnx_export, ONNX_QUANTIZED_MODEL_FILE))
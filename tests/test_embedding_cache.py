@@ -0,0 +1,36 @@
+import os
+import numpy as np
+from server.ingestion.utils.embedding_cache import EmbeddingCache
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def test_the_sqlite_tier_is_opened_on_first_use_and_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache" / "embeddings.sqlite3")
+    cache = EmbeddingCache(MODEL, backend="torch", path=path)
+    assert not os.path.exists(path)
+
+    cache.put_many(["Supplier  code of\nconduct"], [np.ones(4)])
+    assert os.path.exists(path)
+
+    fresh = EmbeddingCache(MODEL, backend="torch", path=path)
+    # Whitespace is normalized before hashing
+    [vector] = fresh.get_many(["Supplier code of conduct"])
+    assert np.array_equal(vector, np.ones(4, dtype=np.float32))
+    assert (fresh.stats()["disk_hits"], fresh.stats()["misses"]) == (1, 0)
+
+
+def test_backend_quantization_and_max_length_each_get_their_own_entries(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingCache(MODEL, backend="torch", path=path).put_many(["Late shipments"], [np.ones(4)])
+
+    variants = [
+        EmbeddingCache(MODEL, backend="onnx", quantized=True, path=path),
+        EmbeddingCache(MODEL, backend="onnx", quantized=False, path=path),
+        EmbeddingCache(MODEL, backend="torch", max_seq_length=128, path=path),
+        EmbeddingCache("another/model", backend="torch", path=path)
+    ]
+    assert len({cache.key("Late shipments") for cache in variants}) == len(variants)
+    for cache in variants:
+        assert cache.get_many(["Late shipments"]) == [None]
+    assert EmbeddingCache(MODEL, backend="torch", path=path).get_many(["Late shipments"])[0] is not None
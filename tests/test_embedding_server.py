@@ -0,0 +1,115 @@
+import asyncio
+import numpy as np
+import pytest
+from server.ingestion.utils.embedding_backends import EmbeddingBackend
+from server.ingestion.utils.embedding_server import MicroBatcher, EmbeddingServerClient
+
+
+class RecordingBackend(EmbeddingBackend):
+    """Embeds "t<n>" as [n, n] and records every batch it is given."""
+
+    name = "recording"
+
+    def __init__(self, fail_on=None):
+        super().__init__("recording")
+        self.batches = []
+        self.fail_on = fail_on
+
+    def encode(self, texts, batch_size):
+        self.batches.append(list(texts))
+        if self.fail_on in texts:
+            raise RuntimeError("encoder crashed")
+        return np.array([[float(text[1:])] * 2 for text in texts], dtype=np.float32)
+
+    def dimension(self):
+        return 2
+
+
+def texts(start, count):
+    return [f"t{i}" for i in range(start, start + count)]
+
+
+async def run_batcher(batcher, requests, delay=0.0):
+    """Send requests (lists of texts) concurrently, delay seconds apart; returns their results."""
+    worker = asyncio.create_task(batcher.run())
+
+    async def send(i, request):
+        await asyncio.sleep(i * delay)
+        return await batcher.embed(request)
+
+    try:
+        return await asyncio.wait_for(
+            asyncio.gather(*(send(i, r) for i, r in enumerate(requests)), return_exceptions=True), 5
+        )
+    finally:
+        worker.cancel()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_coalesced_in_arrival_order():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch=64, max_wait_ms=50)
+    requests = [texts(0, 3), texts(3, 1), texts(4, 5)]
+    results = await run_batcher(batcher, requests)
+
+    assert backend.batches == [texts(0, 9)]
+    for request, vectors in zip(requests, results):
+        assert vectors[:, 0].tolist() == [float(text[1:]) for text in request]
+    stats = batcher.stats()
+    assert (stats["requests"], stats["batches"], stats["texts"], stats["queue_depth"]) == (3, 1, 9, 0)
+    assert stats["batch_sizes"]["16"] == 1
+
+
+@pytest.mark.asyncio
+async def test_a_full_batch_runs_without_waiting_out_the_window():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch=4, max_wait_ms=60_000)
+    results = await run_batcher(batcher, [texts(0, 2), texts(2, 2)])
+    assert backend.batches == [texts(0, 4)]
+    assert [r.shape for r in results] == [(2, 2), (2, 2)]
+
+
+@pytest.mark.asyncio
+async def test_requests_are_never_split_and_overflow_to_the_next_batch():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch=4, max_wait_ms=20)
+    results = await run_batcher(batcher, [texts(0, 3), texts(3, 6), texts(9, 1)])
+
+    # The oversized request is a batch of its own; order is kept across batches
+    assert backend.batches == [texts(0, 3), texts(3, 6), texts(9, 1)]
+    assert [r[:, 0].tolist() for r in results] == [[0, 1, 2], [3, 4, 5, 6, 7, 8], [9]]
+
+
+@pytest.mark.asyncio
+async def test_a_lone_request_is_flushed_when_the_window_closes():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch=64, max_wait_ms=20)
+    (result,) = await run_batcher(batcher, [texts(7, 1)])
+    assert result.tolist() == [[7.0, 7.0]]
+    assert batcher.stats()["mean_wait_ms"] >= 15
+
+
+@pytest.mark.asyncio
+async def test_a_failed_batch_fails_its_requests_and_the_batcher_carries_on():
+    backend = RecordingBackend(fail_on="t1")
+    batcher = MicroBatcher(backend, max_batch=2, max_wait_ms=5)
+    results = await run_batcher(batcher, [texts(0, 2), texts(2, 2)], delay=0.05)
+
+    assert isinstance(results[0], RuntimeError)
+    assert results[1][:, 0].tolist() == [2.0, 3.0]
+    assert batcher.stats()["failed_batches"] == 1
+
+
+def test_client_rejects_a_server_embedding_with_other_settings():
+    variant = {"backend": "onnx", "quantized": True, "max_seq_length": None}
+    server_info = {"ok": True, "model": "recording", "backend": "onnx", "quantized": False, "max_seq_length": None,
+                   "dimension": 2, "max_batch": 64}
+
+    def client(variant):
+        client = EmbeddingServerClient("recording", "/nonexistent.sock", variant=variant)
+        client._request = lambda request: (dict(server_info), None)
+        return client
+
+    with pytest.raises(ValueError, match="quantized=False, not quantized=True"):
+        client(variant).info()
+    assert client({**variant, "quantized": False}).info()["dimension"] == 2
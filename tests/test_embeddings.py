@@ -0,0 +1,62 @@
+import os
+import numpy as np
+from server.connections import SUPPLIER_DOC_COLLECTION
+from server.ingestion.utils import chunk_and_embed_document, embeddings
+from server.ingestion.utils.embeddings import embed_texts, embed_query, iter_embedded_windows
+from helpers import make_docx
+
+CLAUSE = "Clause on delivery terms and penalties for late shipments. "
+
+
+def record_batches(backend, monkeypatch):
+    calls = []
+    encode = backend.encode
+
+    def recording_encode(texts, batch_size):
+        calls.append((list(texts), batch_size))
+        return encode(texts, batch_size)
+
+    monkeypatch.setattr(backend, "encode", recording_encode)
+    return calls
+
+
+def test_texts_are_encoded_in_one_call_in_input_order(hash_embeddings, monkeypatch):
+    calls = record_batches(hash_embeddings, monkeypatch)
+    texts = ["first\nline", "second", "third"]
+    vectors = embed_texts(texts, batch_size=2)
+
+    assert calls == [(["first line", "second", "third"], 2)]
+    assert vectors.dtype == np.float32 and vectors.shape == (3, hash_embeddings.dimension())
+    assert np.allclose(vectors[1], embed_query("second"))
+
+
+def test_windows_bound_each_encode_call(hash_embeddings, monkeypatch):
+    calls = record_batches(hash_embeddings, monkeypatch)
+    items = [(i, f"text {i}") for i in range(5)]
+    windows = list(iter_embedded_windows(items, window_size=2, batch_size=8))
+
+    assert [window for window, _ in windows] == [items[0:2], items[2:4], items[4:]]
+    assert [len(texts) for texts, _ in calls] == [2, 2, 1]
+    for window, vectors in windows:
+        assert np.allclose(vectors, embed_texts([text for _, text in window]))
+
+
+def test_known_vectors_are_not_embedded_again(hash_embeddings, monkeypatch):
+    known = {"text 1": np.full(hash_embeddings.dimension(), 0.5, dtype=np.float32)}
+    calls = record_batches(hash_embeddings, monkeypatch)
+    items = [(i, f"text {i}") for i in range(3)]
+    [(_, vectors)] = iter_embedded_windows(items, window_size=10, known=known, key=lambda text: text)
+
+    assert calls == [(["text 0", "text 2"], embeddings.EMBED_BATCH_SIZE)]
+    assert np.allclose(vectors[1], known["text 1"])
+
+
+def test_document_chunks_are_embedded_per_window_not_per_chunk(qdrant, upload_dir, hash_embeddings, monkeypatch):
+    calls = record_batches(hash_embeddings, monkeypatch)
+    path = os.path.join(upload_dir, "terms.docx")
+    with open(path, "wb") as file:
+        file.write(make_docx(*[CLAUSE * 20] * 4))
+
+    chunk_count, _ = chunk_and_embed_document(path, "DOC-1", "SUP-A", "terms.docx", qdrant, SUPPLIER_DOC_COLLECTION)
+    assert chunk_count > 1
+    assert len(calls) == 1 and len(calls[0][0]) == chunk_count
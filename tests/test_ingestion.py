@@ -0,0 +1,56 @@
+import os
+import functools
+import pytest
+from server.connections import SUPPLIER_DOC_COLLECTION
+from server.ingestion import utils
+from server.ingestion.extraction import iter_text_from_file, _iter_text_sections
+from server.ingestion.utils import chunk_and_embed_document, count_content_chunks
+from helpers import make_docx, chunk_points
+
+CLAUSE = "Clause on delivery terms and penalties for late shipments. "
+
+
+def write_docx(directory, name, *paragraphs):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as file:
+        file.write(make_docx(*paragraphs))
+    return path
+
+
+def test_text_is_streamed_in_sections_that_close_on_blank_lines():
+    lines = [f"Paragraph {i} line.\n" for i in range(6)]
+    text = "".join(lines[:3]) + "\n" + "".join(lines[3:]) + "\n"
+    sections = list(_iter_text_sections(iter(text.splitlines(keepends=True)), section_size=40))
+    assert sections == ["".join(lines[:3]) + "\n", "".join(lines[3:]) + "\n"]
+    assert "".join(sections) == text
+
+
+def test_docx_sections_are_yielded_lazily_without_page_numbers(upload_dir):
+    path = write_docx(upload_dir, "terms.docx", *[CLAUSE * 5] * 3)
+    sections = iter_text_from_file(path)
+    page_number, text = next(sections)
+    assert page_number is None and CLAUSE in text
+
+
+def test_a_failure_partway_removes_the_chunks_already_upserted(qdrant, upload_dir, hash_embeddings, monkeypatch):
+    # One chunk per window, and the model fails on the third
+    monkeypatch.setattr(utils, "iter_embedded_windows",
+                        functools.partial(utils.iter_embedded_windows, window_size=1))
+    encode = hash_embeddings.encode
+    calls = []
+
+    def failing_encode(texts, batch_size):
+        calls.append(texts)
+        if len(calls) == 3:
+            raise RuntimeError("CUDA out of memory")
+        return encode(texts, batch_size)
+
+    monkeypatch.setattr(hash_embeddings, "encode", failing_encode)
+    path = write_docx(upload_dir, "terms.docx", *[CLAUSE * 20] * 4)
+
+    with pytest.raises(Exception, match="CUDA out of memory"):
+        chunk_and_embed_document(path, "doc-a", "SUP-A", "terms.docx", qdrant, SUPPLIER_DOC_COLLECTION,
+                                 content_hash="h1")
+    assert len(calls) == 3
+    assert count_content_chunks(qdrant, SUPPLIER_DOC_COLLECTION, "h1") == 0
+    assert chunk_points(qdrant) == {}
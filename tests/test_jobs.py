@@ -0,0 +1,167 @@
+import os
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from server.connections import document_logs_collection, ingestion_jobs_collection, suppliers_collection
+from server.ingestion import jobs
+from helpers import make_docx, create_supplier, upload, wait_for_jobs
+
+
+def job_status(api, job_id):
+    return api.get(f"/api/ingestion/jobs/{job_id}").json()["job"]
+
+
+def wait_for_status(api, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job_status(api, job_id)["status"] != status:
+        assert time.monotonic() < deadline, f"job {job_id} never became {status}"
+        time.sleep(0.02)
+
+
+def ingestion_status(document_id):
+    log = asyncio.run(document_logs_collection.find_one({"file_id": document_id}))
+    return log["ingestion_status"]
+
+
+def test_job_goes_from_queued_to_running_to_done(api, monkeypatch):
+    release = threading.Event()
+    ingest = jobs.chunk_and_embed_document
+
+    def blocking_ingest(*args, **kwargs):
+        release.wait(5)
+        return ingest(*args, **kwargs)
+
+    monkeypatch.setattr(jobs, "chunk_and_embed_document", blocking_ingest)
+    supplier_id = create_supplier(api, "Acme Castings")
+
+    # One worker: the first job holds it, so the second waits in the queue
+    first = upload(api, supplier_id, "audit.docx", "Annual audit found no findings.")
+    wait_for_status(api, first["job_id"], "running")
+    second = upload(api, supplier_id, "iso.docx", "ISO 9001 certificate 12-345.")
+    assert first["ingestion_status"] == second["ingestion_status"] == "queued"
+    time.sleep(0.1)
+    assert job_status(api, second["job_id"])["status"] == "queued"
+    assert ingestion_status(first["document_id"]) == "running"
+    assert ingestion_status(second["document_id"]) == "queued"
+
+    release.set()
+    wait_for_jobs(api, [first["job_id"], second["job_id"]])
+    for uploaded in (first, second):
+        job = job_status(api, uploaded["job_id"])
+        assert job["chunk_count"] > 0 and job["error"] is None
+        assert job["started_at"] and job["finished_at"]
+        assert job["timings"]["queue_seconds"] >= 0 and job["timings"]["processing_seconds"] >= 0
+        assert ingestion_status(uploaded["document_id"]) == "done"
+    assert job_status(api, second["job_id"])["timings"]["queue_seconds"] >= 0.1
+
+
+def test_failed_job_records_its_error(api, monkeypatch):
+    def failing_ingest(*args, **kwargs):
+        raise Exception("Error processing document: unreadable")
+
+    monkeypatch.setattr(jobs, "chunk_and_embed_document", failing_ingest)
+    supplier_id = create_supplier(api, "Acme Castings")
+    uploaded = upload(api, supplier_id, "audit.docx", "Annual audit found no findings.")
+    wait_for_status(api, uploaded["job_id"], "failed")
+
+    job = job_status(api, uploaded["job_id"])
+    assert job["error"] == "Error processing document: unreadable"
+    assert job["finished_at"] and job["timings"]["processing_seconds"] >= 0
+    assert ingestion_status(uploaded["document_id"]) == "failed"
+
+
+@pytest.fixture
+def start_api(qdrant, mongo, upload_dir, hash_embeddings, monkeypatch):
+    """Start a test client of the API later in the test, after stale state has been set up."""
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi.testclient import TestClient
+    from server.api.main import app
+
+    def start():
+        # Each start is a new process as far as the worker pool goes: shutdown stops the previous one
+        monkeypatch.setattr(jobs, "_executor", ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest"))
+        monkeypatch.setattr(jobs, "_semaphore", None)
+        return TestClient(app)
+    return start
+
+
+def stale_job(upload_dir, status, attempts=0):
+    """A job and its document as a worker that crashed left them: lease expired, never finished."""
+    path = os.path.join(upload_dir, "audit.docx")
+    with open(path, "wb") as file:
+        file.write(make_docx("Annual audit found no findings."))
+
+    async def insert():
+        await suppliers_collection.insert_one({"id": "SUP-A", "name": "Acme Castings", "document_count": 1})
+        await document_logs_collection.insert_one({
+            "file_id": "DOC-1", "supplier_id": "SUP-A", "filename": "audit.docx", "file_path": path,
+            "file_extension": ".docx", "content_hash": "c" * 64, "ingestion_status": status
+        })
+        job = jobs._new_job("SUP-A", kind="document", document_id="DOC-1", filename="audit.docx", file_path=path)
+        job.update(status=status, attempts=attempts, owner="crashed-worker",
+                   lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        await ingestion_jobs_collection.insert_one(job)
+        return job["job_id"]
+
+    return asyncio.run(insert())
+
+
+@pytest.mark.parametrize("status", ["queued", "running"])
+def test_startup_resumes_jobs_a_stopped_worker_left(start_api, upload_dir, status):
+    job_id = stale_job(upload_dir, status, attempts=1 if status == "running" else 0)
+    with start_api() as api:
+        wait_for_jobs(api, [job_id])
+        job = job_status(api, job_id)
+    assert job["chunk_count"] > 0
+    assert job["owner"] == jobs.WORKER_ID
+    assert ingestion_status("DOC-1") == "done"
+
+
+def test_job_interrupted_too_often_is_failed(start_api, upload_dir):
+    job_id = stale_job(upload_dir, "running", attempts=jobs.INGEST_MAX_ATTEMPTS)
+    with start_api() as api:
+        job = job_status(api, job_id)
+    assert job["status"] == "failed" and "Interrupted" in job["error"]
+    assert ingestion_status("DOC-1") == "failed"
+
+
+def test_jobs_with_a_live_lease_are_left_to_their_worker(start_api, upload_dir):
+    job_id = stale_job(upload_dir, "queued")
+    future = datetime.utcnow() + timedelta(minutes=5)
+    asyncio.run(ingestion_jobs_collection.update_one({"job_id": job_id}, {"$set": {"lease_expires_at": future}}))
+    with start_api() as api:
+        assert job_status(api, job_id)["status"] == "queued"
+        assert job_status(api, job_id)["owner"] == "crashed-worker"
+
+
+def test_shutdown_finishes_running_jobs_and_releases_queued_ones(start_api, monkeypatch):
+    release = threading.Event()
+    ingest = jobs.chunk_and_embed_document
+
+    def blocking_ingest(*args, **kwargs):
+        release.wait(5)
+        return ingest(*args, **kwargs)
+
+    monkeypatch.setattr(jobs, "chunk_and_embed_document", blocking_ingest)
+    with start_api() as api:
+        supplier_id = create_supplier(api, "Acme Castings")
+        running = upload(api, supplier_id, "audit.docx", "Annual audit found no findings.")
+        wait_for_status(api, running["job_id"], "running")
+        queued = upload(api, supplier_id, "iso.docx", "ISO 9001 certificate 12-345.")
+        # Shutdown waits for the running job, which finishes once released
+        threading.Timer(0.2, release.set).start()
+
+    async def records():
+        return {job["job_id"]: job async for job in ingestion_jobs_collection.find({})}
+
+    jobs_by_id = asyncio.run(records())
+    assert jobs_by_id[running["job_id"]]["status"] == "done"
+    assert jobs_by_id[queued["job_id"]]["status"] == "queued"
+    assert jobs_by_id[queued["job_id"]]["lease_expires_at"] is None
+    assert ingestion_status(queued["document_id"]) == "queued"
+
+    # The next worker to start picks the released job up straight away
+    with start_api() as api:
+        wait_for_jobs(api, [queued["job_id"]])
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import httpx
+import pytest
+from server.ingestion.utils import llm
+
+
+def completion(text):
+    return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Answer LLM requests with the queued responses (or exceptions) in order; records the backoff sleeps."""
+    responses = []
+    requests = []
+    sleeps = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(llm, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(llm, "_semaphore", None)
+    monkeypatch.setattr(llm.asyncio, "sleep", sleep)
+    return responses, requests, sleeps
+
+
+def call(**kwargs):
+    return asyncio.run(llm.call_llm([{"role": "user", "content": "Hi"}], **kwargs))
+
+
+def test_rate_limit_waits_for_retry_after(provider):
+    responses, requests, sleeps = provider
+    responses.extend([httpx.Response(429, headers={"Retry-After": "3"}), completion("Low risk")])
+    assert call() == "Low risk"
+    assert len(requests) == 2
+    assert sleeps == [3.0]
+
+
+def test_retry_after_is_capped(provider):
+    responses, _, sleeps = provider
+    responses.extend([httpx.Response(503, headers={"Retry-After": "3600"}), completion("ok")])
+    assert call() == "ok"
+    assert sleeps == [llm.LLM_BACKOFF_MAX]
+
+
+def test_server_errors_back_off_exponentially_then_give_up(provider):
+    responses, requests, sleeps = provider
+    responses.extend([httpx.Response(500)] * (llm.LLM_MAX_RETRIES + 1))
+    with pytest.raises(Exception, match=f"provider returned 500 after {llm.LLM_MAX_RETRIES + 1} attempts"):
+        call()
+    assert len(requests) == llm.LLM_MAX_RETRIES + 1
+    assert len(sleeps) == llm.LLM_MAX_RETRIES
+    for attempt, delay in enumerate(sleeps):
+        full = min(llm.LLM_BACKOFF_BASE * 2 ** attempt, llm.LLM_BACKOFF_MAX)
+        assert full / 2 <= delay <= full
+
+
+def test_transport_errors_are_retried(provider):
+    responses, requests, _ = provider
+    responses.extend([httpx.ConnectError("connection refused"), completion("ok")])
+    assert call() == "ok"
+    assert len(requests) == 2
+
+
+def test_client_errors_are_not_retried(provider):
+    responses, requests, sleeps = provider
+    responses.append(httpx.Response(400, json={"error": {"message": "bad model"}}))
+    with pytest.raises(Exception, match="bad model"):
+        call()
+    assert len(requests) == 1 and sleeps == []
+
+
+def test_stream_retries_until_the_first_chunk(provider):
+    responses, requests, sleeps = provider
+    events = [{"choices": [{"delta": {"content": "Low "}}]}, {"choices": [{"delta": {"content": "risk"}}]}]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+    responses.extend([httpx.Response(429, headers={"Retry-After": "1"}), httpx.Response(200, text=body)])
+
+    async def collect():
+        return [chunk async for chunk in llm.stream_llm([{"role": "user", "content": "Hi"}])]
+
+    assert asyncio.run(collect()) == ["Low ", "risk"]
+    assert requests[-1]["stream"] is True
+    assert sleeps == [1.0]
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from server.connections import migrations
+from server.connections.migrations import MIGRATIONS_COLLECTION, INDEXES, apply_migrations, ensure_indexes
+
+
+def test_startup_applies_indexes_and_migrations_before_serving(api, mongo):
+    async def state():
+        applied = await mongo[MIGRATIONS_COLLECTION].find({}).to_list(length=None)
+        return applied, await mongo["suppliers"].index_information()
+
+    applied, supplier_indexes = asyncio.run(state())
+    assert [(m["_id"], m["status"]) for m in applied] == [(name, "applied") for name, _ in migrations.MIGRATIONS]
+    assert "id_1" in supplier_indexes
+
+
+def test_ensure_indexes_creates_every_declared_collection(mongo):
+    created = asyncio.run(ensure_indexes(mongo))
+    assert set(created) == set(INDEXES)
+    assert all(len(names) == len(INDEXES[name]) for name, names in created.items())
+
+
+def test_migrations_run_once(mongo):
+    async def run():
+        await mongo["suppliers"].insert_many([{"id": "SUP-A"}, {"id": "SUP-B", "active": False}])
+        first = await apply_migrations(mongo)
+        second = await apply_migrations(mongo)
+        suppliers = await mongo["suppliers"].find({}, {"_id": 0, "id": 1, "active": 1}).sort("id").to_list(length=None)
+        return first, second, suppliers
+
+    first, second, suppliers = asyncio.run(run())
+    assert first == ["0001_default_supplier_active"]
+    assert second == []
+    assert suppliers == [{"id": "SUP-A", "active": True}, {"id": "SUP-B", "active": False}]
+
+
+def test_failed_migration_is_released_for_the_next_startup(mongo, monkeypatch):
+    async def broken(db):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [("0099_broken", broken)])
+    with pytest.raises(Exception, match="0099_broken failed"):
+        asyncio.run(apply_migrations(mongo))
+    assert asyncio.run(mongo[MIGRATIONS_COLLECTION].count_documents({})) == 0
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from server.connections import suppliers_collection, document_logs_collection
+from helpers import create_supplier
+from server.api.routes.suppliers import _encode_cursor, _decode_cursor, _after_cursor, _page_size, MAX_PAGE_SIZE
+
+
+def test_cursor_round_trips_the_sort_key():
+    cursor = _encode_cursor(["Acme Castings", "SUP-0001"])
+    assert _decode_cursor(cursor) == ["Acme Castings", "SUP-0001"]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", _encode_cursor({"name": "x"}), _encode_cursor(["only one"])])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_after_cursor_breaks_ties_on_the_tie_field():
+    cursor = _encode_cursor(["Lyon", "SUP-0002"])
+    assert _after_cursor("location", "id", 1, cursor) == {
+        "$or": [{"location": {"$gt": "Lyon"}}, {"location": "Lyon", "id": {"$gt": "SUP-0002"}}]
+    }
+    assert _after_cursor("location", "id", -1, cursor) == {
+        "$or": [{"location": {"$lt": "Lyon"}}, {"location": "Lyon", "id": {"$lt": "SUP-0002"}}]
+    }
+    assert _after_cursor("id", "id", 1, _encode_cursor(["SUP-0002", "SUP-0002"])) == {"id": {"$gt": "SUP-0002"}}
+
+
+def test_page_size_is_clamped_and_zero_means_unpaged():
+    assert _page_size(None) == 100
+    assert _page_size(-5) == 1
+    assert _page_size(10 ** 6) == MAX_PAGE_SIZE
+    assert _page_size(0) == 0
+
+
+def seed_suppliers(count):
+    # Few distinct locations, so pages end in the middle of runs of equal sort keys
+    asyncio.run(suppliers_collection.insert_many([
+        {"id": f"SUP-{i:04d}", "name": f"Supplier {i:04d}", "location": ["Lyon", "Oslo", "Porto"][i % 3],
+         "category": "Metals", "risk_level": "Low", "active": i % 4 != 0, "created_at": f"2026-01-{i % 28 + 1:02d}"}
+        for i in range(count)
+    ]))
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_every_supplier_once_in_order(api, order):
+    seed_suppliers(23)
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 5, "sort": "location", "order": order, "fields": "id,location"}
+        if cursor:
+            params["cursor"] = cursor
+        page = api.get("/api/suppliers", params=params).json()
+        assert len(page["suppliers"]) <= 5
+        seen.extend((s["location"], s["id"]) for s in page["suppliers"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == sorted(seen, reverse=order == "desc")
+    assert len(set(seen)) == 23
+
+
+def test_limit_zero_returns_every_supplier_unpaged(api):
+    seed_suppliers(120)
+    default = api.get("/api/suppliers").json()
+    assert len(default["suppliers"]) == 100 and default["next_cursor"]
+
+    unpaged = api.get("/api/suppliers", params={"limit": 0}).json()
+    assert len(unpaged["suppliers"]) == 120 and unpaged["next_cursor"] is None
+
+    names = api.get("/suppliers").json()
+    assert names["next_cursor"] is None
+    assert names["suppliers"] == sorted(f"Supplier {i:04d}" for i in range(120) if i % 4)
+
+
+def test_document_pages_are_newest_first_across_equal_upload_times(api):
+    supplier_id = create_supplier(api, "Acme Castings")
+    # Uploads in the same second share uploaded_at; file_id breaks the tie
+    asyncio.run(document_logs_collection.insert_many([
+        {"file_id": f"DOC-{i:02d}", "supplier_id": supplier_id, "filename": f"doc{i}.docx",
+         "file_path": f"/uploads/{supplier_id}/doc{i}.docx", "file_size": 10, "file_extension": ".docx",
+         "uploaded_at": f"2026-03-0{i // 4 + 1}T09:00:00"}
+        for i in range(11)
+    ] + [{"file_id": "DOC-OTHER", "supplier_id": "SUP-OTHER", "uploaded_at": "2026-03-09T09:00:00"}]))
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 4, **({"cursor": cursor} if cursor else {})}
+        page = api.get(f"/api/suppliers/{supplier_id}/documents", params=params).json()
+        seen.extend((doc["uploaded_at"], doc["id"]) for doc in page["documents"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == sorted(seen, reverse=True)
+    assert [doc_id for _, doc_id in seen] == [f"DOC-{i:02d}" for i in reversed(range(11))]
+
+    malformed = api.get(f"/api/suppliers/{supplier_id}/documents", params={"cursor": "not base64!"})
+    assert malformed.status_code == 400
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import pytest
+from server.ingestion import preview
+from server.ingestion.preview import ensure_preview, invalidate_preview, preview_path
+from helpers import make_docx, create_supplier, upload, wait_for_jobs
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Count preview conversions."""
+    calls = []
+    render = preview.render_preview_page
+
+    def counting_render(document):
+        calls.append(document["file_id"])
+        return render(document)
+
+    monkeypatch.setattr(preview, "render_preview_page", counting_render)
+    return calls
+
+
+def stored_document(upload_dir, file_id="DOC-1", *paragraphs):
+    path = os.path.join(upload_dir, f"{file_id}.docx")
+    with open(path, "wb") as file:
+        file.write(make_docx(*paragraphs or ("Delivery terms.",)))
+    return {"file_id": file_id, "file_path": path, "filename": "<terms>.docx", "uploaded_at": "2026-03-01"}
+
+
+def test_preview_is_rendered_once_and_served_with_validators(api, renders):
+    supplier_id = create_supplier(api, "Acme Castings")
+    uploaded = upload(api, supplier_id, "terms & conditions.docx", "Delivery within 30 days.")
+    wait_for_jobs(api, [uploaded["job_id"]])
+    url = f"/api/documents/{uploaded['document_id']}/preview"
+
+    first = api.get(url, headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    assert "Delivery within 30 days." in first.text
+    assert "terms &amp; conditions.docx" in first.text
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    compressed = api.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.text == first.text
+    assert compressed.headers["etag"] != first.headers["etag"]
+
+    cached = api.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": first.headers["etag"]})
+    assert cached.status_code == 304
+    assert renders == [uploaded["document_id"]]
+
+
+def test_revision_replaces_the_preview(api, renders):
+    supplier_id = create_supplier(api, "Acme Castings")
+    uploaded = upload(api, supplier_id, "terms.docx", "Delivery within 30 days.")
+    wait_for_jobs(api, [uploaded["job_id"]])
+    url = f"/api/documents/{uploaded['document_id']}/preview"
+    etag = api.get(url).headers["etag"]
+
+    revised = api.put(
+        f"/api/suppliers/{supplier_id}/documents/{uploaded['document_id']}",
+        files={"file": ("terms.docx", make_docx("Delivery within 45 days."), "application/octet-stream")}
+    )
+    assert revised.status_code == 200, revised.text
+    response = api.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "45 days" in response.text and "30 days" not in response.text
+
+
+def test_concurrent_first_views_share_one_render(upload_dir, renders):
+    document = stored_document(upload_dir)
+
+    async def views():
+        return await asyncio.gather(*(ensure_preview(document) for _ in range(5)))
+
+    assert set(asyncio.run(views())) == {preview_path(document)}
+    assert renders == ["DOC-1"]
+    with open(preview_path(document), encoding="utf-8") as file:
+        assert "&lt;terms&gt;.docx" in file.read()
+
+
+def test_render_finishing_after_an_invalidation_is_discarded(upload_dir, monkeypatch):
+    document = stored_document(upload_dir)
+    build = preview._build_preview
+
+    def build_then_invalidate(document):
+        built = build(document)
+        invalidate_preview(document)
+        return built
+
+    monkeypatch.setattr(preview, "_build_preview", build_then_invalidate)
+    with pytest.raises(Exception, match="changed while its preview was rendering"):
+        asyncio.run(ensure_preview(document))
+    assert not os.path.exists(preview_path(document))
@@ -0,0 +1,103 @@
+import types
+import numpy as np
+import pytest
+from server.ingestion import rerank as rerank_module
+from server.ingestion.rerank import rerank, register_reranker, _mmr
+
+
+def point(text, vector=None, named=False):
+    if vector is not None and named:
+        vector = {"": vector}
+    return types.SimpleNamespace(payload={"text": text}, vector=vector)
+
+
+@pytest.fixture
+def scores():
+    """A reranker scoring texts from a table the test fills in."""
+    table = {}
+    register_reranker("table", lambda query, texts: [table[text] for text in texts])
+    yield table
+    rerank_module.RERANKERS.pop("table")
+
+
+def test_mmr_passes_over_a_near_duplicate_of_the_first_pick():
+    relevance = np.array([1.0, 0.95, 0.6])
+    vectors = [np.array([1.0, 0.0]), np.array([0.99, 0.05]), np.array([0.0, 1.0])]
+    assert _mmr(relevance, vectors, 2, 0.7) == [0, 2]
+    # Relevance only: the duplicate comes second
+    assert _mmr(relevance, vectors, 2, 1.0) == [0, 1]
+
+
+def test_mmr_returns_at_most_top_k_distinct_candidates():
+    relevance = np.array([0.2, 0.9, 0.5, 0.7])
+    vectors = [np.eye(4)[i] for i in range(4)]
+    selected = _mmr(relevance, vectors, 3, 0.7)
+    assert selected == [1, 3, 2]
+
+
+def test_rerank_orders_by_reranker_scores_without_mmr(scores):
+    scores.update({"a": 0.1, "b": 0.9, "c": 0.5})
+    ranked = rerank("query", [point("a"), point("b"), point("c")], 2, reranker="table", mmr=False)
+    assert [(p.payload["text"], s) for p, s in ranked] == [("b", pytest.approx(0.9)), ("c", pytest.approx(0.5))]
+
+
+def test_rerank_diversifies_with_named_dense_vectors(scores):
+    scores.update({"audit p.1": 0.9, "audit p.1 again": 0.88, "sanctions": 0.7, "boilerplate": 0.1})
+    points = [
+        point("audit p.1", [1.0, 0.0, 0.0], named=True),
+        point("audit p.1 again", [0.99, 0.01, 0.0], named=True),
+        point("sanctions", [0.0, 1.0, 0.0], named=True),
+        point("boilerplate", [0.0, 0.0, 1.0], named=True)
+    ]
+    ranked = rerank("query", points, 2, reranker="table", mmr=True)
+    assert [p.payload["text"] for p, _ in ranked] == ["audit p.1", "sanctions"]
+
+
+def test_rerank_skips_mmr_for_points_without_vectors(scores):
+    scores.update({"a": 0.9, "b": 0.8})
+    ranked = rerank("query", [point("a", [1.0, 0.0]), point("b")], 2, reranker="table", mmr=True)
+    assert [p.payload["text"] for p, _ in ranked] == ["a", "b"]
+
+
+def test_failing_reranker_keeps_the_search_order():
+    def broken(query, texts):
+        raise RuntimeError("model not available")
+
+    register_reranker("broken", broken)
+    try:
+        ranked = rerank("query", [point("first"), point("second"), point("third")], 3, reranker="broken", mmr=False)
+    finally:
+        rerank_module.RERANKERS.pop("broken")
+    assert [p.payload["text"] for p, _ in ranked] == ["first", "second", "third"]
+
+
+def test_unknown_reranker_is_an_error():
+    with pytest.raises(ValueError):
+        rerank("query", [point("a")], 1, reranker="no-such-reranker")
+
+
+def test_a_cross_encoder_that_fails_to_load_warns_once_and_stays_on_the_search_order(monkeypatch, capsys):
+    import sys
+    attempts = []
+
+    class CrossEncoder:
+        def __init__(self, *args, **kwargs):
+            attempts.append(args)
+            raise OSError("cannot download cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(CrossEncoder=CrossEncoder))
+    monkeypatch.setattr(rerank_module, "_cross_encoder", None)
+    monkeypatch.setattr(rerank_module, "_cross_encoder_error", None)
+    monkeypatch.setattr(rerank_module, "RERANKER", "cross-encoder")
+    assert not rerank_module.reranker_loaded()
+
+    with pytest.raises(Exception, match="unavailable"):
+        rerank_module.load_reranker()
+    for _ in range(3):
+        ranked = rerank("query", [point("first"), point("second")], 2, mmr=False)
+        assert [p.payload["text"] for p, _ in ranked] == ["first", "second"]
+
+    assert len(attempts) == 1
+    assert capsys.readouterr().out.count("Warning") == 1
+    # Warm-up is done with it: readiness does not wait for a model that will not load
+    assert rerank_module.reranker_loaded()
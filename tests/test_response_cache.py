@@ -0,0 +1,109 @@
+import types
+import asyncio
+import pytest
+from server.connections import suppliers_collection
+from server.ingestion.versions import bump_documents_version, get_documents_version
+from server.ingestion.utils import response_cache
+from server.ingestion.utils.response_cache import ResponseCache, normalize_query
+from server.api.routes import rag
+from helpers import create_supplier, upload, wait_for_jobs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand."""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(response_cache, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_normalized_queries_share_an_entry(clock):
+    cache = ResponseCache()
+    cache.put("Is Acme at risk?", ["SUP-B", "SUP-A"], 1, "High")
+    assert normalize_query("  is ACME   at risk ") == "is acme at risk"
+    assert cache.get("is acme at risk", ["SUP-A", "SUP-B", "SUP-A"], 1) == ("High", "exact")
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(ttl_seconds=60)
+    cache.put("sanctions exposure", ["SUP-A"], 1, "Low")
+    clock.now += 59
+    assert cache.get("sanctions exposure", ["SUP-A"], 1) == ("Low", "exact")
+    clock.now += 2
+    assert cache.get("sanctions exposure", ["SUP-A"], 1) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.put("first", ["SUP-A"], 1, "1")
+    cache.put("second", ["SUP-A"], 1, "2")
+    assert cache.get("first", ["SUP-A"], 1)
+    cache.put("third", ["SUP-A"], 1, "3")
+    assert cache.get("second", ["SUP-A"], 1) is None
+    assert cache.get("first", ["SUP-A"], 1) == ("1", "exact")
+    assert cache.get("third", ["SUP-A"], 1) == ("3", "exact")
+
+
+def test_document_version_and_vendor_invalidation(clock):
+    cache = ResponseCache()
+    cache.put("financial distress", ["SUP-A"], 1, "A")
+    cache.put("financial distress", ["SUP-B"], 1, "B")
+    cache.put("financial distress", [], 1, "all vendors")
+
+    # A new document version is a different key
+    assert cache.get("financial distress", ["SUP-A"], 2) is None
+
+    cache.invalidate_vendors(["SUP-A"])
+    assert cache.get("financial distress", ["SUP-A"], 1) is None
+    assert cache.get("financial distress", [], 1) is None
+    assert cache.get("financial distress", ["SUP-B"], 1) == ("B", "exact")
+    assert cache.stats()["invalidated"] == 2
+
+
+def test_similar_query_in_the_same_scope_is_a_semantic_hit(clock):
+    cache = ResponseCache(similarity_threshold=0.9)
+    cache.put("labour violations", ["SUP-A"], 1, "Moderate", query_vector=[1.0, 0.0])
+    assert cache.get("forced labour findings", ["SUP-A"], 1, query_vector=[0.99, 0.1]) == ("Moderate", "semantic")
+    assert cache.get("forced labour findings", ["SUP-B"], 1, query_vector=[0.99, 0.1]) is None
+    assert cache.get("cyber incidents", ["SUP-A"], 1, query_vector=[0.0, 1.0]) is None
+
+
+def test_bumping_documents_changes_the_version_of_selections_that_include_them(mongo):
+    async def versions():
+        await suppliers_collection.insert_many([{"id": "SUP-A"}, {"id": "SUP-B"}])
+        before = [await get_documents_version(ids) for ids in (["SUP-A"], ["SUP-B"], [])]
+        await bump_documents_version(["SUP-A"])
+        after = [await get_documents_version(ids) for ids in (["SUP-A"], ["SUP-B"], [])]
+        return before, after
+
+    before, after = asyncio.run(versions())
+    assert [b != a for b, a in zip(before, after)] == [True, False, True]
+
+
+def test_analyze_is_served_from_the_cache_until_documents_change(api, monkeypatch):
+    calls = []
+
+    async def assess_risk(user_query, vendor_ids):
+        calls.append(user_query)
+        return {"response": f"Assessment {len(calls)}", "evidence": []}
+
+    monkeypatch.setattr(rag, "assess_risk", assess_risk)
+    monkeypatch.setattr(rag, "analyze_response_cache", ResponseCache(similarity_threshold=0))
+    supplier_id = create_supplier(api, "Acme Castings")
+
+    def analyze(query):
+        response = api.post("/analyze", json={"query": query, "vendor_ids": [supplier_id]})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    first = analyze("Financial distress?")
+    assert first["cache"] == {"hit": False, "match": None}
+    repeat = analyze("  financial DISTRESS? ")
+    assert repeat["response"] == "Assessment 1" and repeat["cache"]["hit"]
+
+    # A finished ingestion job bumps the supplier's document version
+    wait_for_jobs(api, [upload(api, supplier_id, "audit.docx", "Overdue payments to three creditors.")["job_id"]])
+    after = analyze("Financial distress?")
+    assert after["response"] == "Assessment 2" and not after["cache"]["hit"]
+    assert len(calls) == 2
@@ -0,0 +1,54 @@
+from qdrant_client.models import PointStruct
+from server.connections import SUPPLIER_DOC_COLLECTION
+from server.ingestion.retrieval import search_chunks, search_chunks_per_vendor, vendor_filter
+from server.ingestion.utils.sparse import SPARSE_VECTOR_NAME, sparse_document_vector
+
+QUERY = [1.0] + [0.0] * 7
+
+# id -> (vendor_id payload, cosine similarity to QUERY); chunk 5 is content shared by two vendors' uploads
+CHUNKS = {
+    1: (["SUP-A"], 0.9),
+    2: (["SUP-A"], 0.8),
+    3: (["SUP-B"], 0.7),
+    4: (["SUP-C"], 0.95),
+    5: (["SUP-B", "SUP-C"], 0.6)
+}
+
+
+def store_chunks(qdrant):
+    points = []
+    for point_id, (vendor_ids, closeness) in CHUNKS.items():
+        dense = [closeness, (1 - closeness ** 2) ** 0.5] + [0.0] * 6
+        text = f"Supplier risk clause {point_id}"
+        points.append(PointStruct(
+            id=point_id,
+            vector={"": dense, SPARSE_VECTOR_NAME: sparse_document_vector(text)},
+            payload={"text": text, "vendor_id": vendor_ids}
+        ))
+    qdrant.upsert(SUPPLIER_DOC_COLLECTION, points)
+
+
+def test_no_selection_searches_every_vendor(qdrant):
+    store_chunks(qdrant)
+    assert vendor_filter([]) is None
+    hits = search_chunks(qdrant, SUPPLIER_DOC_COLLECTION, QUERY, "supplier risk", vendor_filter([]), limit=10)
+    assert {hit.id for hit in hits} == set(CHUNKS)
+
+
+def test_several_vendors_match_chunks_of_any_of_them(qdrant):
+    store_chunks(qdrant)
+    hits = search_chunks(qdrant, SUPPLIER_DOC_COLLECTION, QUERY, "supplier risk", vendor_filter(["SUP-A", "SUP-B"]), limit=10)
+    assert {hit.id for hit in hits} == {1, 2, 3, 5}
+
+    hits = search_chunks(qdrant, SUPPLIER_DOC_COLLECTION, QUERY, "supplier risk", vendor_filter(["SUP-C"]), limit=10)
+    assert {hit.id for hit in hits} == {4, 5}
+
+
+def test_fanout_interleaves_vendors_and_returns_shared_chunks_once(qdrant):
+    store_chunks(qdrant)
+    hits = search_chunks_per_vendor(qdrant, SUPPLIER_DOC_COLLECTION, QUERY, "supplier risk", ["SUP-A", "SUP-B", "SUP-C"],
+                                    per_vendor_limit=2)
+    ids = [hit.id for hit in hits]
+    # Every vendor's best chunk comes before any vendor's second
+    assert set(ids[:3]) == {1, 3, 4}
+    assert sorted(ids[3:]) == [2, 5]
@@ -0,0 +1,62 @@
+from qdrant_client.models import PointStruct
+from server.connections import SUPPLIER_DOC_COLLECTION
+from server.ingestion.retrieval import search_chunks
+from server.ingestion.utils.sparse import (
+    BM25_K1,
+    SPARSE_VECTOR_NAME,
+    tokenize,
+    sparse_document_vector,
+    sparse_query_vector
+)
+
+
+def weights(vector):
+    return dict(zip(vector.indices, vector.values))
+
+
+def test_tokenize_keeps_identifiers_whole_and_splits_them():
+    assert tokenize("The ISO-27001 certificate of CERT/2023/114") == [
+        "iso-27001", "iso", "27001", "certificate", "cert/2023/114", "cert", "2023", "114"
+    ]
+
+
+def test_tokenize_lowercases_and_drops_stopwords():
+    assert tokenize("Is THERE any exposure to the sanctions list?") == ["exposure", "sanctions", "list"]
+
+
+def test_document_vector_indices_are_sorted_and_unique():
+    vector = sparse_document_vector("lead time lead time delays at the port of Rotterdam")
+    assert list(vector.indices) == sorted(set(vector.indices))
+    assert len(vector.indices) == len(set(tokenize("lead time delays port rotterdam")))
+
+
+def test_term_frequency_saturates_and_long_chunks_weigh_less():
+    once = weights(sparse_document_vector("recall"))
+    many = weights(sparse_document_vector("recall " * 50))
+    (index,) = once
+    assert once[index] < many[index] < BM25_K1 + 1
+
+    short = weights(sparse_document_vector("recall notice"))
+    padded = weights(sparse_document_vector("recall notice " + "shipment " * 300))
+    assert padded[index] < short[index]
+
+
+def test_query_vector_has_unit_weights():
+    vector = sparse_query_vector("ISO 27001 audit audit")
+    assert set(vector.values) == {1.0}
+    assert len(vector.indices) == 3
+
+
+def test_exact_identifier_ranks_its_chunk_first(qdrant):
+    texts = [
+        "Quality manual revision history and document control.",
+        "Certificate ISO-27001 number CERT/2023/114 issued to the supplier.",
+        "Information security policy reviewed annually by the board."
+    ]
+    qdrant.upsert(SUPPLIER_DOC_COLLECTION, [
+        PointStruct(id=i, vector={"": [1.0] * 8, SPARSE_VECTOR_NAME: sparse_document_vector(text)}, payload={"text": text})
+        for i, text in enumerate(texts)
+    ])
+    # Every chunk is equally close densely; the BM25 half of the fusion decides
+    hits = search_chunks(qdrant, SUPPLIER_DOC_COLLECTION, [1.0] * 8, "Which supplier holds CERT/2023/114?", limit=1)
+    assert [hit.id for hit in hits] == [1]
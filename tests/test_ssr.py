@@ -0,0 +1,71 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from server.connections import ssr_cache_collection
+from server.ingestion import ssr
+from server.ingestion.utils.embeddings import embed_query
+
+
+@pytest.fixture
+def llm_calls(mongo, hash_embeddings, monkeypatch):
+    """An empty SSR cache whose LLM writes one paragraph per call; returns the prompts it was sent."""
+    calls = []
+
+    async def call_llm(messages, **kwargs):
+        calls.append(messages[0]["content"])
+        return f"Hypothetical paragraph {len(calls)}"
+
+    monkeypatch.setattr(ssr, "call_llm", call_llm)
+    monkeypatch.setattr(ssr, "_memory", OrderedDict())
+    monkeypatch.setattr(ssr, "_stats", {"memory_hits": 0, "stored_hits": 0, "misses": 0})
+    return calls
+
+
+def test_normalized_repeats_are_served_from_memory(llm_calls):
+    async def run():
+        return [await ssr.generate_ssr(query) for query in ("Financial distress?", "  financial   DISTRESS? ")]
+
+    (paragraph, vector), repeat = asyncio.run(run())
+    assert repeat == (paragraph, vector)
+    assert len(llm_calls) == 1
+    assert np.allclose(vector, embed_query(paragraph))
+    assert ssr.ssr_cache_stats()["memory_hits"] == 1
+
+
+def test_another_worker_reuses_the_stored_entry(llm_calls):
+    first = asyncio.run(ssr.generate_ssr("Financial distress?"))
+    ssr._memory.clear()
+    assert asyncio.run(ssr.generate_ssr("Financial distress?")) == first
+    assert len(llm_calls) == 1
+    assert ssr.ssr_cache_stats()["stored_hits"] == 1
+
+
+def test_expired_entries_are_regenerated(llm_calls):
+    asyncio.run(ssr.generate_ssr("Financial distress?"))
+    ssr._memory.clear()
+    asyncio.run(ssr_cache_collection.update_many({}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}}))
+
+    paragraph, _ = asyncio.run(ssr.generate_ssr("Financial distress?"))
+    assert paragraph == "Hypothetical paragraph 2"
+
+
+def test_entries_from_another_embedding_model_are_re_embedded(llm_calls):
+    asyncio.run(ssr.generate_ssr("Financial distress?"))
+    ssr._memory.clear()
+    asyncio.run(ssr_cache_collection.update_many({}, {"$set": {"model": "old-model", "vector": [0.0]}}))
+
+    paragraph, vector = asyncio.run(ssr.generate_ssr("Financial distress?"))
+    assert paragraph == "Hypothetical paragraph 1" and len(llm_calls) == 1
+    assert np.allclose(vector, embed_query(paragraph))
+    stored = asyncio.run(ssr_cache_collection.find_one({}))
+    assert stored["model"] == ssr.EMBED_MODEL
+
+
+def test_warming_skips_fresh_entries_unless_forced(llm_calls):
+    queries = ssr.STANDARD_RISK_QUERIES[:2]
+    assert asyncio.run(ssr.warm_ssr_cache(queries)) == 2
+    assert asyncio.run(ssr.warm_ssr_cache(queries)) == 0
+    assert asyncio.run(ssr.warm_ssr_cache(queries, force=True)) == 2
+    assert len(llm_calls) == 4
@@ -0,0 +1,63 @@
+import io
+import os
+import asyncio
+import pytest
+from fastapi import HTTPException, UploadFile
+from server.api.main import upload_size_limit
+from server.api.routes.suppliers import MAX_UPLOAD_BYTES, _save_upload_content
+from helpers import create_supplier
+
+OVERSIZED = b"x" * (MAX_UPLOAD_BYTES + 128 * 1024)
+
+
+def test_upload_size_limit_matches_upload_routes_only():
+    assert upload_size_limit("POST", "/api/suppliers/SUP-1/documents") == MAX_UPLOAD_BYTES + 64 * 1024
+    assert upload_size_limit("PUT", "/api/suppliers/SUP-1/documents/doc-1") == MAX_UPLOAD_BYTES + 64 * 1024
+    assert upload_size_limit("POST", "/api/suppliers/SUP-1/documents/bulk") > MAX_UPLOAD_BYTES
+
+    assert upload_size_limit("GET", "/api/suppliers/SUP-1/documents") is None
+    assert upload_size_limit("POST", "/api/suppliers/SUP-1/documents/doc-1") is None
+    assert upload_size_limit("PUT", "/api/suppliers/documents") is None
+    assert upload_size_limit("POST", "/api/suppliers/SUP-1/documents/bulk/extra") is None
+
+
+def test_oversized_upload_is_rejected_before_the_route(api):
+    assert api.post("/api/suppliers/SUP-1/documents", content=OVERSIZED).status_code == 413
+    assert api.put("/api/suppliers/SUP-1/documents/doc-1", content=OVERSIZED).status_code == 413
+    # Bulk requests and non-upload routes are not held to the single-file limit
+    assert api.post("/api/suppliers/SUP-1/documents/bulk", content=OVERSIZED).status_code != 413
+    assert api.put("/api/suppliers/documents", content=OVERSIZED).status_code != 413
+
+
+def stored_files(upload_dir):
+    return [name for _, _, names in os.walk(upload_dir) for name in names]
+
+
+def test_file_over_the_cap_is_a_413_and_nothing_is_stored(api, upload_dir):
+    supplier_id = create_supplier(api, "Acme Castings")
+    # Within the request limit's multipart allowance, so the route itself checks the file
+    oversized = {"file": ("big.pdf", b"x" * (MAX_UPLOAD_BYTES + 1), "application/pdf")}
+    response = api.post(f"/api/suppliers/{supplier_id}/documents", files=oversized)
+    assert response.status_code == 413
+    assert "upload limit" in response.json()["detail"]
+    assert stored_files(upload_dir) == []
+
+
+def test_bulk_upload_with_one_file_over_the_cap_stores_none(api, upload_dir, mongo):
+    supplier_id = create_supplier(api, "Acme Castings")
+    response = api.post(f"/api/suppliers/{supplier_id}/documents/bulk", files=[
+        ("files", ("small.pdf", b"%PDF-1.4", "application/pdf")),
+        ("files", ("big.pdf", b"x" * (MAX_UPLOAD_BYTES + 1), "application/pdf"))
+    ])
+    assert response.status_code == 413
+    assert stored_files(upload_dir) == []
+    assert asyncio.run(mongo["document_logs"].count_documents({})) == 0
+
+
+def test_copy_stops_at_the_cap_when_the_size_is_unknown(mongo, upload_dir):
+    file = UploadFile(io.BytesIO(b"x" * (MAX_UPLOAD_BYTES + 1)), filename="big.pdf")
+    assert file.size is None
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(_save_upload_content("SUP-1", file, ".pdf"))
+    assert error.value.status_code == 413
+    assert stored_files(upload_dir) == []
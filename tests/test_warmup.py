@@ -0,0 +1,83 @@
+import threading
+import time
+import pytest
+from server.ingestion import warmup
+
+
+class Component:
+    """A stand-in model that loads once released, or fails to."""
+
+    def __init__(self, error=None):
+        self.released = threading.Event()
+        self.is_loaded = False
+        self.error = error
+
+    def load(self):
+        self.released.wait(5)
+        if self.error:
+            raise RuntimeError(self.error)
+        self.is_loaded = True
+
+    def loaded(self):
+        return self.is_loaded
+
+
+@pytest.fixture
+def components(monkeypatch):
+    """Warm-up on, over stand-ins for a required model and an optional parser."""
+    stand_ins = {"embedder": Component(), "parsers": Component(error="PyPDF2 missing")}
+    monkeypatch.setattr(warmup, "WARMUP_ON_STARTUP", True)
+    monkeypatch.setattr(warmup, "_task", None)
+    monkeypatch.setattr(warmup, "_state", {"started_at": None, "finished_at": None, "errors": {}, "seconds": {}})
+    monkeypatch.setattr(warmup, "COMPONENTS", {
+        "embedder": (stand_ins["embedder"].load, stand_ins["embedder"].loaded, True),
+        "parsers": (stand_ins["parsers"].load, stand_ins["parsers"].loaded, False)
+    })
+    return stand_ins
+
+
+def wait_for_warmup(api, state, timeout=5):
+    deadline = time.monotonic() + timeout
+    while (report := api.get("/ready").json())["warmup"] != state:
+        assert time.monotonic() < deadline, report
+        time.sleep(0.02)
+    return report
+
+
+def test_ready_only_once_required_components_loaded(components, request):
+    api = request.getfixturevalue("api")
+    assert api.get("/health").status_code == 200
+
+    response = api.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["warmup"] in ("pending", "running")
+    assert response.json()["components"]["embedder"]["loaded"] is False
+
+    for component in components.values():
+        component.released.set()
+    report = wait_for_warmup(api, "done")
+    assert api.get("/ready").status_code == 200
+    assert report["ready"] is True
+
+    # The optional parsers failed: reported, but not blocking readiness
+    parsers = report["components"]["parsers"]
+    assert parsers == {"loaded": False, "required": False, "error": "PyPDF2 missing", "seconds": parsers["seconds"]}
+    assert report["components"]["embedder"]["loaded"] and report["components"]["embedder"]["seconds"] >= 0
+
+
+def test_failed_required_component_keeps_the_pod_unready(components, request):
+    components["embedder"].error = "model download failed"
+    api = request.getfixturevalue("api")
+    for component in components.values():
+        component.released.set()
+
+    report = wait_for_warmup(api, "done")
+    assert api.get("/ready").status_code == 503
+    assert report["components"]["embedder"]["error"] == "model download failed"
+
+
+def test_without_warmup_ready_is_immediate(api):
+    assert warmup.WARMUP_ON_STARTUP is False
+    response = api.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["warmup"] == "off"